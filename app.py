@@ -10,20 +10,51 @@ from flask_apscheduler import APScheduler
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'passward'  # Replace with a strong secret key
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///pizza_delivery.db'  
+# The database (DATABASE_URL) and engine tuning come from the environment, see setup/database.py
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['DISPATCH_INTERVAL_SECONDS'] = 15  # How often waiting deliveries are matched to delivery personnel
+app.config['ORDER_STATUS_STREAM_KEEPALIVE_SECONDS'] = 15  # Re-check interval of the order status event stream
+app.config['SLOW_QUERY_THRESHOLD_MS'] = 100  # Statements slower than this are logged (None disables)
+app.config['USE_EARNINGS_ROLLUPS'] = True  # Serve the earnings report totals from the daily rollups
+app.config['SQL_STATS_HEADERS'] = True  # Add X-DB-Query-Count / X-DB-Time-Ms headers to every response
+app.config['READ_REPLICA_SNAPSHOT_SECONDS'] = 30  # Refresh of the snapshot the report and history pages read (0 reads the primary)
+app.config['PASSWORD_HASH_METHOD'] = 'scrypt:32768:8:1'  # Werkzeug hash method and parameters for new passwords
+app.config['PASSWORD_HASH_WORKERS'] = 2  # Processes hashing passwords for /login and /register (0 hashes in the request)
+app.config['PASSWORD_HASH_QUEUE_DEPTH'] = 16  # Hashes that may wait for a worker before /login and /register answer 503
+app.config['IDENTITY_CACHE_TTL_SECONDS'] = 60  # How long a logged-in customer is served without reading the Customer table
+app.config['IDENTITY_CACHE_MAX_SIZE'] = 10000  # Customers kept in the identity cache
+app.config['CART_TTL_SECONDS'] = 7200  # Carts unused for this long are dropped
+app.config['CART_MAX_SIZE'] = 10000  # Carts kept in the cart store
+app.config['ORDER_INTAKE_ASYNC'] = True  # POST /order only queues the order; the intake workers fulfil it
+app.config['ORDER_INTAKE_WORKERS'] = 2  # Threads fulfilling queued orders
+app.config['ORDER_INTAKE_BATCH_SIZE'] = 50  # Queued orders fulfilled per transaction
 
 
 # Bind SQLAlchemy and LoginManager to the app using init_app
-db.init_app(app)
+from setup.database import init_database
+init_database(app)
+from setup.replica import read_replica
+read_replica.init_app(app)
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
-# Define the user_loader callback
-from models import Customer
-@login_manager.user_loader
-def load_user(user_id):
-    return db.session.get(Customer, int(user_id))
+# Hash passwords outside the request threads
+from setup.passwords import password_hasher
+password_hasher.init_app(app)
+password_hasher.start()
+
+# Count and time the SQL statements of every request
+from setup.query_stats import init_query_stats
+init_query_stats(app)
+
+# Define the user_loader callback: cached principals instead of a Customer SELECT per request
+from functionality.identity_cache import identity_cache, load_user
+identity_cache.init_app(app)
+login_manager.user_loader(load_user)
+
+# Server-side carts, keyed by customer
+from functionality.cart import cart_store
+cart_store.init_app(app)
 
 # Register all routes
 register_routes(app)
@@ -32,21 +63,54 @@ register_routes(app)
 with app.app_context():
     from models import * 
     from setup.seed_data import seed_data 
+    from setup.migrations import ensure_indexes
+    from functionality.earnings_rollups import ensure_earnings_rollups
+    from functionality.courier_index import courier_index
     
 scheduler = APScheduler()  
 scheduler.init_app(app)
 def update_pending_deliveries_task():
     with app.app_context():
         from functionality.delivery import update_pending_deliveries
-        update_pending_deliveries()  
+        from functionality.routing import plan_routes
+        matched, waiting = update_pending_deliveries()  
+        if waiting:
+            app.logger.info(f"Dispatcher assigned delivery personnel to {matched} of {waiting} waiting deliveries.")
+        # Re-plan every trip being prepared, including orders assigned when they were placed
+        plan_routes()
+scheduler.add_job(
+    id='update_pending_deliveries',
+    func=update_pending_deliveries_task,
+    trigger='interval',
+    seconds=app.config['DISPATCH_INTERVAL_SECONDS'],
+    max_instances=1,
+    coalesce=True
+)
 scheduler.start() 
 
+# Durable order lifecycle: applies overdue transitions on startup, then runs as they fall due
+from functionality.lifecycle import lifecycle_engine
+lifecycle_engine.init_app(app)
+lifecycle_engine.start()
+
+# Fulfils the orders queued by POST /order, including those left over from before a restart
+from functionality.order_intake import order_intake
+order_intake.init_app(app)
+order_intake.start()
+
+# Keeps the report and history pages' snapshot of the database fresh
+read_replica.start()
+
 def open_browser():
     webbrowser.open_new('http://127.0.0.1:5000/login')
 if __name__ == '__main__':
     with app.app_context():
         #db.drop_all()
         db.create_all()     
+        ensure_indexes()
         seed_data()       
+        ensure_earnings_rollups()
+        courier_index.rebuild()
+    lifecycle_engine.notify()
     Timer(1, open_browser).start()  
     app.run(debug=True)
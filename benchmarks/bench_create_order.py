@@ -0,0 +1,71 @@
+"""
+Order placement benchmark.
+
+Usage: python -m benchmarks.bench_create_order [--orders N] [--items N]
+
+Places orders through functionality.order.create_order against a freshly seeded,
+file-backed SQLite database and reports throughput together with the number of
+SQL statements and commits issued per order.
+"""
+
+import argparse
+import random
+import time
+
+from sqlalchemy import event
+from benchmarks.common import drop_database, make_app
+from models import Customer, MenuItem
+from setup.extensions import db
+from setup.seed_data import seed_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--orders', type=int, default=500)
+    parser.add_argument('--items', type=int, default=5, help='Line items per order')
+    args = parser.parse_args()
+
+    from functionality.order import create_order
+
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        seed_data()
+        customers = Customer.query.all()
+        menu_item_ids = [item.id for item in MenuItem.query.all()]
+
+        counters = {'statements': 0, 'commits': 0}
+
+        def count_statement(*_):
+            counters['statements'] += 1
+
+        def count_commit(*_):
+            counters['commits'] += 1
+
+        event.listen(db.engine, 'before_cursor_execute', count_statement)
+        event.listen(db.engine, 'commit', count_commit)
+
+        rng = random.Random(42)
+        start = time.perf_counter()
+        for i in range(args.orders):
+            items = [
+                {'menu_item_id': rng.choice(menu_item_ids), 'quantity': rng.randint(1, 3)}
+                for _ in range(args.items)
+            ]
+            create_order(customer=customers[i % len(customers)], items=items)
+            db.session.commit()
+        elapsed = time.perf_counter() - start
+
+        event.remove(db.engine, 'before_cursor_execute', count_statement)
+        event.remove(db.engine, 'commit', count_commit)
+        db.engine.dispose()
+    drop_database(app)
+
+    print(f"\n{args.orders} orders x {args.items} items in {elapsed:.2f}s")
+    print(f"  throughput:           {args.orders / elapsed:8.1f} orders/s")
+    print(f"  statements per order: {counters['statements'] / args.orders:8.1f}")
+    print(f"  commits per order:    {counters['commits'] / args.orders:8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+Index benchmark for the hot-path queries.
+
+Usage: python -m benchmarks.bench_indexes [--orders N]
+
+Populates a temporary SQLite database, prints the query plan of each hot-path
+query and times it with and without the secondary indexes declared in models.py.
+Exits non-zero if any hot-path query still scans its table with the indexes present.
+"""
+
+import argparse
+import random
+import sys
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import insert, select
+from benchmarks.common import drop_database, make_app, timed
+from models import Customer, Delivery, DeliveryPersonnel, GenderEnum, Order, OrderStatusEnum
+from setup.extensions import db
+
+POSTAL_CODES = [str(code) for code in range(6200, 6260)]
+ACTIVE_STATUSES = [OrderStatusEnum.Being_Prepared, OrderStatusEnum.Being_Delivered]
+
+
+def populate(num_orders, num_customers, num_couriers):
+    rng = random.Random(42)
+    db.session.execute(insert(Customer), [
+        {
+            'name': f'Customer {i}',
+            'gender': rng.choice(list(GenderEnum)),
+            'birthdate': date(1950, 1, 1) + timedelta(days=rng.randrange(20000)),
+            'phone': '0600000000',
+            'address': 'Benchmark street 1',
+            'postal_code': rng.choice(POSTAL_CODES),
+            'email': f'customer{i}@example.com',
+            'password': 'x',
+        }
+        for i in range(num_customers)
+    ])
+    db.session.execute(insert(DeliveryPersonnel), [
+        {
+            'name': f'Courier {i}',
+            'phone': '0611111111',
+            'postal_code': rng.choice(POSTAL_CODES + [None]),
+            'is_available': rng.random() < 0.3,
+        }
+        for i in range(num_couriers)
+    ])
+    start = datetime(2023, 1, 1)
+    db.session.execute(insert(Order), [
+        {
+            'customer_id': rng.randrange(1, num_customers + 1),
+            'order_date': start + timedelta(minutes=i),
+            'total_price': Decimal('12.50'),
+            'status': OrderStatusEnum.Delivered,
+        }
+        for i in range(num_orders)
+    ])
+    db.session.execute(insert(Delivery), [
+        {
+            'order_id': i + 1,
+            'delivery_personnel_id': rng.randrange(1, num_couriers + 1),
+            'status': rng.choice(list(OrderStatusEnum)),
+        }
+        for i in range(num_orders)
+    ])
+    db.session.commit()
+
+
+def hot_queries():
+    """The statements issued on the hot paths, with representative parameters."""
+    return {
+        'my_orders (Order.customer_id)': select(Order.id).where(Order.customer_id == 17),
+        'active deliveries (Delivery.delivery_personnel_id, status)': select(Delivery.id).where(
+            Delivery.delivery_personnel_id == 3,
+            Delivery.status.in_(ACTIVE_STATUSES)
+        ),
+        'assign courier (DeliveryPersonnel.postal_code, is_available)': select(DeliveryPersonnel.id).where(
+            DeliveryPersonnel.postal_code == '6229',
+            DeliveryPersonnel.is_available == True
+        ).limit(1),
+        'earnings by postal code (Customer.postal_code)': select(Order.total_price).join(Customer).where(
+            Customer.postal_code == '6229'
+        ),
+        'earnings by age (Customer.birthdate)': select(Order.total_price).join(Customer).where(
+            Customer.birthdate >= date(2000, 1, 1)
+        ),
+    }
+
+
+def query_plan(connection, statement):
+    sql = str(statement.compile(connection, compile_kwargs={'literal_binds': True}))
+    return [row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}')]
+
+
+def measure(repeat):
+    results = {}
+    with db.engine.connect() as connection:
+        for name, statement in hot_queries().items():
+            plan = query_plan(connection, statement)
+            seconds, _ = timed(lambda: connection.execute(statement).all(), repeat=repeat)
+            results[name] = (plan, seconds)
+    return results
+
+
+def drop_indexes():
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.drop(connection, checkfirst=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--orders', type=int, default=200000)
+    parser.add_argument('--customers', type=int, default=20000)
+    parser.add_argument('--couriers', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        print(f"Populating {args.orders} orders, {args.customers} customers, {args.couriers} couriers...")
+        populate(args.orders, args.customers, args.couriers)
+
+        indexed = measure(args.repeat)
+        drop_indexes()
+        unindexed = measure(args.repeat)
+        db.engine.dispose()
+    drop_database(app)
+
+    full_scans = []
+    for name, (plan, seconds) in indexed.items():
+        _, baseline_seconds = unindexed[name]
+        print(f"\n{name}")
+        for step in plan:
+            print(f"    {step}")
+        print(f"    without indexes: {baseline_seconds * 1000:9.3f} ms")
+        print(f"    with indexes:    {seconds * 1000:9.3f} ms")
+        if any(step.startswith('SCAN') for step in plan):
+            full_scans.append(name)
+
+    if full_scans:
+        print(f"\nFull table scans remain in: {', '.join(full_scans)}")
+        sys.exit(1)
+    print("\nNo hot-path query performs a full table scan.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""
+Courier matching benchmark.
+
+Usage: python -m benchmarks.bench_matching [--orders N] [--couriers N] [--postal-codes N]
+
+Builds a backlog of waiting orders spread unevenly over postal codes, and delivery
+personnel who are partly busy serving a postal code and partly unassigned, then
+compares plan_assignments with the greedy matching the dispatcher used before
+(oldest order first, first delivery personnel serving the postal code, otherwise
+the next unassigned one), with and without the capacity cap. Reports how many
+orders each assigns, their average estimated delivery time and the solve time.
+
+Finally times one update_pending_deliveries run (the dispatcher tick) against a
+SQLite database holding the same number of waiting orders and delivery personnel.
+"""
+
+import argparse
+import random
+import sys
+import time
+from collections import defaultdict
+
+from benchmarks.common import drop_database, make_app, timed
+from functionality.matching import MAX_ORDERS_PER_DELIVERY_PERSONNEL, plan_assignments
+
+
+def greedy_assignments(waiting, personnel, capacity=None):
+    """The previous dispatcher: first come, first served, no look-ahead."""
+    buckets = defaultdict(list)
+    loads = {}
+    for delivery_personnel_id, postal_code, load in personnel:
+        buckets[postal_code].append(delivery_personnel_id)
+        loads[delivery_personnel_id] = load
+
+    plan = []
+    for key, postal_code in waiting:
+        candidates = [
+            delivery_personnel_id for delivery_personnel_id in buckets[postal_code]
+            if capacity is None or loads[delivery_personnel_id] < capacity
+        ]
+        if candidates:
+            delivery_personnel_id = candidates[0]
+        elif buckets[None]:
+            delivery_personnel_id = buckets[None].pop(0)
+            buckets[postal_code].append(delivery_personnel_id)
+        else:
+            continue
+        plan.append((key, delivery_personnel_id, loads[delivery_personnel_id]))
+        loads[delivery_personnel_id] += 1
+    return plan
+
+
+def check_plan(waiting, personnel, plan, capacity):
+    postal_codes = dict(waiting)
+    serving = {delivery_personnel_id: postal_code for delivery_personnel_id, postal_code, _ in personnel}
+    positions = {delivery_personnel_id: set() for delivery_personnel_id, _, _ in personnel}
+    loads = {delivery_personnel_id: load for delivery_personnel_id, _, load in personnel}
+    for key, delivery_personnel_id, position in plan:
+        if serving[delivery_personnel_id] not in (None, postal_codes[key]):
+            return f"delivery personnel {delivery_personnel_id} serves two postal codes"
+        serving[delivery_personnel_id] = postal_codes[key]
+        positions[delivery_personnel_id].add(position)
+    for delivery_personnel_id, taken in positions.items():
+        if taken and taken != set(range(loads[delivery_personnel_id], loads[delivery_personnel_id] + len(taken))):
+            return f"delivery personnel {delivery_personnel_id} has gaps or duplicates in its queue"
+        if taken and max(taken) >= capacity:
+            return f"delivery personnel {delivery_personnel_id} is over capacity"
+    return None
+
+
+def summarize(label, plan, base_minutes, seconds):
+    # Same terms as calculate_estimated_delivery_time: base time plus 5 minutes per order ahead
+    minutes = [base_minutes[key] + 5 * position for key, _, position in plan]
+    average = sum(minutes) / len(minutes) if minutes else 0
+    print(f"  {label:<18} {len(plan):>7} {average:>12.1f} {max(minutes, default=0):>10} {seconds * 1000:>10.1f}")
+    return average
+
+
+def compare(orders, couriers, postal_code_count, capacity):
+    rng = random.Random(42)
+    postal_codes = [str(6211 + n) for n in range(postal_code_count)]
+    # A few busy postal codes and a long tail
+    weights = [1 / (rank + 1) for rank in range(len(postal_codes))]
+
+    waiting = []
+    base_minutes = {}
+    for key in range(orders):
+        postal_code = rng.choices(postal_codes, weights)[0]
+        waiting.append((key, postal_code))
+        # Preparation, pizzas and desserts, and the postal code distance
+        base_minutes[key] = 5 + rng.randint(1, 6) + abs(int(postal_code) - 6211) // 5
+
+    personnel = []
+    for delivery_personnel_id in range(couriers):
+        if rng.random() < 0.4:
+            personnel.append((delivery_personnel_id, rng.choice(postal_codes), rng.randrange(capacity)))
+        else:
+            personnel.append((delivery_personnel_id, None, 0))
+
+    print(f"\n{orders} waiting orders, {couriers} delivery personnel, {postal_code_count} postal codes, "
+          f"capacity {capacity}")
+    print(f"  {'':<18} {'assigned':>7} {'avg ETA min':>12} {'max ETA':>10} {'solve ms':>10}")
+
+    greedy_seconds, greedy_plan = timed(lambda: greedy_assignments(waiting, personnel))
+    summarize('greedy', greedy_plan, base_minutes, greedy_seconds)
+    capped_seconds, capped_plan = timed(lambda: greedy_assignments(waiting, personnel, capacity))
+    capped_average = summarize('greedy, capped', capped_plan, base_minutes, capped_seconds)
+    batch_seconds, batch_plan = timed(lambda: plan_assignments(waiting, personnel, capacity))
+    batch_average = summarize('plan_assignments', batch_plan, base_minutes, batch_seconds)
+
+    problem = check_plan(waiting, personnel, batch_plan, capacity)
+    if problem:
+        print(f"\nInvalid plan: {problem}")
+        sys.exit(1)
+    if len(batch_plan) < len(capped_plan) or (
+            len(batch_plan) == len(capped_plan) and batch_average > capped_average + 1e-9):
+        print("\nplan_assignments did worse than the capped greedy matching")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=3000)
+    parser.add_argument('--couriers', type=int, default=300)
+    parser.add_argument('--postal-codes', type=int, default=40)
+    parser.add_argument('--capacity', type=int, default=MAX_ORDERS_PER_DELIVERY_PERSONNEL)
+    parser.add_argument('--skip-dispatch', action='store_true', help='Skip timing the dispatcher against SQLite')
+    args = parser.parse_args()
+
+    # A backlog the delivery personnel can absorb, and one that exceeds their capacity
+    for orders in (args.orders // 4, args.orders):
+        compare(orders, args.couriers, args.postal_codes, args.capacity)
+
+    if not args.skip_dispatch:
+        time_dispatcher(args.orders, args.couriers)
+
+
+def time_dispatcher(orders, couriers):
+    from functionality.delivery import update_pending_deliveries
+    from setup.extensions import db
+    from setup.seed_data import seed_data
+    from setup.synthetic_data import generate_synthetic_data
+
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        seed_data()
+        generate_synthetic_data(
+            orders, orders_per_customer=1, items_per_order=2, delivery_personnel=couriers, waiting_orders=orders
+        )
+        start = time.perf_counter()
+        matched, waiting = update_pending_deliveries()
+        elapsed = time.perf_counter() - start
+        db.engine.dispose()
+    drop_database(app)
+    print(f"\nupdate_pending_deliveries assigned {matched} of {waiting} waiting deliveries in {elapsed * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Query counts of the order detail pages.
+
+Usage: python -m benchmarks.bench_order_detail_queries
+
+Places orders of increasing cart size and counts the SQL statements issued by the
+order status page, the status JSON endpoint, the thank-you page and cancellation.
+Exits non-zero if any of them issues more queries for a larger cart.
+"""
+
+import os
+import sys
+
+from sqlalchemy import event
+from benchmarks.common import drop_database, login_as, make_app
+from functionality.identity_cache import identity_cache
+from models import Customer, MenuItem
+from setup.extensions import db
+from setup.seed_data import seed_data
+
+CART_SIZES = [1, 10, 50]
+
+
+def count_queries(app, func):
+    counter = {'statements': 0}
+
+    def count_statement(conn, cursor, statement, *_):
+        counter['statements'] += 1
+        if os.environ.get('SHOW_SQL'):
+            print('   ', statement.split(chr(10))[0][:100])
+
+    with app.app_context():
+        engine = db.engine
+    # Every measurement loads the logged-in customer, not only the first one
+    identity_cache.clear()
+    event.listen(engine, 'before_cursor_execute', count_statement)
+    try:
+        func()
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_statement)
+    return counter['statements']
+
+
+def main():
+    from functionality.order import create_order
+
+    app = make_app(with_routes=True)
+    with app.app_context():
+        db.create_all()
+        seed_data()
+        customer_id = Customer.query.first().id
+        menu_item_ids = [item.id for item in MenuItem.query.all()]
+        order_ids = {}
+        for size in CART_SIZES:
+            customer = db.session.get(Customer, customer_id)
+            items = [{'menu_item_id': menu_item_ids[i % len(menu_item_ids)], 'quantity': 1} for i in range(size)]
+            order_ids[size] = create_order(customer=customer, items=items).id
+        # One more order keeps the delivery personnel busy, so every cancellation takes the same path
+        create_order(customer=db.session.get(Customer, customer_id), items=[{'menu_item_id': menu_item_ids[0], 'quantity': 1}])
+        db.session.remove()
+
+    client = app.test_client()
+    login_as(client, customer_id)
+    pages = {
+        'order status page': lambda order_id: client.get(f'/order_status/{order_id}'),
+        'order status JSON': lambda order_id: client.get(f'/order_status/{order_id}/status'),
+        'thank you page': lambda order_id: client.get(f'/thank_you/{order_id}'),
+        'cancel order': lambda order_id: client.post(f'/cancel_order/{order_id}'),
+    }
+
+    growing = []
+    print(f"{'':20}" + ''.join(f"{f'{size} items':>10}" for size in CART_SIZES))
+    for name, request_page in pages.items():
+        counts = [count_queries(app, lambda: request_page(order_ids[size])) for size in CART_SIZES]
+        print(f"{name:20}" + ''.join(f"{count:>10}" for count in counts))
+        if len(set(counts)) > 1:
+            growing.append(name)
+
+    drop_database(app)
+
+    if growing:
+        print(f"\nQuery count grows with cart size for: {', '.join(growing)}")
+        sys.exit(1)
+    print("\nQuery counts do not depend on cart size.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Password hashing benchmark: a signup burst next to order status polling.
+
+Usage: python -m benchmarks.bench_password_hashing [--signups N] [--pollers N] [--seconds N]
+                                                   [--workers N] [--queue-depth N]
+
+Runs one app (like one server process with request threads) where --signups threads
+register a new customer and log in, over and over, while --pollers threads poll
+/order_status/<id>/status as a customer waiting for their pizza. Compares hashing in
+the request thread with hashing in the setup.passwords worker pool and reports:
+
+    logins/s, registrations/s   completed during the burst
+    503s                        requests turned away because the pool was saturated
+                                (the signup threads then wait for Retry-After)
+    poll p50/p99                latency of the co-located status polls
+"""
+
+import argparse
+import itertools
+import threading
+import time
+
+from benchmarks.common import drop_database, login_as, make_app
+from benchmarks.load_test import percentile
+from setup.extensions import db
+from setup.passwords import password_hasher
+
+SEED_EMAIL = 'max.milcarz@yahoo.com'
+SEED_PASSWORD = 'passward'
+
+
+def run_scenario(app, args, workers, order_id, customer_id):
+    app.config['PASSWORD_HASH_WORKERS'] = workers
+    app.config['PASSWORD_HASH_QUEUE_DEPTH'] = args.queue_depth
+    password_hasher.init_app(app)
+    password_hasher.start()
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    counts = {'logins': 0, 'registrations': 0, 'rejected': 0}
+    poll_latencies = []
+    numbers = itertools.count()
+
+    def signup():
+        client = app.test_client()
+        while not stop.is_set():
+            number = next(numbers)
+            response = client.post('/register', data={
+                'name': f'Burst User {number}',
+                'gender': 'Other',
+                'birthdate': '1990-01-01',
+                'phone': f'06{number:08d}',
+                'address': f'Burststraat {number}',
+                'postal_code': '6229',
+                'email': f'burst-{workers}-{number}@example.com',
+                'password': 'burst-password',
+                'confirm_password': 'burst-password'
+            })
+            login = client.post('/login', data={'email': SEED_EMAIL, 'password': SEED_PASSWORD})
+            with lock:
+                counts['registrations'] += response.status_code == 302
+                counts['logins'] += login.status_code == 302
+                counts['rejected'] += (response.status_code == 503) + (login.status_code == 503)
+            client.get('/logout')
+            for turned_away in (response, login):
+                if turned_away.status_code == 503:
+                    # Back off like a browser honouring Retry-After
+                    stop.wait(float(turned_away.headers['Retry-After']))
+                    break
+
+    def poll():
+        client = app.test_client()
+        login_as(client, customer_id)
+        latencies = []
+        while not stop.is_set():
+            start = time.perf_counter()
+            response = client.get(f'/order_status/{order_id}/status')
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.status_code
+        with lock:
+            poll_latencies.extend(latencies)
+
+    threads = [threading.Thread(target=signup) for _ in range(args.signups)]
+    threads += [threading.Thread(target=poll) for _ in range(args.pollers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    password_hasher.shutdown()
+
+    poll_latencies.sort()
+    return counts, poll_latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--signups', type=int, default=16, help='Threads registering and logging in')
+    parser.add_argument('--pollers', type=int, default=4, help='Threads polling an order status')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=2, help='Hashing processes of the pool')
+    parser.add_argument('--queue-depth', type=int, default=4)
+    args = parser.parse_args()
+
+    from functionality.order import create_order
+    from models import Customer
+    from setup.seed_data import seed_data
+
+    app = make_app(with_routes=True)
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.logger.setLevel('ERROR')
+    with app.app_context():
+        db.create_all()
+        seed_data()
+        customer = Customer.query.filter_by(email=SEED_EMAIL).first()
+        customer_id = customer.id
+        order_id = create_order(customer=customer, items=[{'menu_item_id': 1, 'quantity': 1}]).id
+
+    print(f"{args.signups} signup threads, {args.pollers} polling threads, {args.seconds:.0f}s per scenario\n")
+    print(f"  {'':<28} {'logins/s':>9} {'registrations/s':>16} {'503s':>6} {'poll p50 ms':>12} {'poll p99 ms':>12}")
+    for label, workers in (('hashing in request threads', 0),
+                           (f'pool of {args.workers} (queue {args.queue_depth})', args.workers)):
+        counts, polls = run_scenario(app, args, workers, order_id, customer_id)
+        print(f"  {label:<28} {counts['logins'] / args.seconds:>9.1f} {counts['registrations'] / args.seconds:>16.1f} "
+              f"{counts['rejected']:>6} {percentile(polls, 0.5) * 1000:>12.2f} {percentile(polls, 0.99) * 1000:>12.2f}")
+
+    drop_database(app)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Pricing benchmark.
+
+Usage: python -m benchmarks.bench_pricing [--lines N] [--menu-size N]
+
+Compares pricing a cart line by line with calculate_final_price (as the routes
+used to) against calculate_cart_prices, for a large cart and for re-pricing a
+whole menu. Both paths are checked to produce identical amounts.
+"""
+
+import argparse
+import random
+import sys
+from decimal import ROUND_HALF_UP, Decimal
+
+from benchmarks.common import timed
+from functionality.utils import calculate_cart_prices, calculate_final_price
+
+
+def price_line_by_line(base_prices, quantities, discount_percentage):
+    final_prices = [calculate_final_price(base_price) for base_price in base_prices]
+    subtotal = sum(final_price * quantity for final_price, quantity in zip(final_prices, quantities))
+    discount_amount = (subtotal * (discount_percentage / Decimal('100'))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    total = (subtotal - discount_amount).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    return {'final_prices': final_prices, 'subtotal': subtotal, 'discount_amount': discount_amount, 'total': total}
+
+
+def compare(label, base_prices, quantities, discount_percentage, repeat):
+    baseline_seconds, expected = timed(lambda: price_line_by_line(base_prices, quantities, discount_percentage), repeat)
+    batch_seconds, actual = timed(lambda: calculate_cart_prices(base_prices, quantities, discount_percentage), repeat)
+    if actual != expected:
+        print(f"{label}: results differ from calculate_final_price")
+        sys.exit(1)
+    print(f"\n{label}")
+    print(f"    line by line: {baseline_seconds * 1000:9.3f} ms")
+    print(f"    batch:        {batch_seconds * 1000:9.3f} ms  ({baseline_seconds / batch_seconds:.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lines', type=int, default=10000)
+    parser.add_argument('--menu-size', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+
+    # A realistic cart: many lines drawn from a small menu
+    menu_prices = [Decimal(rng.randrange(50, 2000)) / 100 for _ in range(16)]
+    cart_prices = [rng.choice(menu_prices) for _ in range(args.lines)]
+    cart_quantities = [rng.randint(1, 5) for _ in range(args.lines)]
+    compare(f"{args.lines}-line cart, 20% discount", cart_prices, cart_quantities, Decimal('20.00'), args.repeat)
+
+    # Re-pricing a large menu where most prices are distinct
+    all_prices = [Decimal(rng.randrange(1, 100000)) / 100 for _ in range(args.menu_size)]
+    compare(f"re-price a {args.menu_size}-item menu", all_prices, [1] * args.menu_size, Decimal('0.00'), args.repeat)
+
+    print("\nBatch results match calculate_final_price exactly.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Read replica benchmark: checkout latency while the admin reports run.
+
+Usage: python -m benchmarks.bench_read_replica [--customers N] [--readers N] [--seconds N]
+
+Generates a history of orders, then runs a writer process placing orders through
+create_order for --seconds in three scenarios:
+
+    no reports           the writer alone
+    reports on primary   --readers processes loading the earnings report (scanning the
+                         orders, without the rollups), order management and its CSV
+                         export in a loop, on the primary database
+    reports on replica   the same, with the report routes reading the snapshot that
+                         setup.replica keeps (refreshed every --refresh seconds)
+
+and reports the writer's checkout latency (p50, p95, max) and the pages served.
+Set SQLITE_JOURNAL_MODE=DELETE to see the contention without WAL.
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import time
+
+from sqlalchemy.exc import OperationalError
+from benchmarks.common import drop_database, login_as, make_app
+from setup.extensions import db
+from setup.replica import read_replica
+
+REPORT_URLS = ('/earnings_report', '/order_management', '/order_management/export.csv')
+
+
+def place_orders(database_path, seconds, customer_ids, menu_item_ids, results):
+    from functionality.order import create_order
+    from models import Customer
+
+    app = make_app(database_path=database_path)
+    rng = random.Random(0)
+    latencies = []
+    with app.app_context():
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            customer_id = rng.choice(customer_ids)
+            items = [{'menu_item_id': rng.choice(menu_item_ids), 'quantity': 1}]
+            start = time.perf_counter()
+            while True:
+                try:
+                    create_order(customer=db.session.get(Customer, customer_id), items=items)
+                    break
+                except OperationalError:
+                    # Database locked; the retry counts towards the latency
+                    db.session.rollback()
+            latencies.append(time.perf_counter() - start)
+            db.session.remove()
+        db.engine.dispose()
+    results.put(('writer', latencies))
+
+
+def load_reports(database_path, admin_id, use_replica, stop, results):
+    # Lowest CPU priority, so on small machines the writer is slowed down by the
+    # database, not by sharing a core with the readers
+    os.nice(19)
+    app = make_app(database_path=database_path, with_routes=True)
+    app.config['USE_EARNINGS_ROLLUPS'] = False
+    app.config['SLOW_QUERY_THRESHOLD_MS'] = None
+    if use_replica:
+        # Serves the snapshot the main process refreshes
+        app.config['READ_REPLICA_SNAPSHOT_SECONDS'] = 3600
+        read_replica.init_app(app)
+    client = app.test_client()
+    login_as(client, admin_id)
+    pages = 0
+    while not stop.is_set():
+        for url in REPORT_URLS:
+            response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+            pages += 1
+    with app.app_context():
+        db.engine.dispose()
+        if read_replica.engine is not None:
+            read_replica.engine.dispose()
+    results.put(('reader', pages))
+
+
+def run_scenario(database_path, args, readers, use_replica, customer_ids, menu_item_ids, admin_id):
+    results = multiprocessing.Queue()
+    stop = multiprocessing.Event()
+    processes = [
+        multiprocessing.Process(target=load_reports, args=(database_path, admin_id, use_replica, stop, results))
+        for _ in range(readers)
+    ]
+    for process in processes:
+        process.start()
+    if readers:
+        # Let the readers warm up before measuring
+        time.sleep(1)
+    writer = multiprocessing.Process(
+        target=place_orders, args=(database_path, args.seconds, customer_ids, menu_item_ids, results)
+    )
+    writer.start()
+    if use_replica:
+        # Only once every process is forked: a fork while the thread is copying the database deadlocks
+        read_replica.start()
+    writer.join()
+    stop.set()
+    read_replica.stop()
+
+    latencies = []
+    pages = 0
+    for _ in range(readers + 1):
+        kind, value = results.get()
+        if kind == 'writer':
+            latencies = value
+        else:
+            pages += value
+    for process in processes:
+        process.join()
+    return latencies, pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--customers', type=int, default=20000, help='Customers with 5 past orders each')
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--refresh', type=float, default=5, help='Snapshot refresh interval in seconds')
+    args = parser.parse_args()
+
+    from functionality.earnings_rollups import backfill_earnings_rollups
+    from models import Customer, MenuItem
+    from setup.seed_data import seed_data
+    from setup.synthetic_data import generate_synthetic_data
+
+    app = make_app()
+    database_path = app.config['BENCH_DATABASE_PATH']
+    with app.app_context():
+        db.create_all()
+        seed_data()
+        generate_synthetic_data(args.customers)
+        backfill_earnings_rollups()
+        customer_ids = [customer_id for customer_id, in db.session.query(Customer.id).limit(1000)]
+        menu_item_ids = [item_id for item_id, in db.session.query(MenuItem.id)]
+        admin_id = Customer.query.filter_by(is_admin=True).first().id
+    app.config['READ_REPLICA_SNAPSHOT_SECONDS'] = args.refresh
+    read_replica.init_app(app)
+
+    print(f"{args.customers} customers, {args.readers} report readers, {args.seconds:.0f}s of checkout per scenario\n")
+    print(f"  {'':<20} {'orders':>7} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'report pages':>13}")
+    for label, readers, use_replica in (('no reports', 0, False),
+                                        ('reports on primary', args.readers, False),
+                                        ('reports on replica', args.readers, True)):
+        if use_replica:
+            read_replica.refresh()
+        latencies, pages = run_scenario(database_path, args, readers, use_replica,
+                                        customer_ids, menu_item_ids, admin_id)
+        latencies_ms = sorted(latency * 1000 for latency in latencies)
+        print(f"  {label:<20} {len(latencies_ms):>7} {statistics.median(latencies_ms):>8.2f} "
+              f"{latencies_ms[int(len(latencies_ms) * 0.95)]:>8.2f} {latencies_ms[-1]:>8.2f} {pages:>13}")
+
+    if read_replica.engine is not None:
+        read_replica.engine.dispose()
+    drop_database(app)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Route batching benchmark.
+
+Usage: python -m benchmarks.bench_routes [--couriers N] [--stops N] [--orders N]
+
+Gives each delivery personnel a trip of up to --stops orders in one delivery zone
+and compares the driving time of:
+
+    one trip per order     restaurant -> customer -> restaurant for every order
+    assignment order       one trip visiting the customers in the order they were assigned
+    order_stops            one trip visiting them in the order found by order_stops
+
+reporting deliveries per courier-hour, and how far the route to the last customer
+found by order_stops is from the shortest one (found by brute force).
+
+Finally times plan_routes against a SQLite database with --orders orders being
+prepared, as during the dinner rush.
+"""
+
+import argparse
+import itertools
+import random
+import time
+from datetime import datetime
+
+from benchmarks.common import drop_database, make_app
+from functionality.matching import MAX_ORDERS_PER_DELIVERY_PERSONNEL
+from functionality.routing import RESTAURANT_POSTAL_CODE, STOP_MINUTES, delivery_zone, distance_matrix, order_stops, route_length
+
+
+def trip_minutes(route, distances, stops):
+    # Driving along the route, handing over every order and driving back to the restaurant
+    return route_length(route, distances) + distances[route[-1]][RESTAURANT_POSTAL_CODE] + STOP_MINUTES * stops
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--couriers', type=int, default=1000)
+    parser.add_argument('--stops', type=int, default=MAX_ORDERS_PER_DELIVERY_PERSONNEL)
+    parser.add_argument('--orders', type=int, default=3000, help='Orders being prepared when timing plan_routes')
+    parser.add_argument('--skip-plan-routes', action='store_true')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    postal_codes = [str(code) for code in range(6211, 6300)]
+    zones = {}
+    for postal_code in postal_codes:
+        zones.setdefault(delivery_zone(postal_code), []).append(postal_code)
+
+    separate = assignment_order = batched = 0
+    heuristic_length = best_length = 0
+    stops_total = 0
+    heuristic_seconds = 0
+    for _ in range(args.couriers):
+        zone = rng.choice(list(zones))
+        stops = [rng.choice(zones[zone]) for _ in range(rng.randint(1, args.stops))]
+        distances = distance_matrix(stops)
+        stops_total += len(stops)
+
+        separate += sum(2 * distances[RESTAURANT_POSTAL_CODE][stop] + STOP_MINUTES for stop in stops)
+        assignment_order += trip_minutes(list(dict.fromkeys(stops)), distances, len(stops))
+        start = time.perf_counter()
+        route = order_stops(set(stops), distances)
+        heuristic_seconds += time.perf_counter() - start
+        batched += trip_minutes(route, distances, len(stops))
+        heuristic_length += route_length(route, distances)
+        best_length += min(route_length(permutation, distances) for permutation in itertools.permutations(set(stops)))
+
+    print(f"{args.couriers} trips, {stops_total} orders, up to {args.stops} stops per trip\n")
+    print(f"  {'':<22} {'courier minutes':>16} {'deliveries/courier-hour':>24}")
+    for label, minutes in (('one trip per order', separate), ('assignment order', assignment_order),
+                           ('order_stops', batched)):
+        print(f"  {label:<22} {minutes:>16} {stops_total / (minutes / 60):>24.1f}")
+    print(f"\n  order_stops routes are {100 * (heuristic_length - best_length) / max(best_length, 1):.2f}% longer "
+          f"than the shortest ones, {heuristic_seconds / args.couriers * 1e6:.1f} us per trip")
+
+    if not args.skip_plan_routes:
+        time_plan_routes(args.orders)
+
+
+def time_plan_routes(orders):
+    from functionality.delivery import update_pending_deliveries
+    from functionality.routing import plan_routes
+    from setup.extensions import db
+    from setup.seed_data import seed_data
+    from setup.synthetic_data import generate_synthetic_data
+
+    app = make_app()
+    with app.app_context():
+        db.create_all()
+        seed_data()
+        # Enough delivery personnel to take every waiting order
+        generate_synthetic_data(
+            orders, orders_per_customer=1, items_per_order=2,
+            delivery_personnel=orders // MAX_ORDERS_PER_DELIVERY_PERSONNEL + 1, waiting_orders=orders
+        )
+        update_pending_deliveries()
+        start = time.perf_counter()
+        trips, changed = plan_routes(now=datetime.now())
+        elapsed = time.perf_counter() - start
+        db.engine.dispose()
+    drop_database(app)
+    print(f"\nplan_routes planned {trips} trips and updated {changed} estimated delivery times in {elapsed * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
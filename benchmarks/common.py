@@ -0,0 +1,81 @@
+# benchmarks/common.py
+
+import os
+import tempfile
+import time
+
+from flask import Flask
+from setup.database import init_database
+from setup.extensions import db, login_manager
+
+
+def make_app(database_path=None, with_routes=False):
+    """
+    Create a Flask app bound to a file-backed SQLite database for benchmarking.
+
+    When DATABASE_URL is set, that database is used instead (e.g. a scratch PostgreSQL
+    database), with the same engine configuration as the app; database_path is then
+    ignored. The scheduler and lifecycle engine are never started, so benchmarks
+    exercise the functionality layer (and, with with_routes, the real routes) directly.
+    """
+    database_uri = None
+    if not os.environ.get('DATABASE_URL'):
+        if database_path is None:
+            fd, database_path = tempfile.mkstemp(prefix='pizza_bench_', suffix='.db')
+            os.close(fd)
+        database_uri = f'sqlite:///{database_path}'
+    else:
+        database_path = None
+    # Root the app at the repository so the real templates and static files are used
+    app = Flask('app', root_path=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SECRET_KEY'] = 'benchmark'
+    init_database(app, database_uri)
+    app.config['BENCH_DATABASE_PATH'] = database_path
+    if with_routes:
+        from functionality.identity_cache import identity_cache, load_user
+        from routes import register_routes
+        from setup.query_stats import init_query_stats
+
+        app.config['ORDER_STATUS_STREAM_KEEPALIVE_SECONDS'] = 15
+        login_manager.init_app(app)
+        identity_cache.init_app(app)
+        login_manager.user_loader(load_user)
+        init_query_stats(app)
+        register_routes(app)
+    return app
+
+
+def drop_database(app):
+    """Delete the benchmark database: the SQLite file, its WAL files and replica snapshot, or every table on DATABASE_URL."""
+    with app.app_context():
+        if app.config['BENCH_DATABASE_PATH'] is None:
+            db.drop_all()
+        db.engine.dispose()
+    database_path = app.config['BENCH_DATABASE_PATH']
+    if database_path is not None:
+        root, extension = os.path.splitext(database_path)
+        # Including the read replica snapshot, if one was taken
+        for base in (database_path, f'{root}-replica{extension}'):
+            for path in (base, f'{base}-wal', f'{base}-shm'):
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+def login_as(client, customer_id):
+    """Authenticate a test client as the given customer without going through /login."""
+    with client.session_transaction() as session:
+        session['_user_id'] = str(customer_id)
+        session['_fresh'] = True
+
+
+def timed(func, repeat=5):
+    """Run func repeat times and return (best_seconds, last_result)."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
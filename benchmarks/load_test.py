@@ -0,0 +1,255 @@
+"""
+Load test of the ordering flow.
+
+Usage: python -m benchmarks.load_test [--users N] [--workers N] [--polls N]
+                                      [--customers N] [--couriers N] [--menu-items N]
+                                      [--admin-requests N] [--seed N] [--json PATH]
+                                      [--async-intake]
+
+Seeds a file-backed SQLite database (seed_data() plus seed_scaled_data()) and drives
+the real routes through the Flask test client. Every simulated user registers, logs
+in, opens /order?item_ids=..., applies a discount code, places the order and then
+polls its status. The scheduler and lifecycle engine are not started: a stub runs the
+dispatcher and the due status transitions between polls, advancing a virtual clock
+so orders move through their lifecycle without waiting. With --async-intake, POST
+/order only queues the order and the stub also runs the order intake workers' batch.
+
+Reports p50/p95/p99 latency, throughput and average SQL statements per route. Use
+--json to save the results and compare branches.
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from benchmarks.common import drop_database, make_app
+from models import Customer, MenuItem
+from setup.extensions import db
+from setup.seed_data import seed_data, seed_scaled_data, SCALED_POSTAL_CODES
+
+CSRF_FIELD = re.compile(rb'name="csrf_token"[^>]*value="([^"]+)"|value="([^"]+)"[^>]*name="csrf_token"')
+CSRF_HEADER = re.compile(rb"X-CSRFToken': '([^']+)'")
+DISCOUNT_CODES = ['BUZZING', 'GOON', '123', '12345']
+
+
+class LoadTestError(Exception):
+    pass
+
+
+class Recorder:
+    """Thread-safe collection of latencies and SQL statement counts per route."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(int)
+        self.errors = defaultdict(int)
+
+    def record(self, route, elapsed, response, ok):
+        with self._lock:
+            self.latencies[route].append(elapsed)
+            self.queries[route] += int(response.headers.get('X-DB-Query-Count', 0))
+            if not ok:
+                self.errors[route] += 1
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(int(round(fraction * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+class StubScheduler:
+    """
+    Stand-in for APScheduler, the lifecycle engine and the order intake workers: tick()
+    fulfils the queued orders, then runs the dispatcher, route planning and every
+    transition due by a virtual clock that advances a minute per tick.
+    """
+
+    def __init__(self, app, async_intake=False):
+        self.app = app
+        self.async_intake = async_intake
+        self._lock = threading.Lock()
+        self._offset = timedelta(0)
+
+    def tick(self):
+        from functionality.delivery import update_pending_deliveries
+        from functionality.lifecycle import lifecycle_engine
+        from functionality.order_intake import order_intake
+        from functionality.routing import plan_routes
+
+        with self._lock, self.app.app_context():
+            self._offset += timedelta(minutes=1)
+            if self.async_intake:
+                order_intake.run_pending()
+            update_pending_deliveries()
+            plan_routes(now=datetime.now() + self._offset)
+            lifecycle_engine.run_due(now=datetime.now() + self._offset)
+
+
+def request(client, recorder, route, method, url, expected_status, **kwargs):
+    start = time.perf_counter()
+    response = client.open(url, method=method, **kwargs)
+    elapsed = time.perf_counter() - start
+    ok = response.status_code == expected_status
+    recorder.record(route, elapsed, response, ok)
+    if not ok:
+        raise LoadTestError(f"{method} {url} returned {response.status_code}, expected {expected_status}")
+    return response
+
+
+def csrf_token(html, pattern=CSRF_FIELD):
+    match = pattern.search(html)
+    if not match:
+        raise LoadTestError('No CSRF token found in page')
+    return next(group for group in match.groups() if group).decode()
+
+
+def run_user(app, recorder, scheduler, rng, user_number, menu_item_ids, polls):
+    client = app.test_client()
+    email = f'loadtest-user-{user_number}-{rng.randrange(10 ** 9)}@example.com'
+    password = 'loadtest'
+
+    page = request(client, recorder, 'GET /register', 'GET', '/register', 200)
+    token = csrf_token(page.data)
+    request(client, recorder, 'POST /register', 'POST', '/register', 302, data={
+        'csrf_token': token,
+        'name': f'Load Test User {user_number}',
+        'gender': rng.choice(['Male', 'Female', 'Other']),
+        'birthdate': f'{rng.randint(1950, 2004)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+        'phone': f'06{user_number:08d}',
+        'address': f'Loadteststraat {user_number}',
+        'postal_code': rng.choice(SCALED_POSTAL_CODES),
+        'email': email,
+        'password': password,
+        'confirm_password': password
+    })
+    request(client, recorder, 'POST /login', 'POST', '/login', 302, data={
+        'csrf_token': token, 'email': email, 'password': password
+    })
+
+    item_ids = rng.sample(menu_item_ids, k=min(len(menu_item_ids), rng.randint(1, 4)))
+    quantities = {item_id: rng.randint(1, 3) for item_id in item_ids}
+    query = '&'.join(f'item_ids={item_id}&quantities={quantities[item_id]}' for item_id in item_ids)
+    page = request(client, recorder, 'GET /order', 'GET', f'/order?{query}', 200)
+    order_token = csrf_token(page.data, CSRF_HEADER)
+
+    request(client, recorder, 'POST /apply_discount', 'POST', '/apply_discount', 200,
+            json={'discount_code': rng.choice(DISCOUNT_CODES)})
+
+    form = {'csrf_token': order_token}
+    for index, item_id in enumerate(sorted(item_ids)):
+        form[f'items-{index}-menu_item_id'] = str(item_id)
+        form[f'items-{index}-quantity'] = str(quantities[item_id])
+    response = request(client, recorder, 'POST /order', 'POST', '/order', 302, data=form)
+    order_id = int(re.search(r'/(\d+)$', response.headers['Location']).group(1))
+
+    request(client, recorder, 'GET /order_status/<id>', 'GET', f'/order_status/{order_id}', 200)
+    for _ in range(polls):
+        request(client, recorder, 'GET /order_status/<id>/status', 'GET', f'/order_status/{order_id}/status', 200)
+        scheduler.tick()
+
+
+def run_admin(app, recorder, admin_id, repeat):
+    from benchmarks.common import login_as
+
+    client = app.test_client()
+    login_as(client, admin_id)
+    for _ in range(repeat):
+        request(client, recorder, 'GET /earnings_report', 'GET', '/earnings_report', 200)
+        request(client, recorder, 'GET /earnings_report (filtered)', 'GET',
+                '/earnings_report?postal_code=6229&gender=Male&min_age=18&max_age=60', 200)
+        request(client, recorder, 'GET /order_management', 'GET', '/order_management', 200)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50, help='Simulated users (one full ordering flow each)')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent worker threads')
+    parser.add_argument('--polls', type=int, default=3, help='Status polls per order')
+    parser.add_argument('--customers', type=int, default=1000, help='Extra seeded customers')
+    parser.add_argument('--couriers', type=int, default=20, help='Extra seeded delivery personnel')
+    parser.add_argument('--menu-items', type=int, default=0, help='Extra seeded menu items')
+    parser.add_argument('--admin-requests', type=int, default=10, help='Admin report rounds after the users finish')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='Write the results to this file')
+    parser.add_argument('--async-intake', action='store_true', help='Queue orders for the order intake workers')
+    args = parser.parse_args()
+
+    app = make_app(with_routes=True)
+    app.logger.setLevel('WARNING')
+    if args.async_intake:
+        from functionality.order_intake import order_intake
+
+        app.config['ORDER_INTAKE_ASYNC'] = True
+        order_intake.init_app(app)
+    with app.app_context():
+        db.create_all()
+        seed_data()
+        seed_scaled_data(customers=args.customers, delivery_personnel=args.couriers,
+                         menu_items=args.menu_items, seed=args.seed)
+        menu_item_ids = [item_id for item_id, in db.session.query(MenuItem.id)]
+        admin_id = Customer.query.filter_by(is_admin=True).first().id
+
+    recorder = Recorder()
+    scheduler = StubScheduler(app, async_intake=args.async_intake)
+    failures = []
+    next_user = iter(range(1, args.users + 1))
+    next_user_lock = threading.Lock()
+
+    def worker(worker_number):
+        rng = random.Random(args.seed * 1000 + worker_number)
+        while True:
+            with next_user_lock:
+                user_number = next(next_user, None)
+            if user_number is None:
+                return
+            try:
+                run_user(app, recorder, scheduler, rng, user_number, menu_item_ids, args.polls)
+            except LoadTestError as e:
+                failures.append(str(e))
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    run_admin(app, recorder, admin_id, args.admin_requests)
+    elapsed = time.perf_counter() - start
+
+    results = {'users': args.users, 'workers': args.workers, 'seconds': round(elapsed, 3),
+               'failed_users': len(failures), 'routes': {}}
+    print(f"{args.users} users, {args.workers} workers, {elapsed:.2f}s, {len(failures)} failed users")
+    print(f"{'route':38} {'count':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'queries':>8}")
+    for route, latencies in sorted(recorder.latencies.items()):
+        latencies = sorted(latencies)
+        stats = {
+            'count': len(latencies),
+            'errors': recorder.errors[route],
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'throughput': round(len(latencies) / elapsed, 2),
+            'avg_queries': round(recorder.queries[route] / len(latencies), 2)
+        }
+        results['routes'][route] = stats
+        print(f"{route:38} {stats['count']:>6} {stats['errors']:>6} {stats['p50_ms']:>8} {stats['p95_ms']:>8} "
+              f"{stats['p99_ms']:>8} {stats['throughput']:>8} {stats['avg_queries']:>8}")
+    for failure in failures[:10]:
+        print(f"  failed: {failure}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    drop_database(app)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Concurrent delivery personnel claiming stress test.
+
+Usage: python -m benchmarks.stress_courier_claims [--workers N] [--orders N] [--couriers N] [--unconditional]
+
+Starts several worker processes (like several gunicorn workers), each with its own
+app, database connections and courier availability index, that place orders through
+create_order against the same file-backed SQLite database. Customers are spread
+over many postal codes and there are few delivery personnel, so workers constantly
+compete for the same unassigned delivery personnel.
+
+Afterwards it checks that no assignment was lost or double-booked: every delivery
+being prepared belongs to a delivery personnel who serves exactly the delivery zone
+of that customer's postal code, and every order has exactly one delivery. Exits 1
+on a violation.
+"""
+
+import argparse
+import multiprocessing
+import random
+import sys
+import time
+from collections import defaultdict
+
+from sqlalchemy.exc import OperationalError
+from benchmarks.common import drop_database, make_app
+from setup.extensions import db
+
+
+def unconditional_claim(delivery_personnel_id, postal_code, now):
+    """The pre-claim behaviour: overwrite the postal code without checking availability or zone."""
+    from sqlalchemy import update
+    from models import DeliveryPersonnel
+
+    db.session.execute(
+        update(DeliveryPersonnel)
+        .where(DeliveryPersonnel.id == delivery_personnel_id)
+        .values(postal_code=postal_code, last_delivery_time=now)
+    )
+    return True
+
+
+def place_orders(database_path, worker_number, orders, customer_ids, menu_item_ids, unconditional, results):
+    import functionality.delivery
+    from functionality.delivery import complete_delivery
+    from functionality.order import create_order
+    from models import Customer, Delivery, OrderStatusEnum
+
+    if unconditional:
+        functionality.delivery.claim_delivery_personnel = unconditional_claim
+
+    app = make_app(database_path=database_path)
+    rng = random.Random(worker_number)
+    placed = assigned = busy_retries = 0
+
+    def retry(func):
+        nonlocal busy_retries
+        while True:
+            try:
+                return func()
+            except OperationalError:
+                # SQLite allows a single writer; retry the whole transaction
+                db.session.rollback()
+                busy_retries += 1
+                time.sleep(rng.random() / 100)
+
+    with app.app_context():
+        for _ in range(orders):
+            customer_id = rng.choice(customer_ids)
+            items = [{'menu_item_id': rng.choice(menu_item_ids), 'quantity': 1}]
+            order = retry(lambda: create_order(customer=db.session.get(Customer, customer_id), items=items))
+            placed += 1
+            assigned += order.delivery.delivery_personnel_id is not None
+
+            # Complete deliveries now and then so delivery personnel become unassigned again
+            if rng.random() < 0.3:
+                delivery = Delivery.query.filter_by(status=OrderStatusEnum.Being_Prepared).order_by(Delivery.id).first()
+                if delivery:
+                    retry(lambda: complete_delivery(delivery.id))
+        db.engine.dispose()
+    results.put((placed, assigned, busy_retries))
+
+
+def check_assignments():
+    """Return a list of invariant violations."""
+    from functionality.routing import delivery_zone
+    from models import Customer, Delivery, DeliveryPersonnel, Order, OrderStatusEnum
+
+    violations = []
+    zones_by_courier = defaultdict(set)
+    rows = db.session.query(Delivery.delivery_personnel_id, Customer.postal_code).join(
+        Order, Delivery.order_id == Order.id
+    ).join(Customer).filter(
+        Delivery.status == OrderStatusEnum.Being_Prepared
+    ).all()
+    for courier_id, postal_code in rows:
+        zones_by_courier[courier_id].add(delivery_zone(postal_code))
+
+    couriers = {courier.id: courier for courier in DeliveryPersonnel.query.all()}
+    for courier_id, zones in zones_by_courier.items():
+        if len(zones) > 1:
+            violations.append(f"Delivery personnel {courier_id} double-booked for zones {sorted(zones)}")
+        elif delivery_zone(couriers[courier_id].postal_code) not in zones:
+            violations.append(
+                f"Delivery personnel {courier_id} serves zone {delivery_zone(couriers[courier_id].postal_code)} "
+                f"but has deliveries for zone {zones.pop()} (lost update)"
+            )
+
+    orders = Order.query.count()
+    deliveries = Delivery.query.count()
+    if orders != deliveries:
+        violations.append(f"{orders} orders but {deliveries} deliveries")
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--orders', type=int, default=100, help='Orders per worker')
+    parser.add_argument('--couriers', type=int, default=6)
+    parser.add_argument('--customers', type=int, default=400)
+    parser.add_argument('--unconditional', action='store_true',
+                        help='Claim delivery personnel with an unconditional UPDATE (shows the race)')
+    args = parser.parse_args()
+
+    from models import Customer, MenuItem
+    from setup.seed_data import seed_data, seed_scaled_data
+
+    app = make_app()
+    database_path = app.config['BENCH_DATABASE_PATH']
+    with app.app_context():
+        db.create_all()
+        seed_data()
+        seed_scaled_data(customers=args.customers, delivery_personnel=args.couriers)
+        customer_ids = [customer_id for customer_id, in db.session.query(Customer.id)]
+        menu_item_ids = [item_id for item_id, in db.session.query(MenuItem.id)]
+        db.engine.dispose()
+
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(
+            target=place_orders,
+            args=(database_path, n, args.orders, customer_ids, menu_item_ids, args.unconditional, results)
+        )
+        for n in range(args.workers)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    totals = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    placed = sum(total[0] for total in totals)
+    assigned = sum(total[1] for total in totals)
+    busy_retries = sum(total[2] for total in totals)
+    print(f"{args.workers} workers placed {placed} orders in {elapsed:.2f}s ({placed / elapsed:.1f} orders/s)")
+    print(f"  assigned immediately:  {assigned}")
+    print(f"  left waiting:          {placed - assigned}")
+    print(f"  busy retries:          {busy_retries}")
+
+    with app.app_context():
+        violations = check_assignments()
+        db.engine.dispose()
+    drop_database(app)
+
+    for violation in violations:
+        print(f"VIOLATION: {violation}")
+    if violations:
+        sys.exit(1)
+    print("No double-booked delivery personnel or lost updates.")
+
+
+if __name__ == '__main__':
+    main()
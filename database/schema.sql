@@ -98,4 +98,34 @@ CREATE TABLE OrderStatusHistory (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (order_id) REFERENCES `Order`(id)
 );
+CREATE TABLE ScheduledTransition (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    order_id INT NOT NULL,
+    status ENUM('Pending', 'Being Prepared', 'Waiting for Delivery Personnel', 'Being Delivered', 'Delivered', 'Cancelled') NOT NULL,
+    due_at TIMESTAMP NOT NULL,
+    FOREIGN KEY (order_id) REFERENCES `Order`(id)
+);
+CREATE TABLE EarningsRollup (
+    day DATE NOT NULL,
+    postal_code VARCHAR(10) NOT NULL,
+    gender ENUM('Male', 'Female', 'Other') NOT NULL,
+    birth_year INT NOT NULL,
+    order_count INT NOT NULL DEFAULT 0,
+    revenue_cents BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, postal_code, gender, birth_year)
+);
+
 
+-- Secondary indexes for the hot query paths (mirrors __table_args__ in models.py)
+CREATE INDEX ix_customer_postal_code ON Customer (postal_code);
+CREATE INDEX ix_customer_birthdate ON Customer (birthdate);
+CREATE INDEX ix_customer_gender ON Customer (gender);
+CREATE INDEX ix_order_customer_id ON `Order` (customer_id);
+CREATE INDEX ix_order_order_date_id ON `Order` (order_date, id);
+CREATE INDEX ix_order_status_order_date_id ON `Order` (status, order_date, id);
+CREATE INDEX ix_orderitem_order_id ON OrderItem (order_id);
+CREATE INDEX ix_deliverypersonnel_postal_code_is_available ON DeliveryPersonnel (postal_code, is_available);
+CREATE INDEX ix_delivery_personnel_id_status ON Delivery (delivery_personnel_id, status);
+CREATE INDEX ix_orderstatushistory_order_id ON OrderStatusHistory (order_id);
+CREATE INDEX ix_scheduledtransition_due_at ON ScheduledTransition (due_at);
+CREATE INDEX ix_scheduledtransition_order_id ON ScheduledTransition (order_id);
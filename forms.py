@@ -23,7 +23,7 @@ from wtforms.validators import (
     NumberRange,
     Optional
 )
-from models import Customer, MenuItem, MenuItemCategoryEnum
+from models import Customer, MenuItem, MenuItemCategoryEnum, OrderStatusEnum
 from datetime import date
 
 class EarningsReportFilterForm(FlaskForm):
@@ -42,6 +42,21 @@ class EarningsReportFilterForm(FlaskForm):
     max_age = IntegerField('Maximum Age', validators=[Optional(), NumberRange(min=0)])
     submit = SubmitField('Apply Filters')
     
+class OrderManagementFilterForm(FlaskForm):
+    # Disable CSRF protection for this form
+    class Meta:
+        csrf = False
+
+    status = SelectField('Status', choices=[('', 'All')] + [
+        (status.name, status.value) for status in OrderStatusEnum
+    ], validators=[Optional()])
+    postal_code = StringField('Postal Code', validators=[Optional()])
+    courier = SelectField('Delivery Personnel', choices=[('', 'All')], validators=[Optional()])  # Filled in by the route
+    date_from = DateField('From', validators=[Optional()])
+    date_to = DateField('To', validators=[Optional()])
+    sort = SelectField('Sort', choices=[('newest', 'Newest first'), ('oldest', 'Oldest first')], validators=[Optional()])
+    submit = SubmitField('Apply Filters')
+
 class RegistrationForm(FlaskForm):
     name = StringField('Name', validators=[DataRequired(), Length(min=2, max=50)])
     gender = SelectField(
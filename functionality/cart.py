@@ -0,0 +1,206 @@
+# functionality/cart.py
+
+import threading
+import time
+from collections import OrderedDict
+from decimal import ROUND_HALF_UP, Decimal
+
+CENT = Decimal('0.01')
+MAX_QUANTITY = 100  # Per menu item, as on the menu page
+
+
+def check_quantity(quantity):
+    """
+    :raises ValueError: If quantity is not between 0 and MAX_QUANTITY.
+    """
+    if not 0 <= quantity <= MAX_QUANTITY:
+        raise ValueError(f"Quantity must be between 0 and {MAX_QUANTITY}.")
+
+
+class CartLine:
+    """A menu item in a cart, with its final unit price cached from the menu snapshot."""
+
+    def __init__(self, item, unit_price, quantity):
+        self.menu_item_id = item['id']
+        self.name = item['name']
+        self.description = item.get('description')
+        self.unit_price = unit_price
+        self.quantity = quantity
+        self.line_total = unit_price * quantity
+
+    def to_dict(self):
+        return {
+            'id': self.menu_item_id,
+            'name': self.name,
+            'description': self.description,
+            'final_price': self.unit_price,
+            'quantity': self.quantity,
+            'line_total': self.line_total
+        }
+
+
+class Cart:
+    """
+    A customer's cart: its lines, the discount code applied and running totals.
+
+    The subtotal is adjusted by the difference whenever a line is added, changed or
+    removed, and the discount amount is derived from the subtotal, so changing a line
+    or applying a code costs the same whatever the size of the cart. Totals round like
+    calculate_cart_prices.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lines = OrderedDict()  # Menu item id -> CartLine
+        self.subtotal = Decimal('0.00')
+        self.discount_code = None
+        self.discount_percentage = Decimal('0.00')
+        self.discount_amount = Decimal('0.00')
+        self.menu_version = None  # Version of the menu snapshot the unit prices come from
+        self.touched_at = time.monotonic()
+
+    @property
+    def total(self):
+        return (self.subtotal - self.discount_amount).quantize(CENT, rounding=ROUND_HALF_UP)
+
+    def set_line(self, menu, menu_item_id, quantity):
+        """
+        Set the quantity of a menu item (0 removes it).
+
+        :param menu: The current MenuSnapshot, for the unit price of a new line.
+        :return: The CartLine, or None if removed.
+        :raises ValueError: If the quantity is out of range (see check_quantity) or the
+                            menu item does not exist.
+        """
+        check_quantity(quantity)
+        line = self.lines.get(menu_item_id)
+        if quantity == 0:
+            if line is not None:
+                del self.lines[menu_item_id]
+                self.subtotal -= line.line_total
+                self._discount_changed()
+            return None
+        if line is None:
+            if menu_item_id not in menu.items:
+                raise ValueError("Menu item not found.")
+            line = self.lines[menu_item_id] = CartLine(menu.items[menu_item_id], menu.final_prices[menu_item_id], 0)
+        self.subtotal += line.unit_price * quantity - line.line_total
+        line.quantity = quantity
+        line.line_total = line.unit_price * quantity
+        self._discount_changed()
+        return line
+
+    def replace_lines(self, menu, quantities):
+        """
+        Replace every line with the given {menu_item_id: quantity}, skipping items not on
+        the menu and quantities out of range.
+        """
+        self.lines.clear()
+        self.subtotal = Decimal('0.00')
+        for menu_item_id, quantity in quantities.items():
+            if menu_item_id in menu.items and 0 <= quantity <= MAX_QUANTITY:
+                self.set_line(menu, menu_item_id, quantity)
+        self._discount_changed()
+
+    def apply_discount(self, code, percentage):
+        self.discount_code = code
+        self.discount_percentage = Decimal(str(percentage))
+        self._discount_changed()
+
+    def reprice(self, menu):
+        """Take the unit prices from a newer menu snapshot, dropping items no longer on the menu."""
+        lines = list(self.lines.values())
+        self.lines.clear()
+        self.subtotal = Decimal('0.00')
+        self.menu_version = menu.version
+        for line in lines:
+            if line.menu_item_id in menu.items:
+                self.set_line(menu, line.menu_item_id, line.quantity)
+        self._discount_changed()
+
+    def summary(self):
+        """The totals, as returned by /apply_discount and the cart line route."""
+        return {
+            'subtotal': float(self.subtotal),
+            'discount_percentage': float(self.discount_percentage),
+            'discount_amount': float(self.discount_amount),
+            'total_after_discount': float(self.total)
+        }
+
+    def order_items(self):
+        """The lines as create_order / accept_order items."""
+        return [{'menu_item_id': line.menu_item_id, 'quantity': line.quantity} for line in self.lines.values()]
+
+    def _discount_changed(self):
+        self.discount_amount = (
+            self.subtotal * (self.discount_percentage / Decimal('100'))
+        ).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class CartStore:
+    """
+    Process-wide, size-bounded store of the customers' carts, keyed by customer id.
+
+    Replaces the item ids kept in the cookie session: the cart keeps quantities and
+    unit prices, so /order and /apply_discount no longer re-price it on every request.
+    Carts not used for ttl seconds are dropped, as is the least recently used one
+    beyond max_size. A cart is re-priced when the menu snapshot changes.
+    """
+
+    def __init__(self, ttl=7200, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._carts = OrderedDict()  # Customer id -> Cart
+
+    def init_app(self, app):
+        app.extensions['cart_store'] = self
+        self.ttl = app.config.get('CART_TTL_SECONDS', self.ttl)
+        self.max_size = app.config.get('CART_MAX_SIZE', self.max_size)
+        self.clear()
+
+    def get(self, customer_id, menu, create=True):
+        """
+        The customer's cart, with unit prices from the given menu snapshot.
+
+        Hold cart.lock while reading or changing it.
+
+        :param menu: The current MenuSnapshot.
+        :param create: Create an empty cart if the customer has none.
+        :return: The Cart, or None if the customer has none and create is False.
+        """
+        now = time.monotonic()
+        with self._lock:
+            cart = self._carts.get(customer_id)
+            if cart is not None and now - cart.touched_at >= self.ttl:
+                del self._carts[customer_id]
+                cart = None
+            if cart is None:
+                if not create:
+                    return None
+                cart = self._carts[customer_id] = Cart()
+                cart.menu_version = menu.version
+                while len(self._carts) > self.max_size:
+                    self._carts.popitem(last=False)
+            self._carts.move_to_end(customer_id)
+            cart.touched_at = now
+        if cart.menu_version != menu.version:
+            with cart.lock:
+                if cart.menu_version != menu.version:
+                    cart.reprice(menu)
+        return cart
+
+    def discard(self, customer_id):
+        with self._lock:
+            self._carts.pop(customer_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._carts.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'carts': len(self._carts), 'max_size': self.max_size, 'ttl_seconds': self.ttl}
+
+
+cart_store = CartStore()
@@ -0,0 +1,170 @@
+# functionality/courier_index.py
+
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from functionality.routing import delivery_zone
+from models import Delivery, DeliveryPersonnel, OrderStatusEnum
+from setup.extensions import db
+
+
+class CourierAvailabilityIndex:
+    """
+    Process-wide index of available delivery personnel, bucketed by the delivery zone
+    they serve (None = unassigned), with the number of active deliveries of each.
+
+    The database stays the source of truth: the index is rebuilt from committed rows on
+    first use, every max_age seconds (to pick up changes made by other processes) and
+    after a transaction that changed it is rolled back. Code that changes availability
+    or delivery statuses updates the index through assigned(), out_for_delivery() and
+    delivery_finished() in the same transaction.
+    """
+
+    def __init__(self, max_age=60):
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._loaded_at = None
+        self._available = defaultdict(dict)  # zone -> {courier_id: None}, in insertion order
+        self._zones = {}  # courier_id -> zone, for available couriers
+        self._preparing = defaultdict(int)  # courier_id -> deliveries Being Prepared
+        self._active = defaultdict(int)  # courier_id -> deliveries Being Prepared or Being Delivered
+
+    def rebuild(self):
+        """Reload the index from committed rows (on its own connection, outside any open transaction)."""
+        with db.engine.connect() as connection:
+            couriers = connection.execute(
+                select(DeliveryPersonnel.id, DeliveryPersonnel.postal_code)
+                .where(DeliveryPersonnel.is_available.is_(True))
+                .order_by(DeliveryPersonnel.id)
+            ).all()
+            counts = connection.execute(
+                select(Delivery.delivery_personnel_id, Delivery.status, func.count(Delivery.id))
+                .where(
+                    Delivery.delivery_personnel_id.isnot(None),
+                    Delivery.status.in_([OrderStatusEnum.Being_Prepared, OrderStatusEnum.Being_Delivered])
+                )
+                .group_by(Delivery.delivery_personnel_id, Delivery.status)
+            ).all()
+
+        with self._lock:
+            self._available = defaultdict(dict)
+            self._zones = {}
+            self._preparing = defaultdict(int)
+            self._active = defaultdict(int)
+            for courier_id, postal_code in couriers:
+                self._available[delivery_zone(postal_code)][courier_id] = None
+                self._zones[courier_id] = delivery_zone(postal_code)
+            for courier_id, status, count in counts:
+                self._active[courier_id] += count
+                if status == OrderStatusEnum.Being_Prepared:
+                    self._preparing[courier_id] += count
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None:
+            self.rebuild()
+        elif time.monotonic() - self._loaded_at >= self.max_age and not db.session.info.get('courier_index_changed'):
+            # Refresh, unless this transaction already made changes a reload would drop
+            self.rebuild()
+
+    def _changed(self):
+        # Rebuild if the transaction making this change is rolled back
+        db.session.info['courier_index_changed'] = True
+
+    def find(self, postal_code, capacity=None):
+        """
+        Pick an available delivery personnel for a postal code: the least busy one
+        already serving its delivery zone, otherwise an unassigned one.
+
+        :param capacity: Skip delivery personnel already preparing this many orders.
+        :return: The DeliveryPersonnel id, or None if nobody is available.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            serving = [
+                courier_id for courier_id in self._available.get(delivery_zone(postal_code), ())
+                if capacity is None or self._preparing[courier_id] < capacity
+            ]
+            if serving:
+                return min(serving, key=lambda courier_id: self._preparing[courier_id])
+            unassigned = self._available.get(None)
+            if unassigned:
+                return next(iter(unassigned))
+            return None
+
+    def preparing_count(self, courier_id):
+        """Number of deliveries of a delivery personnel that are being prepared."""
+        with self._lock:
+            self._ensure_loaded()
+            return self._preparing[courier_id]
+
+    def active_count(self, courier_id):
+        """Number of deliveries of a delivery personnel that are being prepared or delivered."""
+        with self._lock:
+            self._ensure_loaded()
+            return self._active[courier_id]
+
+    def assigned(self, courier_id, postal_code):
+        """A delivery being prepared was assigned to the courier, who now serves the zone of postal_code."""
+        with self._lock:
+            self._ensure_loaded()
+            if courier_id in self._zones:
+                zone = delivery_zone(postal_code)
+                self._available[self._zones[courier_id]].pop(courier_id, None)
+                self._available[zone][courier_id] = None
+                self._zones[courier_id] = zone
+            self._preparing[courier_id] += 1
+            self._active[courier_id] += 1
+            self._changed()
+
+    def out_for_delivery(self, courier_id):
+        """The courier left with a delivery and is no longer available."""
+        with self._lock:
+            self._ensure_loaded()
+            self._preparing[courier_id] = max(self._preparing[courier_id] - 1, 0)
+            zone = self._zones.pop(courier_id, None)
+            self._available[zone].pop(courier_id, None)
+            self._changed()
+
+    def delivery_finished(self, courier_id, was_preparing=False):
+        """
+        One of the courier's active deliveries was delivered or cancelled. When it was
+        the last one, the courier is available again without a postal code.
+
+        :param was_preparing: The delivery was still being prepared (cancellations).
+        :return: Number of active deliveries the courier has left.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if was_preparing:
+                self._preparing[courier_id] = max(self._preparing[courier_id] - 1, 0)
+            self._active[courier_id] = max(self._active[courier_id] - 1, 0)
+            remaining = self._active[courier_id]
+            if remaining == 0:
+                zone = self._zones.pop(courier_id, None)
+                self._available[zone].pop(courier_id, None)
+                self._available[None][courier_id] = None
+                self._zones[courier_id] = None
+            self._changed()
+            return remaining
+
+
+courier_index = CourierAvailabilityIndex()
+
+
+@event.listens_for(Session, 'after_commit')
+def _courier_index_committed(session):
+    session.info.pop('courier_index_changed', None)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _courier_index_rolled_back(session):
+    if session.info.pop('courier_index_changed', False):
+        courier_index.invalidate()
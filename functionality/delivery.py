@@ -1,93 +1,188 @@
 # functionality/delivery.py
 
-from models import DeliveryPersonnel, Delivery, MenuItemCategoryEnum, OrderStatusEnum
+from collections import defaultdict
+from sqlalchemy import func, or_, update
+from sqlalchemy.orm import joinedload
+from functionality.courier_index import courier_index
+from functionality.matching import MAX_ORDERS_PER_DELIVERY_PERSONNEL, plan_assignments
+from functionality.routing import ZONE_PREFIX_LENGTH, delivery_zone
+from functionality.status_events import order_status_notifier
+from models import DeliveryPersonnel, Delivery, MenuItemCategoryEnum, Order, OrderItem, OrderStatusEnum
 from setup.extensions import db
 from datetime import datetime, timedelta
 
-def assign_delivery_personnel(order):
+# How many delivery personnel assign_delivery_personnel tries before leaving the order waiting
+CLAIM_ATTEMPTS = 3
+
+def claim_delivery_personnel(delivery_personnel_id, postal_code, now):
+    """
+    Atomically claim a delivery personnel for a postal code.
+
+    A single conditional UPDATE succeeds only while the delivery personnel is still
+    available and either serves this postal code's delivery zone already or has no
+    postal code, so concurrent workers can never both claim an unassigned delivery
+    personnel for different zones, nor claim one who has left with a delivery in
+    the meantime.
+
+    :return: True if the delivery personnel was claimed.
+    """
+    result = db.session.execute(
+        update(DeliveryPersonnel)
+        .where(
+            DeliveryPersonnel.id == delivery_personnel_id,
+            DeliveryPersonnel.is_available.is_(True),
+            or_(
+                func.substr(DeliveryPersonnel.postal_code, 1, ZONE_PREFIX_LENGTH) == delivery_zone(postal_code),
+                DeliveryPersonnel.postal_code.is_(None)
+            )
+        )
+        .values(postal_code=postal_code, last_delivery_time=now)
+        # Don't scan the identity map for loaded DeliveryPersonnel to update; callers
+        # only read their id, and the session is expired on commit
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+def assign_delivery_personnel(order, order_items=None):
+    """
+    Assign an available delivery personnel to a newly placed order and create its Delivery.
+
+    The least busy delivery personnel with room for another order (see
+    MAX_ORDERS_PER_DELIVERY_PERSONNEL) is picked from the courier availability index, so no
+    queries are needed to find them or to estimate the delivery time, and then
+    claimed with claim_delivery_personnel. If another worker got there first the
+    index is stale: it is rebuilt and the next candidate is tried. Changes are
+    flushed but not committed; the caller owns the transaction.
+
+    :param order: The Order that was just created (must have an id).
+    :param order_items: Optional (menu_item, quantity) pairs of the order, to avoid loading order.order_items.
+    :return: The Delivery record, or None if no delivery personnel is available.
+    """
     customer_postal_code = order.customer.postal_code
 
     # Get current time
     now = datetime.now()
 
-    # Try to find delivery personnel assigned to this postal code with availability
-    delivery_personnel = DeliveryPersonnel.query.filter_by(
-        postal_code=customer_postal_code,
-        is_available=True
-    ).first()
+    for _ in range(CLAIM_ATTEMPTS):
+        # Least busy delivery personnel serving this zone, otherwise one without an assigned postal code
+        delivery_personnel_id = courier_index.find(customer_postal_code, capacity=MAX_ORDERS_PER_DELIVERY_PERSONNEL)
+        if delivery_personnel_id is None:
+            break
 
-    if not delivery_personnel:
-        # If none, find any available delivery personnel without an assigned postal code
-        delivery_personnel = DeliveryPersonnel.query.filter_by(
-            is_available=True,
-            postal_code=None
-        ).first()
+        # Assign them to this postal code and update last delivery time
+        if claim_delivery_personnel(delivery_personnel_id, customer_postal_code, now):
+            break
+        courier_index.invalidate()
+        delivery_personnel_id = None
 
-    if delivery_personnel:
-        # Assign them to this postal code if they weren't already
-        if delivery_personnel.postal_code != customer_postal_code:
-            delivery_personnel.postal_code = customer_postal_code
-
-        # Update last delivery time
-        delivery_personnel.last_delivery_time = now
-
-        db.session.commit()
+    if delivery_personnel_id is not None:
+        other_orders = courier_index.preparing_count(delivery_personnel_id)
+        courier_index.assigned(delivery_personnel_id, customer_postal_code)
 
-        # Create or update Delivery record
-        delivery = Delivery.query.filter_by(order_id=order.id).first()
-        if not delivery:
-            # Create new delivery
-            delivery = Delivery(
-                order_id=order.id,
-                delivery_personnel_id=delivery_personnel.id,
-                assigned_at=now,
-                status=OrderStatusEnum.Being_Prepared,
-                estimated_delivery_time=calculate_estimated_delivery_time(order, delivery_personnel)
+        delivery = Delivery(
+            order_id=order.id,
+            delivery_personnel_id=delivery_personnel_id,
+            assigned_at=now,
+            status=OrderStatusEnum.Being_Prepared,
+            estimated_delivery_time=calculate_estimated_delivery_time(
+                order, None, other_orders=other_orders, order_items=order_items
             )
-            db.session.add(delivery)
-        else:
-            # Update existing delivery
-            delivery.delivery_personnel_id = delivery_personnel.id
-            delivery.assigned_at = now
-            delivery.status = OrderStatusEnum.Being_Prepared
-            delivery.estimated_delivery_time = calculate_estimated_delivery_time(order, delivery_personnel)
-
-        db.session.commit()
+        )
+        db.session.add(delivery)
+        db.session.flush()
 
         return delivery
     else:
         # No delivery personnel available; order will wait
         return None
     
-"""
 def update_pending_deliveries():
-    from models import Delivery, DeliveryPersonnel, OrderStatusEnum
-    from datetime import datetime, timedelta
-    from setup.extensions import db
+    """
+    Assign delivery personnel to every delivery waiting for one, in a single transaction.
+
+    Waiting deliveries and available delivery personnel are each loaded with one query
+    and matched as a batch by plan_assignments: as many deliveries as possible are
+    assigned, with the lowest total estimated delivery time, to personnel already
+    serving the delivery zone of the customer's postal code or to unassigned
+    personnel who then take over that zone. Each delivery personnel in the plan is claimed with
+    claim_delivery_personnel, so personnel taken by a concurrent worker in the
+    meantime are skipped and their deliveries keep waiting for the next run.
 
+    :return: Tuple of (number of deliveries matched, number of deliveries that were waiting).
+    """
     now = datetime.now()
 
-    # Find deliveries waiting for personnel
-    pending_deliveries = Delivery.query.filter_by(
-        delivery_personnel_id=None,
-        status=OrderStatusEnum.Waiting_for_Delivery_Personnel
-    ).all()
-
-    for delivery in pending_deliveries:
-        order = delivery.order
-        assigned_delivery_personnel = assign_delivery_personnel(order)
-        if assigned_delivery_personnel:
-            # Update delivery record
-            delivery.delivery_personnel_id = assigned_delivery_personnel.delivery_personnel_id
-            delivery.assigned_at = assigned_delivery_personnel.assigned_at
-            delivery.status = assigned_delivery_personnel.status
-            delivery.estimated_delivery_time = assigned_delivery_personnel.estimated_delivery_time
-            db.session.commit()
-"""
-  
-def calculate_estimated_delivery_time(order, delivery_personnel):
+    # Oldest waiting deliveries of orders not cancelled first, with the customer's postal code
+    pending_deliveries = Delivery.query.join(Order, Delivery.order_id == Order.id).filter(
+        Delivery.delivery_personnel_id.is_(None),
+        Delivery.status == OrderStatusEnum.Waiting_for_Delivery_Personnel,
+        Order.status != OrderStatusEnum.Cancelled
+    ).options(
+        joinedload(Delivery.order).joinedload(Order.customer)
+    ).order_by(Delivery.id).all()
+
+    if not pending_deliveries:
+        return 0, 0
+
+    available_personnel = DeliveryPersonnel.query.filter_by(is_available=True).order_by(DeliveryPersonnel.id).all()
+    if not available_personnel:
+        return 0, len(pending_deliveries)
+
+    # Orders each delivery personnel is already preparing
+    other_orders = dict(db.session.query(
+        Delivery.delivery_personnel_id, func.count(Delivery.id)
+    ).filter(
+        Delivery.delivery_personnel_id.in_([dp.id for dp in available_personnel]),
+        Delivery.status == OrderStatusEnum.Being_Prepared
+    ).group_by(Delivery.delivery_personnel_id).all())
+
+    plan = plan_assignments(
+        [(delivery, delivery_zone(delivery.order.customer.postal_code)) for delivery in pending_deliveries],
+        [(dp.id, delivery_zone(dp.postal_code), other_orders.get(dp.id, 0)) for dp in available_personnel]
+    )
+
+    # Order items for the ETA, only of the orders that were matched
+    order_items = defaultdict(list)
+    for order_item in OrderItem.query.filter(
+        OrderItem.order_id.in_([delivery.order_id for delivery, _, _ in plan])
+    ).options(joinedload(OrderItem.menu_item)):
+        order_items[order_item.order_id].append((order_item.menu_item, order_item.quantity))
+
+    personnel_by_id = {dp.id: dp for dp in available_personnel}
+    claimed = {}
+    matched_order_ids = []
+    # Flush the assigned deliveries in one batch at commit, not before every claim
+    with db.session.no_autoflush:
+        for delivery, delivery_personnel_id, queue_position in plan:
+            order = delivery.order
+            customer_postal_code = order.customer.postal_code
+            if delivery_personnel_id not in claimed:
+                # Claimed for another zone or sent out by another worker meanwhile if this fails
+                claimed[delivery_personnel_id] = claim_delivery_personnel(delivery_personnel_id, customer_postal_code, now)
+            if not claimed[delivery_personnel_id]:
+                continue
+
+            delivery.delivery_personnel_id = delivery_personnel_id
+            delivery.assigned_at = now
+            delivery.status = OrderStatusEnum.Being_Prepared
+            delivery.estimated_delivery_time = calculate_estimated_delivery_time(
+                order, personnel_by_id[delivery_personnel_id], other_orders=queue_position,
+                order_items=order_items[order.id]
+            )
+            courier_index.assigned(delivery_personnel_id, customer_postal_code)
+            matched_order_ids.append(order.id)
+
+    if matched_order_ids:
+        db.session.commit()
+        order_status_notifier.publish(*matched_order_ids)
+    return len(matched_order_ids), len(pending_deliveries)
+
+def calculate_estimated_delivery_time(order, delivery_personnel, other_orders=None, order_items=None):
     from datetime import datetime, timedelta
 
+    if order_items is None:
+        order_items = [(order_item.menu_item, order_item.quantity) for order_item in order.order_items]
+
     # Base preparation time
     preparation_time = timedelta(minutes=5)  # Base time for order preparation
 
@@ -96,9 +191,9 @@ def calculate_estimated_delivery_time(order, delivery_personnel):
 
     # Calculate total additional time based on number of pizzas and desserts
     total_additional_time = timedelta()
-    for order_item in order.order_items:
-        if order_item.menu_item.category in [MenuItemCategoryEnum.Pizza, MenuItemCategoryEnum.Dessert]:
-            total_additional_time += additional_time_per_item * order_item.quantity
+    for menu_item, quantity in order_items:
+        if menu_item.category in [MenuItemCategoryEnum.Pizza, MenuItemCategoryEnum.Dessert]:
+            total_additional_time += additional_time_per_item * quantity
 
     # Estimate delivery time based on postal code (simplified)
     # For example, add 1 minute per unit difference in postal codes
@@ -112,12 +207,13 @@ def calculate_estimated_delivery_time(order, delivery_personnel):
         # Default delivery time if postal codes are non-numeric
         delivery_distance_time = timedelta(minutes=10)
 
-    # Additional time if delivery person has other orders
-    other_orders = Delivery.query.filter(
-        Delivery.delivery_personnel_id == delivery_personnel.id,
-        Delivery.status == OrderStatusEnum.Being_Prepared,
-        Delivery.order_id != order.id
-    ).count()
+    # Additional time if delivery person has other orders (callers may pass a precomputed count)
+    if other_orders is None:
+        other_orders = Delivery.query.filter(
+            Delivery.delivery_personnel_id == delivery_personnel.id,
+            Delivery.status == OrderStatusEnum.Being_Prepared,
+            Delivery.order_id != order.id
+        ).count()
     additional_delivery_time = timedelta(minutes=5 * other_orders)
 
     # Total estimated delivery time
@@ -172,26 +268,32 @@ def complete_delivery(delivery_id):
         raise ValueError("Delivery is already completed.")
     
     # Update delivery status to Delivered
+    previous_status = delivery.status
     delivery.status = OrderStatusEnum.Delivered
     delivery.delivery_time = datetime.now()
+
+    # Count the delivery personnel's remaining active deliveries in the same transaction
+    active_deliveries = None
+    if delivery.delivery_personnel_id is not None:
+        if previous_status in (OrderStatusEnum.Being_Prepared, OrderStatusEnum.Being_Delivered):
+            active_deliveries = courier_index.delivery_finished(
+                delivery.delivery_personnel_id, was_preparing=previous_status == OrderStatusEnum.Being_Prepared
+            )
+        else:
+            active_deliveries = courier_index.active_count(delivery.delivery_personnel_id)
     
     # Update the associated order's status to Delivered
     order = delivery.order
     if order:
         order.status = OrderStatusEnum.Delivered
         db.session.commit()
+        order_status_notifier.publish(order.id)
     else:
         raise ValueError("Associated order not found.")
     
     # Check if the delivery personnel has other active deliveries
     delivery_personnel = delivery.delivery_personnel
     if delivery_personnel:
-        # Query for other active deliveries assigned to this personnel
-        active_deliveries = Delivery.query.filter(
-            Delivery.delivery_personnel_id == delivery_personnel.id,
-            Delivery.status.in_([OrderStatusEnum.Being_Prepared, OrderStatusEnum.Being_Delivered])
-        ).count()
-        
         if active_deliveries == 0:
             # No other active deliveries; mark as available
             delivery_personnel.is_available = True
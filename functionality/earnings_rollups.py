@@ -0,0 +1,154 @@
+# functionality/earnings_rollups.py
+
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal
+
+from sqlalchemy import Integer, cast, extract, func, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from functionality.reports import UNEARNED_STATUSES, earnings_filters, earnings_summary
+from models import Customer, EarningsRollup, Order
+from setup.extensions import db
+
+
+def _to_cents(amount):
+    return int((Decimal(amount) * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def record_order_earnings(order, customer, sign=1):
+    """
+    Add an order to (sign=1) or remove it from (sign=-1) its daily rollup row, in the
+    caller's transaction. Does not commit.
+
+    :param order: The Order; order_date and total_price must be set.
+    :param customer: The customer who placed the order.
+    :param sign: 1 when the order is placed, -1 when it is cancelled.
+    """
+    key = {
+        'day': order.order_date.date(),
+        'postal_code': customer.postal_code,
+        'gender': customer.gender,
+        'birth_year': customer.birthdate.year
+    }
+    order_count = sign
+    revenue_cents = sign * _to_cents(order.total_price)
+    table = EarningsRollup.__table__
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        statement = insert(table).values(**key, order_count=order_count, revenue_cents=revenue_cents)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=list(key),
+            set_={
+                'order_count': table.c.order_count + statement.excluded.order_count,
+                'revenue_cents': table.c.revenue_cents + statement.excluded.revenue_cents
+            }
+        ))
+        return
+
+    # Other databases: update the row, creating it if it does not exist yet
+    key_matches = [table.c[column] == value for column, value in key.items()]
+    result = db.session.execute(table.update().where(*key_matches).values(
+        order_count=table.c.order_count + order_count,
+        revenue_cents=table.c.revenue_cents + revenue_cents
+    ))
+    if result.rowcount == 0:
+        db.session.execute(table.insert().values(**key, order_count=order_count, revenue_cents=revenue_cents))
+
+
+def backfill_earnings_rollups():
+    """
+    Rebuild every rollup row from the orders in one INSERT ... SELECT and commit.
+
+    Run after loading orders that bypassed create_order (imports, synthetic data).
+
+    :return: Number of rollup rows written.
+    """
+    EarningsRollup.query.delete(synchronize_session=False)
+    rows = db.session.query(
+        func.date(Order.order_date),
+        Customer.postal_code,
+        Customer.gender,
+        cast(extract('year', Customer.birthdate), Integer),
+        func.count(Order.id),
+        func.sum(cast(func.round(Order.total_price * 100), Integer))
+    ).join(Customer).filter(
+        Order.status.notin_(UNEARNED_STATUSES)
+    ).group_by(
+        func.date(Order.order_date), Customer.postal_code, Customer.gender, extract('year', Customer.birthdate)
+    )
+    db.session.execute(EarningsRollup.__table__.insert().from_select(
+        ['day', 'postal_code', 'gender', 'birth_year', 'order_count', 'revenue_cents'], rows
+    ))
+    db.session.commit()
+    return EarningsRollup.query.count()
+
+
+def ensure_earnings_rollups():
+    """Backfill the rollups if they are empty while orders exist (e.g. an older database)."""
+    if EarningsRollup.query.first() is None and Order.query.first() is not None:
+        return backfill_earnings_rollups()
+    return 0
+
+
+def rollup_earnings_summary(criteria):
+    """
+    Same result as earnings_summary(earnings_filters(criteria)), served from the rollups.
+
+    Rollup rows are bucketed by birth year, so an age range only maps onto whole rows
+    for the birth years it fully covers. Orders of customers born in the partially
+    covered years at either end of the range are summed from the orders themselves.
+
+    :param criteria: Filter values as returned by build_earnings_criteria.
+    :return: Tuple of (total_earnings, total_orders, average_order_value).
+    """
+    min_birthdate = criteria['min_birthdate']
+    max_birthdate = criteria['max_birthdate']
+    first_full_year = None
+    last_full_year = None
+    if min_birthdate:
+        first_full_year = min_birthdate.year + (0 if (min_birthdate.month, min_birthdate.day) == (1, 1) else 1)
+    if max_birthdate:
+        last_full_year = max_birthdate.year - (0 if (max_birthdate.month, max_birthdate.day) == (12, 31) else 1)
+
+    total_cents = 0
+    total_orders = 0
+    if first_full_year is None or last_full_year is None or first_full_year <= last_full_year:
+        query = db.session.query(
+            func.coalesce(func.sum(EarningsRollup.revenue_cents), 0),
+            func.coalesce(func.sum(EarningsRollup.order_count), 0)
+        )
+        if criteria['postal_code']:
+            query = query.filter(EarningsRollup.postal_code == criteria['postal_code'])
+        if criteria['gender']:
+            query = query.filter(EarningsRollup.gender == criteria['gender'])
+        if first_full_year is not None:
+            query = query.filter(EarningsRollup.birth_year >= first_full_year)
+        if last_full_year is not None:
+            query = query.filter(EarningsRollup.birth_year <= last_full_year)
+        total_cents, total_orders = query.one()
+
+    total_earnings = Decimal(total_cents) / 100
+    partial_years = []
+    if first_full_year is not None and min_birthdate != date(first_full_year, 1, 1):
+        partial_years.append(Customer.birthdate < date(first_full_year, 1, 1))
+    if last_full_year is not None and max_birthdate != date(last_full_year, 12, 31):
+        partial_years.append(Customer.birthdate > date(last_full_year, 12, 31))
+    if partial_years:
+        partial_earnings, partial_orders, _ = earnings_summary(earnings_filters(criteria) + [or_(*partial_years)])
+        total_earnings += partial_earnings
+        total_orders += partial_orders
+
+    total_earnings = total_earnings.quantize(Decimal('0.01'))
+    average_order_value = Decimal('0.00')
+    if total_orders:
+        average_order_value = (total_earnings / total_orders).quantize(Decimal('0.01'))
+    return total_earnings, total_orders, average_order_value
+
+
+if __name__ == '__main__':
+    from app import app
+
+    with app.app_context():
+        db.create_all()
+        print(f"Rebuilt {backfill_earnings_rollups()} earnings rollup row(s).")
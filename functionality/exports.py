@@ -0,0 +1,74 @@
+# functionality/exports.py
+
+import csv
+import enum
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import Response, stream_with_context
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Rows fetched from the database cursor (and written to the response) at a time
+EXPORT_CHUNK_SIZE = 1000
+
+
+def _export_value(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def export_rows(query, export_format, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Serialize the rows of a query as CSV or NDJSON, one chunk of text at a time.
+
+    The query is executed with yield_per, so rows are fetched from the cursor in
+    batches of chunk_size instead of being loaded all at once.
+
+    :param query: Query whose rows (labelled columns) are exported.
+    :param export_format: 'csv' or 'ndjson'.
+    :return: Generator of str chunks.
+    """
+    columns = [column['name'] for column in query.column_descriptions]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if export_format == 'csv' else None
+    if writer:
+        # Send the header right away so the download starts before the query returns rows
+        writer.writerow(columns)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    for count, row in enumerate(query.yield_per(chunk_size), start=1):
+        values = [_export_value(value) for value in row]
+        if writer:
+            writer.writerow(values)
+        else:
+            buffer.write(json.dumps(dict(zip(columns, values))))
+            buffer.write('\n')
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_response(query, export_format, filename):
+    """Stream a query as a downloadable CSV or NDJSON file (chunked, no Content-Length)."""
+    return Response(
+        stream_with_context(export_rows(query, export_format)),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename={filename}.{export_format}'}
+    )
@@ -0,0 +1,152 @@
+# functionality/identity_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+from flask_login import UserMixin
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+from models import Customer
+from setup.extensions import db
+
+# Customer columns the principal carries; changes to other columns keep the entry
+PRINCIPAL_COLUMNS = ('name', 'is_admin', 'postal_code')
+
+
+class CustomerPrincipal(UserMixin):
+    """
+    What current_user is on authenticated requests: the customer's id, name, admin flag
+    and postal code, detached from any session. Views that change the customer load
+    the Customer itself (db.session.get(Customer, current_user.id)).
+    """
+
+    def __init__(self, id, name, is_admin, postal_code):
+        self.id = id
+        self.name = name
+        self.is_admin = bool(is_admin)
+        self.postal_code = postal_code
+
+    def get_id(self):
+        return str(self.id)
+
+
+class IdentityCache:
+    """
+    Process-wide, size-bounded cache of CustomerPrincipals for the login manager's
+    user loader, so the status polls and menu requests do not read the Customer table.
+
+    Entries expire after ttl seconds (picking up changes made by other processes) and
+    the least recently used entry is evicted beyond max_size. A customer whose name,
+    admin flag or postal code changes through the ORM is dropped when the transaction
+    commits; a load racing with that commit is not stored.
+    """
+
+    def __init__(self, ttl=60, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # Customer id -> (loaded_at, principal)
+        self._generation = 0  # Bumped on every invalidation
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        app.extensions['identity_cache'] = self
+        self.ttl = app.config.get('IDENTITY_CACHE_TTL_SECONDS', self.ttl)
+        self.max_size = app.config.get('IDENTITY_CACHE_MAX_SIZE', self.max_size)
+        self.clear()
+
+    def get(self, customer_id):
+        """
+        The principal of a customer, loaded with one narrow SELECT on a miss.
+
+        :return: The CustomerPrincipal, or None if the customer does not exist.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(customer_id)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._entries.move_to_end(customer_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        row = db.session.query(
+            Customer.id, Customer.name, Customer.is_admin, Customer.postal_code
+        ).filter(Customer.id == customer_id).first()
+        if row is None:
+            return None
+        principal = CustomerPrincipal(*row)
+
+        with self._lock:
+            if generation == self._generation:
+                self._entries[customer_id] = (now, principal)
+                self._entries.move_to_end(customer_id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return principal
+
+    def invalidate(self, *customer_ids):
+        with self._lock:
+            self._generation += 1
+            for customer_id in customer_ids:
+                self._entries.pop(customer_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl
+            }
+
+
+identity_cache = IdentityCache()
+
+
+def load_user(user_id):
+    """User loader for the login manager."""
+    return identity_cache.get(int(user_id))
+
+
+# Drop a customer once the transaction that changed their principal commits
+def _mark_customer_changed(target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_customer_ids', set()).add(target.id)
+
+
+@event.listens_for(Customer, 'after_update')
+def _mark_customer_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[column].history.has_changes() for column in PRINCIPAL_COLUMNS):
+        _mark_customer_changed(target)
+
+
+@event.listens_for(Customer, 'after_delete')
+def _mark_customer_deleted(mapper, connection, target):
+    _mark_customer_changed(target)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_identity_cache(session):
+    changed = session.info.pop('changed_customer_ids', None)
+    if changed:
+        identity_cache.invalidate(*changed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_customer_changes(session):
+    session.info.pop('changed_customer_ids', None)
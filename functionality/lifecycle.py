@@ -0,0 +1,148 @@
+# functionality/lifecycle.py
+
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert
+from functionality.order_status_transitions import advance_to_being_delivered, advance_to_being_prepared, advance_to_delivered
+from functionality.status_events import order_status_notifier
+from models import Order, OrderStatusEnum, ScheduledTransition
+from setup.extensions import db
+
+# When each status change is due, relative to the moment the order is placed
+ORDER_LIFECYCLE = [
+    (OrderStatusEnum.Being_Prepared, timedelta(0)),
+    (OrderStatusEnum.Being_Delivered, timedelta(minutes=1)),
+    (OrderStatusEnum.Delivered, timedelta(minutes=2)),
+]
+
+TRANSITIONS = {
+    OrderStatusEnum.Being_Prepared: advance_to_being_prepared,
+    OrderStatusEnum.Being_Delivered: advance_to_being_delivered,
+    OrderStatusEnum.Delivered: advance_to_delivered,
+}
+
+FINAL_STATUSES = (OrderStatusEnum.Delivered, OrderStatusEnum.Cancelled)
+
+
+def schedule_order_lifecycle(order, now=None):
+    """
+    Persist the status transitions of a newly placed order. Does not commit.
+
+    :param order: The Order that was just created (must have an id).
+    :param now: Reference time for the due times (defaults to now).
+    """
+    now = now or datetime.now()
+    db.session.execute(insert(ScheduledTransition), [
+        {'order_id': order.id, 'status': status, 'due_at': now + delay}
+        for status, delay in ORDER_LIFECYCLE
+    ])
+
+
+def cancel_order_lifecycle(order_id):
+    """Remove every pending transition of an order. Does not commit."""
+    ScheduledTransition.query.filter_by(order_id=order_id).delete(synchronize_session=False)
+
+
+class OrderLifecycleEngine:
+    """
+    Single background worker that advances orders through their lifecycle.
+
+    Due times live in the ScheduledTransition table, so pending transitions survive
+    restarts: on startup the worker immediately applies everything that became due
+    while the app was down. Afterwards it sleeps until the next due time (or until
+    notify() is called) and applies all due transitions in batched transactions.
+    """
+
+    def __init__(self, app=None, batch_size=500, max_sleep=30, retry_delay=timedelta(seconds=30)):
+        self.app = None
+        self.batch_size = batch_size
+        self.max_sleep = max_sleep  # Upper bound so rows written by other processes are picked up
+        self.retry_delay = retry_delay
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['order_lifecycle'] = self
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='order-lifecycle', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def notify(self):
+        """Wake the worker so it re-reads the next due time (e.g. after placing an order)."""
+        self._wakeup.set()
+
+    def next_due_at(self):
+        return db.session.query(func.min(ScheduledTransition.due_at)).scalar()
+
+    def run_due(self, now=None):
+        """
+        Apply every transition due at or before now, one transaction per batch.
+
+        :return: Number of scheduled transitions processed.
+        """
+        now = now or datetime.now()
+        processed = 0
+        while True:
+            due = ScheduledTransition.query.filter(
+                ScheduledTransition.due_at <= now
+            ).order_by(ScheduledTransition.due_at, ScheduledTransition.id).limit(self.batch_size).all()
+            if not due:
+                break
+
+            # Load all affected orders in one query
+            order_ids = {job.order_id for job in due}
+            orders = {order.id: order for order in Order.query.filter(Order.id.in_(order_ids))}
+
+            changed_order_ids = []
+            for job in due:
+                order = orders.get(job.order_id)
+                if TRANSITIONS[job.status](order):
+                    changed_order_ids.append(order.id)
+                    db.session.delete(job)
+                elif order is None or order.status in FINAL_STATUSES or order.status == job.status:
+                    db.session.delete(job)
+                else:
+                    # The order is not ready yet (e.g. still waiting for delivery personnel)
+                    job.due_at = now + self.retry_delay
+
+            db.session.commit()
+            order_status_notifier.publish(*changed_order_ids)
+            processed += len(due)
+            if len(due) < self.batch_size:
+                break
+        return processed
+
+    def _run(self):
+        while not self._stopped.is_set():
+            next_due = None
+            with self.app.app_context():
+                try:
+                    self.run_due()
+                    next_due = self.next_due_at()
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.error(f"Order lifecycle engine failed to apply transitions: {e}")
+
+            timeout = self.max_sleep
+            if next_due is not None:
+                timeout = min(timeout, max((next_due - datetime.now()).total_seconds(), 0))
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+
+lifecycle_engine = OrderLifecycleEngine()
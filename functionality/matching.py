@@ -0,0 +1,120 @@
+# functionality/matching.py
+
+import heapq
+from collections import defaultdict
+
+# Most orders a delivery personnel prepares at once; further orders wait for the dispatcher
+MAX_ORDERS_PER_DELIVERY_PERSONNEL = 4
+
+
+def _postal_code_value(order_count, open_positions, extra_personnel, capacity):
+    """
+    Best outcome for one postal code: how many of its waiting orders get a delivery
+    personnel, and the sum of their queue positions (orders already being prepared
+    ahead of them, each adding 5 minutes to the estimated delivery time).
+
+    :param open_positions: open_positions[p] = delivery personnel serving the postal code who can take an order at queue position p.
+    :param extra_personnel: Unassigned delivery personnel given to the postal code (open at every position).
+    :return: Tuple of (orders assigned, -sum of queue positions), larger is better.
+    """
+    remaining = order_count
+    positions = 0
+    for position in range(capacity):
+        taken = min(remaining, open_positions[position] + extra_personnel)
+        positions += taken * position
+        remaining -= taken
+        if not remaining:
+            break
+    return order_count - remaining, -positions
+
+
+def plan_assignments(waiting, personnel, capacity=MAX_ORDERS_PER_DELIVERY_PERSONNEL):
+    """
+    Match a batch of waiting orders to available delivery personnel, assigning as many
+    orders as possible and, among those plans, minimizing the total estimated delivery
+    time.
+
+    A delivery personnel serves one postal code at a time and prepares at most
+    capacity orders. The part of the estimated delivery time that depends on the
+    choice is the queue position (5 minutes per order ahead), so the assignment
+    problem reduces to picking queue positions: within a postal code the cheapest
+    open positions are always best, and the only real decision is how many
+    unassigned delivery personnel each postal code gets. That value is concave in the
+    number of personnel, so handing them out one at a time to the postal code that
+    gains the most is optimal (the same optimum a min-cost flow would find, in
+    O(personnel log postal codes + orders log orders)).
+
+    :param waiting: (key, postal_code) of each waiting order, oldest first. Any area key works; the dispatcher passes delivery zones.
+    :param personnel: (delivery_personnel_id, postal_code, orders_being_prepared) of each available delivery personnel; postal_code None means unassigned.
+    :param capacity: Most orders a delivery personnel prepares at once.
+    :return: List of (key, delivery_personnel_id, queue_position); the oldest orders get the earliest positions.
+    """
+    orders_by_postal_code = defaultdict(list)
+    for key, postal_code in waiting:
+        orders_by_postal_code[postal_code].append(key)
+
+    unassigned = []
+    serving = defaultdict(list)
+    for delivery_personnel_id, postal_code, load in personnel:
+        if postal_code is None:
+            # Unassigned delivery personnel have nothing in preparation (they are unassigned when their last delivery finishes)
+            if load == 0:
+                unassigned.append(delivery_personnel_id)
+        elif postal_code in orders_by_postal_code and load < capacity:
+            serving[postal_code].append((load, delivery_personnel_id))
+
+    open_positions = {}
+    for postal_code in orders_by_postal_code:
+        counts = [0] * capacity
+        for load, _ in serving[postal_code]:
+            for position in range(load, capacity):
+                counts[position] += 1
+        open_positions[postal_code] = counts
+
+    # Hand out unassigned delivery personnel by largest marginal gain (ties: oldest waiting order)
+    extra = dict.fromkeys(orders_by_postal_code, 0)
+    value = {
+        postal_code: _postal_code_value(len(orders), open_positions[postal_code], 0, capacity)
+        for postal_code, orders in orders_by_postal_code.items()
+    }
+
+    def gain(postal_code):
+        better = _postal_code_value(
+            len(orders_by_postal_code[postal_code]), open_positions[postal_code], extra[postal_code] + 1, capacity
+        )
+        return better, (better[0] - value[postal_code][0], better[1] - value[postal_code][1])
+
+    oldest = {postal_code: rank for rank, postal_code in enumerate(orders_by_postal_code)}
+    heap = []
+    for postal_code in orders_by_postal_code:
+        better, (orders_gained, positions_saved) = gain(postal_code)
+        heap.append((-orders_gained, -positions_saved, oldest[postal_code], postal_code, better))
+    heapq.heapify(heap)
+
+    allocated = defaultdict(list)
+    for delivery_personnel_id in unassigned:
+        if not heap or heap[0][:2] >= (0, 0):
+            # No postal code gains from another delivery personnel
+            break
+        _, _, rank, postal_code, better = heapq.heappop(heap)
+        allocated[postal_code].append(delivery_personnel_id)
+        extra[postal_code] += 1
+        value[postal_code] = better
+        better, (orders_gained, positions_saved) = gain(postal_code)
+        heapq.heappush(heap, (-orders_gained, -positions_saved, rank, postal_code, better))
+
+    plan = []
+    for postal_code, orders in orders_by_postal_code.items():
+        positions = [
+            (position, load, delivery_personnel_id)
+            for load, delivery_personnel_id in serving[postal_code]
+            for position in range(load, capacity)
+        ] + [
+            (position, 0, delivery_personnel_id)
+            for delivery_personnel_id in allocated[postal_code]
+            for position in range(capacity)
+        ]
+        positions.sort()
+        for key, (position, _, delivery_personnel_id) in zip(orders, positions):
+            plan.append((key, delivery_personnel_id, position))
+    return plan
@@ -0,0 +1,94 @@
+# functionality/menu_cache.py
+
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from functionality.utils import calculate_cart_prices
+from models import MenuItem, MenuItemCategoryEnum
+
+
+class MenuSnapshot:
+    """Immutable view of the menu with prices already computed."""
+
+    def __init__(self, version, menu_items):
+        self.version = version
+        self.items = {item.id: item.to_dict() for item in menu_items}
+        self.base_prices = {item.id: item.base_price for item in menu_items}
+        # Re-price the whole menu in one batch
+        pricing = calculate_cart_prices([item.base_price for item in menu_items])
+        self.final_prices = dict(zip([item.id for item in menu_items], pricing['final_prices']))
+        self.pizzas = [self.items[item.id] for item in menu_items if item.category == MenuItemCategoryEnum.Pizza]
+        self.drinks = [self.items[item.id] for item in menu_items if item.category == MenuItemCategoryEnum.Drink]
+        self.desserts = [self.items[item.id] for item in menu_items if item.category == MenuItemCategoryEnum.Dessert]
+        self.choices = [
+            (item.id, f"{item.name} (${self.final_prices[item.id]})")
+            for item in menu_items
+        ]
+
+    def selected_items(self, item_ids):
+        """
+        Menu items for the given ids (duplicates and unknown ids dropped, ordered by id),
+        each with its final price under 'final_price'.
+        """
+        return [
+            dict(self.items[item_id], final_price=self.final_prices[item_id])
+            for item_id in sorted(set(item_ids)) if item_id in self.items
+        ]
+
+
+class MenuCache:
+    """
+    Process-wide cache of the menu.
+
+    The snapshot is rebuilt lazily after a MenuItem is inserted, updated or deleted
+    through the ORM (on commit), or after max_age seconds so changes made by other
+    processes are eventually picked up.
+    """
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._loaded_at = 0.0
+        self._version = 0
+
+    def get(self):
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._loaded_at < self.max_age:
+            return snapshot
+        with self._lock:
+            if self._snapshot is None or time.monotonic() - self._loaded_at >= self.max_age:
+                self._version += 1
+                self._snapshot = MenuSnapshot(self._version, MenuItem.query.order_by(MenuItem.id).all())
+                self._loaded_at = time.monotonic()
+            return self._snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+
+menu_cache = MenuCache()
+
+
+# Invalidate once the transaction that changed a MenuItem commits
+@event.listens_for(MenuItem, 'after_insert')
+@event.listens_for(MenuItem, 'after_update')
+@event.listens_for(MenuItem, 'after_delete')
+def _mark_menu_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info['menu_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_menu_cache(session):
+    if session.info.pop('menu_changed', False):
+        menu_cache.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_menu_changes(session):
+    session.info.pop('menu_changed', None)
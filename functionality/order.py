@@ -1,15 +1,26 @@
 from decimal import Decimal
 
 from flask import flash
-from functionality.order_status_transitions import transition_to_being_delivered, transition_to_being_prepared, transition_to_delivered
-from models import Delivery, DiscountCodeUsage, MenuItemCategoryEnum, Order, OrderItem, OrderStatusEnum, MenuItem
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import joinedload, selectinload
+from functionality.courier_index import courier_index
+from functionality.earnings_rollups import record_order_earnings
+from functionality.lifecycle import cancel_order_lifecycle, lifecycle_engine, schedule_order_lifecycle
+from functionality.status_events import order_status_notifier
+from models import Delivery, DiscountCodeUsage, MenuItemCategoryEnum, Order, OrderIntake, OrderItem, OrderStatusEnum, MenuItem
 from setup.extensions import db
 from datetime import datetime, timedelta
-from functionality.utils import calculate_final_price
-from functionality.delivery import assign_delivery_personnel, calculate_estimated_delivery_interval
+from functionality.utils import calculate_cart_prices
+from functionality.delivery import assign_delivery_personnel
 
 def create_order(customer, items, discount_percentage=Decimal('0.00'), discount_code=None):
-    total_price = Decimal('0.00')
+    """
+    Place an order in a single transaction.
+
+    Ids are obtained with flush() and everything (order, items, delivery assignment
+    and lifecycle schedule) is committed once at the end, so a failure leaves no
+    partial order behind.
+    """
     new_order = Order(
         customer_id=customer.id,
         order_date=datetime.now(),
@@ -18,37 +29,83 @@ def create_order(customer, items, discount_percentage=Decimal('0.00'), discount_
         status=OrderStatusEnum.Pending,
         is_cancelled=False
     )
-    db.session.add(new_order)
-    db.session.commit()  # Commit to generate order ID
+    fulfil_order(new_order, customer, items, discount_percentage, discount_code)
+    db.session.commit()
+    lifecycle_engine.notify()
+
+    return new_order
+
+
+def fulfil_order(order, customer, items, discount_percentage=Decimal('0.00'), discount_code=None, menu_items=None):
+    """
+    Price an order, add its items, assign delivery personnel and schedule its
+    lifecycle. Does not commit.
+
+    Used by create_order and, for orders accepted into the intake queue (status
+    Processing), by the order intake workers, which move the order to Pending.
+
+    :param order: The new Order, or a Processing one from the intake queue.
+    :param customer: The Customer who placed it (total_pizzas_ordered is updated).
+    :param items: List of {'menu_item_id': ..., 'quantity': ...}.
+    :param discount_percentage: Percentage of the discount code, if any.
+    :param discount_code: The DiscountCode to record as used, if any. Dropped, with its
+                          percentage, if the customer has used it in the meantime. Orders
+                          from the intake queue pass None: accept_order reserved the code.
+    :param menu_items: Dict of id -> MenuItem already loaded (e.g. for a batch of orders).
+    """
+    if order.status == OrderStatusEnum.Processing:
+        order.status = OrderStatusEnum.Pending
 
     total_pizzas_in_order = 0  # To update customer's total_pizzas_ordered
 
-    for item_data in items:
-        menu_item = MenuItem.query.get(item_data['menu_item_id'])
-        if not menu_item:
-            continue  # Skip invalid items
+    # Load all requested menu items with a single IN query
+    menu_item_ids = {item_data['menu_item_id'] for item_data in items}
+    if menu_items is None:
+        menu_items = {
+            menu_item.id: menu_item
+            for menu_item in MenuItem.query.filter(MenuItem.id.in_(menu_item_ids))
+        } if menu_item_ids else {}
+
+    valid_items = [
+        (menu_items[item_data['menu_item_id']], item_data['quantity'])
+        for item_data in items
+        if item_data['menu_item_id'] in menu_items  # Skip invalid items
+    ]
 
-        quantity = item_data['quantity']
-        # Calculate final price with profit and VAT
-        item_final_price = calculate_final_price(menu_item.base_price)
-        item_total_price = item_final_price * quantity
-        total_price += item_total_price
+    # Calculate final prices with profit and VAT for the whole cart at once
+    pricing = calculate_cart_prices(
+        [menu_item.base_price for menu_item, _ in valid_items],
+        [quantity for _, quantity in valid_items]
+    )
+    total_price = pricing['subtotal']
 
+    order_item_rows = []
+    for (menu_item, quantity), item_final_price in zip(valid_items, pricing['final_prices']):
         # Count pizzas ordered
         if menu_item.category == MenuItemCategoryEnum.Pizza:
             total_pizzas_in_order += quantity
 
-        order_item = OrderItem(
-            order_id=new_order.id,
-            menu_item_id=menu_item.id,
-            quantity=quantity,
-            price=item_final_price  # Store the final price per unit
-        )
-        db.session.add(order_item)
+        order_item_rows.append({
+            'menu_item_id': menu_item.id,
+            'quantity': quantity,
+            'price': item_final_price  # Store the final price per unit
+        })
 
     # Update customer's total_pizzas_ordered
     customer.total_pizzas_ordered += total_pizzas_in_order
 
+    # A code can be used once per customer; one spent since it was validated (e.g. by
+    # an order placed concurrently) no longer applies
+    usage = None
+    if discount_code:
+        usage = DiscountCodeUsage.query.filter_by(
+            customer_id=customer.id,
+            code=discount_code.code
+        ).first()
+        if usage and usage.is_used:
+            discount_code = None
+            discount_percentage = Decimal('0.00')
+
     # Check if customer is eligible for additional 10% discount
     additional_discount_percentage = Decimal('0.00')
     if customer.total_pizzas_ordered > 10:
@@ -64,10 +121,6 @@ def create_order(customer, items, discount_percentage=Decimal('0.00'), discount_
 
         # Record the discount code usage if applicable
         if discount_code:
-            usage = DiscountCodeUsage.query.filter_by(
-                customer_id=customer.id,
-                code=discount_code.code
-            ).first()
             if not usage:
                 usage = DiscountCodeUsage(
                     customer_id=customer.id,
@@ -78,59 +131,56 @@ def create_order(customer, items, discount_percentage=Decimal('0.00'), discount_
             else:
                 usage.is_used = True  # Update usage status
 
-    # Update order and customer in the database
-    new_order.total_price = total_price.quantize(Decimal('0.01'))
-    new_order.discount_percentage = total_discount_percentage
-    db.session.commit()
+    # Add the order and its items to the session
+    order.total_price = total_price.quantize(Decimal('0.01'))
+    order.discount_percentage = total_discount_percentage
+    db.session.add(order)
+    db.session.flush()  # Generate the order ID without committing
+
+    # Insert all order items with a single executemany
+    if order_item_rows:
+        db.session.execute(insert(OrderItem), [
+            {'order_id': order.id, **row} for row in order_item_rows
+        ])
 
     # Assign delivery personnel and create delivery record
-    new_delivery = assign_delivery_personnel(new_order)
+    new_delivery = assign_delivery_personnel(order, order_items=valid_items)
     if not new_delivery:
         # If no delivery personnel are available, create a delivery record without personnel
         new_delivery = Delivery(
-            order_id=new_order.id,
+            order=order,
             delivery_personnel_id=None,
             assigned_at=None,
             status=OrderStatusEnum.Waiting_for_Delivery_Personnel,
             estimated_delivery_time=None
         )
         db.session.add(new_delivery)
-        db.session.commit()
         
-    from app import scheduler
-        
-    # Transition from Pending to Being Prepared immediately
-    scheduler.add_job(
-        id=f"transition_to_being_prepared_order_{new_order.id}",
-        func=transition_to_being_prepared,
-        args=[new_order.id],
-        trigger='date',
-        run_date=datetime.now()  # Immediate execution
-    )
-
-    # Transition from Being Prepared to Being Delivered after 10 minutes
-    scheduler.add_job(
-        id=f"transition_to_being_delivered_order_{new_order.id}",
-        func=transition_to_being_delivered,
-        args=[new_order.id],
-        trigger='date',
-        run_date=datetime.now() + timedelta(minutes=1)
-    )
-    
-    time_to_deliver = calculate_estimated_delivery_interval(new_order, new_delivery)
-    scheduler.add_job(
-        id=f"transition_to_delivered_order_{new_order.id}",
-        func=transition_to_delivered,
-        args=[new_order.id],
-        trigger='date',
-        run_date=datetime.now() + timedelta(minutes=2)
-    )
-
-    return new_order
+    # Persist the status transitions; the lifecycle engine applies them when due
+    schedule_order_lifecycle(order)
+    record_order_earnings(order, customer)
+
+
+def load_order_details(order_id, with_items=True):
+    """
+    Load an order together with its customer, delivery and delivery personnel in one
+    query, and (optionally) its items and their menu items in a second one.
+
+    :param order_id: ID of the order to load.
+    :param with_items: Also load order_items and their menu_item.
+    :return: The Order, or None if it does not exist.
+    """
+    options = [
+        joinedload(Order.customer),
+        joinedload(Order.delivery).joinedload(Delivery.delivery_personnel)
+    ]
+    if with_items:
+        options.append(selectinload(Order.order_items).joinedload(OrderItem.menu_item))
+    return Order.query.options(*options).filter_by(id=order_id).first()
 
 
 def cancel_order(order_id, customer_id):
-    order = Order.query.get(order_id)
+    order = load_order_details(order_id)
     if not order:
         raise ValueError("Order not found.")
 
@@ -142,6 +192,21 @@ def cancel_order(order_id, customer_id):
     if order.status in [OrderStatusEnum.Delivered, OrderStatusEnum.Cancelled]:
         raise ValueError("Order cannot be cancelled.")
 
+    if order.status == OrderStatusEnum.Processing:
+        # Not fulfilled yet: nothing was priced, assigned or earned, so taking it out
+        # of the intake queue is enough, unless an intake worker has just fulfilled it
+        taken = db.session.execute(
+            delete(OrderIntake).where(OrderIntake.order_id == order.id)
+            .execution_options(synchronize_session=False)
+        )
+        if taken.rowcount:
+            order.status = OrderStatusEnum.Cancelled
+            db.session.commit()
+            order_status_notifier.publish(order_id)
+            return
+        db.session.rollback()
+        return cancel_order(order_id, customer_id)
+
     # Update order status to Cancelled
     order.status = OrderStatusEnum.Cancelled
 
@@ -156,36 +221,32 @@ def cancel_order(order_id, customer_id):
         customer.total_pizzas_ordered = 0  # Prevent negative values
 
     # Handle delivery personnel
-    if order.delivery and order.delivery.delivery_personnel:
+    if order.delivery:
         delivery = order.delivery
         delivery_personnel = delivery.delivery_personnel
 
-        # Free up the delivery personnel if they have no other active deliveries
-        active_deliveries = Delivery.query.filter(
-            Delivery.delivery_personnel_id == delivery_personnel.id,
-            Delivery.status.in_([OrderStatusEnum.Being_Prepared, OrderStatusEnum.Being_Delivered])
-        ).count()
+        if delivery_personnel:
+            # Free up the delivery personnel if they have no other active deliveries
+            if delivery.status in (OrderStatusEnum.Being_Prepared, OrderStatusEnum.Being_Delivered):
+                active_deliveries = courier_index.delivery_finished(
+                    delivery_personnel.id, was_preparing=delivery.status == OrderStatusEnum.Being_Prepared
+                )
+            else:
+                active_deliveries = courier_index.active_count(delivery_personnel.id)
 
-        if active_deliveries <= 1:
-            delivery_personnel.is_available = True
-            delivery_personnel.postal_code = None  # Unassign postal code if necessary
-            delivery_personnel.last_delivery_time = datetime.now()
+            if active_deliveries == 0:
+                delivery_personnel.is_available = True
+                delivery_personnel.postal_code = None  # Unassign postal code if necessary
+                delivery_personnel.last_delivery_time = datetime.now()
 
-        # Remove the delivery assignment
+        # Remove the delivery assignment, or the delivery still waiting for personnel so
+        # that update_pending_deliveries does not assign it
         db.session.delete(delivery)
         
-    from app import scheduler
-    
-    # Remove scheduled jobs related to this order
-    job_ids = [
-        f"transition_to_being_prepared_order_{order.id}",
-        f"transition_to_being_delivered_order_{order.id}",
-        f"transition_to_delivered_order_{order.id}"
-    ]
-    for job_id in job_ids:
-        job = scheduler.get_job(job_id)
-        if job:
-            scheduler.remove_job(job_id)
+    # Remove pending status transitions for this order and its earnings
+    cancel_order_lifecycle(order.id)
+    record_order_earnings(order, customer, sign=-1)
 
     # Commit all changes to the database
-    db.session.commit()
\ No newline at end of file
+    db.session.commit()
+    order_status_notifier.publish(order_id)
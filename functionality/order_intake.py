@@ -0,0 +1,297 @@
+# functionality/order_intake.py
+
+import json
+import threading
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import delete, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from functionality.lifecycle import lifecycle_engine
+from functionality.order import fulfil_order
+from functionality.status_events import order_status_notifier
+from models import Customer, DiscountCodeUsage, MenuItem, Order, OrderIntake, OrderStatusEnum
+from setup.extensions import db
+
+
+def _reserve_discount_code(customer_id, code):
+    """
+    Mark a discount code as used by the customer, without committing.
+
+    :return: False if the customer had already used it (or another request just did).
+    """
+    claimed = db.session.execute(
+        update(DiscountCodeUsage)
+        .where(DiscountCodeUsage.customer_id == customer_id, DiscountCodeUsage.code == code,
+               or_(DiscountCodeUsage.is_used.is_(False), DiscountCodeUsage.is_used.is_(None)))
+        .values(is_used=True)
+        .execution_options(synchronize_session=False)
+    )
+    if claimed.rowcount:
+        return True
+    used = db.session.query(DiscountCodeUsage.customer_id).filter_by(customer_id=customer_id, code=code).first()
+    if used is not None:
+        return False
+    try:
+        db.session.execute(insert(DiscountCodeUsage).values(customer_id=customer_id, code=code, is_used=True))
+    except IntegrityError:
+        return False
+    return True
+
+
+def accept_order(customer_id, items, discount_percentage=Decimal('0.00'), discount_code=None):
+    """
+    Accept an order into the intake queue and commit.
+
+    Only the Order (status Processing, priced later), its OrderIntake entry and the
+    reservation of the discount code are written; pricing, delivery assignment and
+    the lifecycle schedule are left to the order intake workers. Reserving the code
+    here, rather than when the order is fulfilled, keeps a single-use code from being
+    spent again by orders placed while this one is queued.
+
+    :param customer_id: ID of the customer placing the order.
+    :param items: List of {'menu_item_id': ..., 'quantity': ...}, already validated.
+    :param discount_percentage: Percentage of the discount code, if any.
+    :param discount_code: The validated discount code (its code string), if any.
+    :return: The new Order.
+    :raises ValueError: If the customer has already used the discount code.
+    """
+    if discount_code and not _reserve_discount_code(customer_id, discount_code):
+        db.session.rollback()
+        raise ValueError("You have already used this discount code.")
+
+    now = datetime.now()
+    order = Order(
+        customer_id=customer_id,
+        order_date=now,
+        total_price=Decimal('0.00'),  # Priced by the intake workers
+        discount_percentage=discount_percentage,
+        status=OrderStatusEnum.Processing,
+        is_cancelled=False
+    )
+    db.session.add(OrderIntake(
+        order=order,
+        items=json.dumps(items),
+        discount_code=discount_code,
+        discount_percentage=discount_percentage,
+        created_at=now
+    ))
+    db.session.commit()
+    order_intake.notify()
+    return order
+
+
+class OrderIntakeWorkers:
+    """
+    Pool of background threads fulfilling the orders accepted with accept_order.
+
+    The queue is the OrderIntake table, so accepted orders survive restarts. A worker
+    claims up to batch_size of the oldest entries with a conditional UPDATE that
+    writes its claim token and a lease (claimed_until), so no two workers, in this
+    or another process, fulfil the same order; the entries of a worker that died are
+    claimed again once their lease expires.
+
+    A batch is fulfilled in one transaction that also deletes its entries. If that
+    fails, its orders are retried one per transaction; an order that keeps failing
+    is cancelled after max_attempts.
+    """
+
+    def __init__(self, workers=2, batch_size=50, lease=timedelta(seconds=60),
+                 retry_delay=timedelta(seconds=10), max_attempts=5, max_sleep=5):
+        self.app = None
+        self.workers = workers
+        self.batch_size = batch_size
+        self.lease = lease
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self.max_sleep = max_sleep  # Upper bound so entries written by other processes are picked up
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._threads = []
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['order_intake'] = self
+        self.workers = app.config.get('ORDER_INTAKE_WORKERS', self.workers)
+        self.batch_size = app.config.get('ORDER_INTAKE_BATCH_SIZE', self.batch_size)
+
+    def start(self):
+        if any(thread.is_alive() for thread in self._threads):
+            return
+        self._stopped.clear()
+        self._threads = [
+            threading.Thread(target=self._run, name=f'order-intake-{number}', daemon=True)
+            for number in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def notify(self):
+        """Wake the workers (e.g. after accepting an order)."""
+        self._wakeup.set()
+
+    def claim(self, now=None):
+        """
+        Claim the oldest unclaimed (or expired) entries and commit.
+
+        :return: List of (claim_token, entries), entries being OrderIntake rows as tuples.
+        """
+        now = now or datetime.now()
+        token = uuid.uuid4().hex
+        claimable = or_(OrderIntake.claimed_until.is_(None), OrderIntake.claimed_until < now)
+        oldest = select(OrderIntake.id).where(claimable).order_by(OrderIntake.id).limit(self.batch_size)
+        db.session.execute(
+            update(OrderIntake)
+            .where(OrderIntake.id.in_(oldest), claimable)
+            .values(claim_token=token, claimed_until=now + self.lease)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        entries = db.session.query(
+            OrderIntake.id, OrderIntake.order_id, OrderIntake.items, OrderIntake.discount_code,
+            OrderIntake.discount_percentage, OrderIntake.attempts
+        ).filter(OrderIntake.claim_token == token).order_by(OrderIntake.id).all()
+        return token, entries
+
+    def fulfil(self, token, entries):
+        """
+        Fulfil the orders of claimed entries and delete the entries, without committing.
+
+        :return: IDs of the orders fulfilled, or None if an entry is no longer claimed
+                 by token (the order was cancelled, or the lease expired and another
+                 worker took it); the caller must then roll back.
+        """
+        orders = {order.id: order for order in Order.query.filter(Order.id.in_([entry.order_id for entry in entries]))}
+        customers = {
+            customer.id: customer
+            for customer in Customer.query.filter(Customer.id.in_({order.customer_id for order in orders.values()}))
+        }
+        items = {entry.id: json.loads(entry.items) for entry in entries}
+        menu_item_ids = {item['menu_item_id'] for entry_items in items.values() for item in entry_items}
+        menu_items = {
+            menu_item.id: menu_item for menu_item in MenuItem.query.filter(MenuItem.id.in_(menu_item_ids))
+        } if menu_item_ids else {}
+
+        fulfilled = []
+        for entry in entries:
+            order = orders.get(entry.order_id)
+            if order is None or order.status != OrderStatusEnum.Processing:
+                continue
+            # The discount code was reserved by accept_order, only its percentage applies
+            fulfil_order(
+                order, customers[order.customer_id], items[entry.id],
+                discount_percentage=Decimal(str(entry.discount_percentage)),
+                menu_items=menu_items
+            )
+            fulfilled.append(order.id)
+
+        deleted = db.session.execute(
+            delete(OrderIntake)
+            .where(OrderIntake.id.in_([entry.id for entry in entries]), OrderIntake.claim_token == token)
+            .execution_options(synchronize_session=False)
+        )
+        if deleted.rowcount != len(entries):
+            return None
+        return fulfilled
+
+    def run_pending(self, now=None):
+        """
+        Fulfil every order waiting in the intake queue, one transaction per batch.
+
+        :return: Number of orders fulfilled.
+        """
+        processed = 0
+        while True:
+            token, entries = self.claim(now)
+            if not entries:
+                return processed
+            fulfilled = None
+            if len(entries) > 1:
+                with db.session.no_autoflush:
+                    fulfilled = self._fulfil_batch(token, entries)
+            if fulfilled is None:
+                # Isolate the entry that failed (or was cancelled meanwhile)
+                fulfilled = []
+                for entry in entries:
+                    fulfilled.extend(self._fulfil_one(token, entry, now))
+            order_status_notifier.publish(*fulfilled)
+            lifecycle_engine.notify()
+            processed += len(fulfilled)
+            if len(entries) < self.batch_size:
+                return processed
+
+    def _fulfil_batch(self, token, entries):
+        try:
+            fulfilled = self.fulfil(token, entries)
+        except Exception as e:
+            db.session.rollback()
+            self.app.logger.warning(f"Order intake batch of {len(entries)} failed, retrying one by one: {e}")
+            return None
+        if fulfilled is None:
+            db.session.rollback()
+            return None
+        db.session.commit()
+        return fulfilled
+
+    def _fulfil_one(self, token, entry, now):
+        try:
+            with db.session.no_autoflush:
+                fulfilled = self.fulfil(token, [entry])
+        except Exception as e:
+            db.session.rollback()
+            self._record_failure(token, entry, e, now)
+            return []
+        if fulfilled is None:
+            db.session.rollback()
+            return []
+        db.session.commit()
+        return fulfilled
+
+    def _record_failure(self, token, entry, error, now):
+        now = now or datetime.now()
+        attempts = entry.attempts + 1
+        self.app.logger.error(f"Order intake failed for Order ID {entry.order_id} (attempt {attempts}): {error}")
+        if attempts >= self.max_attempts:
+            db.session.execute(
+                update(Order)
+                .where(Order.id == entry.order_id, Order.status == OrderStatusEnum.Processing)
+                .values(status=OrderStatusEnum.Cancelled)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.execute(
+                delete(OrderIntake).where(OrderIntake.id == entry.id, OrderIntake.claim_token == token)
+                .execution_options(synchronize_session=False)
+            )
+        else:
+            # Release the claim so it is retried after retry_delay
+            db.session.execute(
+                update(OrderIntake)
+                .where(OrderIntake.id == entry.id, OrderIntake.claim_token == token)
+                .values(attempts=attempts, last_error=str(error)[:1000], claim_token=None,
+                        claimed_until=now + self.retry_delay)
+                .execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+        if attempts >= self.max_attempts:
+            order_status_notifier.publish(entry.order_id)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            with self.app.app_context():
+                try:
+                    self.run_pending()
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.error(f"Order intake worker failed: {e}")
+            self._wakeup.wait(self.max_sleep)
+            self._wakeup.clear()
+
+
+order_intake = OrderIntakeWorkers()
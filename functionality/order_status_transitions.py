@@ -1,88 +1,101 @@
+from flask import current_app as flask_app
+from functionality.courier_index import courier_index
+from functionality.status_events import order_status_notifier
 from models import Order, OrderStatusEnum, DeliveryPersonnel, Delivery
 from setup.extensions import db
 from datetime import datetime
 
+# The advance_to_* functions apply a single status change to an Order already loaded
+# in the session without committing, so callers can batch several transitions into
+# one transaction. They return True if the transition was applied.
+
+def advance_to_being_prepared(order):
+    if order and order.status == OrderStatusEnum.Pending:
+        order.status = OrderStatusEnum.Being_Prepared
+
+        # Optionally, notify the kitchen or perform other actions here
+        flask_app.logger.info(f"Order {order.id} status changed to Being Prepared.")
+        return True
+    return False
+
+def advance_to_being_delivered(order):
+    if order and order.status == OrderStatusEnum.Being_Prepared:
+        delivery = order.delivery
+        if not delivery:
+            flask_app.logger.error(f"No delivery found for Order ID {order.id}")
+            return False
+
+        delivery_personnel = delivery.delivery_personnel
+        if not delivery_personnel:
+            flask_app.logger.error(f"No delivery personnel assigned for Delivery ID {delivery.id}")
+            return False
+
+        # Update order and delivery status
+        order.status = OrderStatusEnum.Being_Delivered
+        delivery.status = OrderStatusEnum.Being_Delivered
+
+        # Mark delivery personnel as unavailable
+        delivery_personnel.is_available = False
+        courier_index.out_for_delivery(delivery_personnel.id)
+
+        flask_app.logger.info(f"Order {order.id} status changed to Being Delivered and Delivery Personnel {delivery_personnel.name} marked as unavailable.")
+        return True
+    return False
+
+def advance_to_delivered(order):
+    if order and order.status == OrderStatusEnum.Being_Delivered:
+        # Update order status to Delivered
+        order.status = OrderStatusEnum.Delivered
+
+        # Update the delivery status to Delivered
+        delivery = order.delivery
+        if delivery:
+            delivery.status = OrderStatusEnum.Delivered
+            delivery.delivery_time = datetime.now()
+        else:
+            flask_app.logger.error(f"Delivery record not found for Order {order.id}.")
+
+        # Check if the delivery personnel has other active deliveries
+        delivery_personnel = delivery.delivery_personnel if delivery else None
+        if delivery_personnel:
+            active_deliveries = courier_index.delivery_finished(delivery_personnel.id)
+
+            if active_deliveries == 0:
+                # No other active deliveries; mark as available
+                delivery_personnel.is_available = True
+                delivery_personnel.postal_code = None  # Unassign postal code if necessary
+                delivery_personnel.last_delivery_time = datetime.now()
+        else:
+            flask_app.logger.error(f"Delivery personnel not found for Order {order.id}.")
+
+        flask_app.logger.info(f"Order {order.id} status changed to Delivered.")
+        return True
+    return False
+
 def transition_to_being_prepared(order_id):
     from app import app as current_app
     with current_app.app_context():
         order = Order.query.get(order_id)
-        if order and order.status == OrderStatusEnum.Pending:
-            order.status = OrderStatusEnum.Being_Prepared
+        if advance_to_being_prepared(order):
             db.session.commit()
-            
-            # Optionally, notify the kitchen or perform other actions here
-            current_app.logger.info(f"Order {order_id} status changed to Being Prepared.")
+            order_status_notifier.publish(order_id)
             print(f"Order {order_id} status changed to Being Prepared.")
 
 def transition_to_being_delivered(order_id):
     from app import app as current_app
     with current_app.app_context():
         order = Order.query.get(order_id)
-        if order and order.status == OrderStatusEnum.Being_Prepared:
-            # Update order status
-            order.status = OrderStatusEnum.Being_Delivered
-            
-            # Update delivery status
-            delivery = order.delivery
-            if delivery:
-                delivery.status = OrderStatusEnum.Being_Delivered
-            else:
-                current_app.logger.error(f"No delivery found for Order ID {order_id}")
-                return
-            
-            # Mark delivery personnel as unavailable
-            delivery_personnel = delivery.delivery_personnel
-            if delivery_personnel:
-                delivery_personnel.is_available = False
-            else:
-                current_app.logger.error(f"No delivery personnel assigned for Delivery ID {delivery.id}")
-                return
-            
+        if advance_to_being_delivered(order):
             # Commit all changes
             db.session.commit()
-            
-            current_app.logger.info(f"Order {order_id} status changed to Being Delivered and Delivery Personnel {delivery_personnel.name} marked as unavailable.")
-            print(f"Order {order_id} status changed to Being Delivered and Delivery Personnel {delivery_personnel.name} marked as unavailable.")
-            
+            order_status_notifier.publish(order_id)
+            print(f"Order {order_id} status changed to Being Delivered.")
+
 def transition_to_delivered(order_id):
     from app import app as current_app
     with current_app.app_context():
         order = Order.query.get(order_id)
-        if order and order.status == OrderStatusEnum.Being_Delivered:
-            # Update order status to Delivered
-            order.status = OrderStatusEnum.Delivered
-
-            # Update the delivery status to Delivered
-            delivery = order.delivery
-            if delivery:
-                delivery.status = OrderStatusEnum.Delivered
-                delivery.delivery_time = datetime.now()
-            else:
-                current_app.logger.error(f"Delivery record not found for Order {order_id}.")
-                print(f"Delivery record not found for Order {order_id}.")
-
+        if advance_to_delivered(order):
             db.session.commit()
-            
-            # Check if the delivery personnel has other active deliveries
-            delivery_personnel = delivery.delivery_personnel if delivery else None
-            if delivery_personnel:
-                active_deliveries = Delivery.query.filter(
-                    Delivery.delivery_personnel_id == delivery_personnel.id,
-                    Delivery.status.in_([OrderStatusEnum.Being_Prepared, OrderStatusEnum.Being_Delivered])
-                ).count()
-                
-                if active_deliveries == 0:
-                    # No other active deliveries; mark as available
-                    delivery_personnel.is_available = True
-                    delivery_personnel.postal_code = None  # Unassign postal code if necessary
-                    delivery_personnel.last_delivery_time = datetime.now()
-                    db.session.commit()
-                else:
-                    # The delivery personnel has other active deliveries; do not mark as available
-                    pass  # No action needed
-            else:
-                current_app.logger.error(f"Delivery personnel not found for Order {order_id}.")
-                print(f"Delivery personnel not found for Order {order_id}.")
-
-            current_app.logger.info(f"Order {order_id} status changed to Delivered.")
-            print(f"Order {order_id} status changed to Delivered.")
\ No newline at end of file
+            order_status_notifier.publish(order_id)
+            print(f"Order {order_id} status changed to Delivered.")
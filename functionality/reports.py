@@ -0,0 +1,224 @@
+# functionality/reports.py
+
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from flask import flash
+from sqlalchemy import and_, func, or_
+from models import Customer, Delivery, DeliveryPersonnel, Order, OrderStatusEnum
+from setup.extensions import db
+
+# Orders that do not count towards earnings: cancelled ones, and accepted ones the
+# order intake workers have not priced yet
+UNEARNED_STATUSES = (OrderStatusEnum.Cancelled, OrderStatusEnum.Processing)
+
+# Number of orders shown per page on the admin reports
+REPORT_PAGE_SIZE = 50
+MAX_REPORT_PAGE_SIZE = 500
+
+
+def build_earnings_criteria(form):
+    """
+    Translate a validated EarningsReportFilterForm into plain filter values.
+
+    :param form: The EarningsReportFilterForm bound to the request arguments.
+    :return: Dict with postal_code, gender, min_birthdate and max_birthdate (None when unset).
+    """
+    criteria = {
+        'postal_code': form.postal_code.data or None,
+        'gender': form.gender.data or None,
+        'min_birthdate': None,
+        'max_birthdate': None
+    }
+    # Translate the age range into a birthdate range
+    today = date.today()
+    if form.min_age.data is not None:
+        try:
+            criteria['max_birthdate'] = date(today.year - form.min_age.data, today.month, today.day)
+        except ValueError as e:
+            flash(f'Invalid minimum age input: {e}', 'danger')
+    if form.max_age.data is not None:
+        try:
+            criteria['min_birthdate'] = date(today.year - form.max_age.data - 1, today.month, today.day) + timedelta(days=1)
+        except ValueError as e:
+            flash(f'Invalid maximum age input: {e}', 'danger')
+    return criteria
+
+
+def earnings_filters(criteria):
+    """
+    Turn the values returned by build_earnings_criteria into SQLAlchemy filter clauses.
+
+    :return: List of filter expressions on Customer columns.
+    """
+    filters = []
+    if criteria['postal_code']:
+        filters.append(Customer.postal_code == criteria['postal_code'])
+    if criteria['gender']:
+        filters.append(Customer.gender == criteria['gender'])
+    if criteria['max_birthdate']:
+        filters.append(Customer.birthdate <= criteria['max_birthdate'])
+    if criteria['min_birthdate']:
+        filters.append(Customer.birthdate >= criteria['min_birthdate'])
+    return filters
+
+
+def earnings_summary(filters):
+    """
+    Compute total earnings, order count and average order value of the orders that
+    were not cancelled (or are still processing), scanning the orders themselves.
+
+    :param filters: Filter expressions as returned by earnings_filters.
+    :return: Tuple of (total_earnings, total_orders, average_order_value).
+    """
+    query = db.session.query(
+        func.coalesce(func.sum(Order.total_price), 0),
+        func.count(Order.id),
+        func.avg(Order.total_price)
+    ).join(Customer).filter(Order.status.notin_(UNEARNED_STATUSES))
+    if filters:
+        query = query.filter(*filters)
+
+    total_earnings, total_orders, average_order_value = query.one()
+    total_earnings = Decimal(str(total_earnings)).quantize(Decimal('0.01'))
+    if average_order_value is None:
+        average_order_value = Decimal('0.00')
+    else:
+        average_order_value = Decimal(str(average_order_value)).quantize(Decimal('0.01'))
+    return total_earnings, total_orders, average_order_value
+
+
+def earnings_orders_query(filters):
+    """Orders with the customer columns shown on the earnings report, the same orders earnings_summary totals."""
+    query = db.session.query(
+        Order.id.label('order_id'),
+        Order.order_date,
+        Order.total_price,
+        Customer.name.label('customer_name'),
+        Customer.gender,
+        Customer.birthdate,
+        Customer.postal_code
+    ).join(Customer).filter(Order.status.notin_(UNEARNED_STATUSES))
+    if filters:
+        query = query.filter(*filters)
+    return query
+
+
+def order_management_query(filters=None):
+    """Orders joined with their customer and delivery personnel for order management."""
+    query = db.session.query(
+        Order.id.label('order_id'),
+        Order.order_date,
+        Customer.name.label('customer_name'),
+        Order.status,
+        DeliveryPersonnel.name.label('delivery_personnel_name'),
+        Customer.postal_code
+    ).join(Customer).outerjoin(Order.delivery).outerjoin(DeliveryPersonnel)
+    if filters:
+        query = query.filter(*filters)
+    return query
+
+
+def build_order_management_filters(form):
+    """
+    Translate a validated OrderManagementFilterForm into SQLAlchemy filter clauses for
+    order_management_query.
+
+    :param form: The OrderManagementFilterForm bound to the request arguments.
+    :return: List of filter expressions.
+    """
+    filters = []
+    if form.status.data:
+        filters.append(Order.status == OrderStatusEnum[form.status.data])
+    if form.postal_code.data:
+        filters.append(Customer.postal_code == form.postal_code.data)
+    if form.courier.data:
+        filters.append(Delivery.delivery_personnel_id == int(form.courier.data))
+    # Date range (inclusive on both ends)
+    if form.date_from.data:
+        filters.append(Order.order_date >= datetime.combine(form.date_from.data, datetime.min.time()))
+    if form.date_to.data:
+        filters.append(Order.order_date < datetime.combine(form.date_to.data + timedelta(days=1), datetime.min.time()))
+    return filters
+
+
+def order_to_dict(row):
+    """Serialize a row of order_management_query for the JSON variant of the page."""
+    return {
+        'order_id': row.order_id,
+        'order_date': row.order_date.isoformat(),
+        'customer_name': row.customer_name,
+        'status': row.status.value,
+        'delivery_personnel_name': row.delivery_personnel_name,
+        'postal_code': row.postal_code
+    }
+
+
+def encode_cursor(order_date, order_id):
+    """Encode the (order_date, id) position of a row as an opaque cursor string."""
+    return f"{order_date.isoformat()}_{order_id}"
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor.
+
+    :return: Tuple of (order_date, order_id), or None if the cursor is malformed.
+    """
+    if not cursor:
+        return None
+    try:
+        order_date_str, order_id_str = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(order_date_str), int(order_id_str)
+    except ValueError:
+        return None
+
+
+def parse_page_size(value):
+    """Clamp a requested page size to the allowed range."""
+    try:
+        page_size = int(value)
+    except (TypeError, ValueError):
+        return REPORT_PAGE_SIZE
+    return max(1, min(page_size, MAX_REPORT_PAGE_SIZE))
+
+
+def keyset_page(query, cursor=None, page_size=REPORT_PAGE_SIZE, descending=True):
+    """
+    Fetch one page of a query over Order using keyset pagination.
+
+    Rows are ordered by (Order.order_date, Order.id), newest first unless descending
+    is False, and the page starts strictly after the position encoded in the cursor,
+    so the cost of a page does not depend on how deep into the table it is.
+
+    :param query: A query selecting from Order; rows must expose order_id and order_date.
+    :param cursor: Cursor string of the last row on the previous page.
+    :param page_size: Maximum number of rows to return.
+    :param descending: Newest first (True) or oldest first (False).
+    :return: Tuple of (rows, next_cursor); next_cursor is None on the last page.
+    """
+    position = decode_cursor(cursor)
+    if position:
+        last_date, last_id = position
+        if descending:
+            query = query.filter(or_(
+                Order.order_date < last_date,
+                and_(Order.order_date == last_date, Order.id < last_id)
+            ))
+        else:
+            query = query.filter(or_(
+                Order.order_date > last_date,
+                and_(Order.order_date == last_date, Order.id > last_id)
+            ))
+
+    if descending:
+        query = query.order_by(Order.order_date.desc(), Order.id.desc())
+    else:
+        query = query.order_by(Order.order_date, Order.id)
+    rows = query.limit(page_size + 1).all()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1].order_date, rows[-1].order_id)
+    return rows, next_cursor
@@ -0,0 +1,175 @@
+# functionality/routing.py
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from functionality.status_events import order_status_notifier
+from models import Delivery, MenuItem, MenuItemCategoryEnum, Order, OrderItem, OrderStatusEnum
+from setup.extensions import db
+
+RESTAURANT_POSTAL_CODE = '6211'
+
+# Postal codes sharing this prefix form a delivery zone. A delivery personnel serves one
+# zone at a time, so the orders they take in one trip go to nearby postal codes.
+ZONE_PREFIX_LENGTH = 3
+
+# Same preparation model as calculate_estimated_delivery_time
+PREPARATION_MINUTES = 5
+MINUTES_PER_PREPARED_ITEM = 1  # Per pizza or dessert
+
+# Time to hand over an order at a stop
+STOP_MINUTES = 2
+
+
+def delivery_zone(postal_code):
+    """
+    The delivery zone of a postal code.
+
+    :return: The zone, or None for None (delivery personnel without a postal code).
+    """
+    if postal_code is None:
+        return None
+    return postal_code[:ZONE_PREFIX_LENGTH]
+
+
+def travel_minutes(from_postal_code, to_postal_code):
+    """Driving time between two postal codes (1 minute per 5 postal codes, 10 if not numeric)."""
+    if from_postal_code == to_postal_code:
+        return 0
+    try:
+        return abs(int(from_postal_code) - int(to_postal_code)) // 5
+    except ValueError:
+        return 10
+
+
+def distance_matrix(postal_codes):
+    """Travel minutes between every pair of the given postal codes and the restaurant."""
+    postal_codes = set(postal_codes) | {RESTAURANT_POSTAL_CODE}
+    return {
+        origin: {destination: travel_minutes(origin, destination) for destination in postal_codes}
+        for origin in postal_codes
+    }
+
+
+def order_stops(postal_codes, distances):
+    """
+    Order the postal codes of a trip starting at the restaurant: nearest neighbour,
+    then 2-opt moves until no reversal shortens the route.
+
+    :param postal_codes: Distinct postal codes to visit.
+    :param distances: distance_matrix covering them.
+    :return: The postal codes in visiting order.
+    """
+    route = []
+    remaining = set(postal_codes)
+    current = RESTAURANT_POSTAL_CODE
+    while remaining:
+        current = min(remaining, key=lambda postal_code: (distances[current][postal_code], postal_code))
+        route.append(current)
+        remaining.remove(current)
+
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(route) - 1):
+            before = route[i - 1] if i else RESTAURANT_POSTAL_CODE
+            for j in range(i + 1, len(route)):
+                # The route is open (no return leg), so the last stop has no successor
+                after = route[j + 1] if j + 1 < len(route) else None
+                current_length = distances[before][route[i]] + (distances[route[j]][after] if after else 0)
+                reversed_length = distances[before][route[j]] + (distances[route[i]][after] if after else 0)
+                if reversed_length < current_length:
+                    route[i:j + 1] = reversed(route[i:j + 1])
+                    improved = True
+    return route
+
+
+def route_length(route, distances):
+    """Travel minutes from the restaurant along the route."""
+    stops = [RESTAURANT_POSTAL_CODE] + list(route)
+    return sum(distances[origin][destination] for origin, destination in zip(stops, stops[1:]))
+
+
+def plan_trip(stops, departure, distances):
+    """
+    Plan one delivery personnel's trip.
+
+    :param stops: (key, postal_code) of the orders in the trip, in the order they were assigned.
+    :param departure: When the trip leaves the restaurant.
+    :param distances: distance_matrix covering the postal codes.
+    :return: List of (key, estimated_delivery_time) in visiting order.
+    """
+    keys_by_postal_code = defaultdict(list)
+    for key, postal_code in stops:
+        keys_by_postal_code[postal_code].append(key)
+
+    arrival = departure
+    previous = RESTAURANT_POSTAL_CODE
+    etas = []
+    for postal_code in order_stops(keys_by_postal_code, distances):
+        arrival += timedelta(minutes=distances[previous][postal_code])
+        previous = postal_code
+        for key in keys_by_postal_code[postal_code]:
+            arrival += timedelta(minutes=STOP_MINUTES)
+            etas.append((key, arrival))
+    return etas
+
+
+def plan_routes(now=None):
+    """
+    Batch the orders being prepared for each delivery personnel into one trip and
+    write each stop's estimated delivery time to its Delivery, then commit.
+
+    A trip leaves when its last order is ready, visits its postal codes in the order
+    found by order_stops and spends STOP_MINUTES at every stop. Run by the dispatcher
+    after matching, so new orders get their place in the route within one interval.
+
+    :param now: Reference time (defaults to now).
+    :return: Tuple of (number of trips planned, number of estimated delivery times changed).
+    """
+    now = now or datetime.now()
+
+    deliveries = Delivery.query.filter(
+        Delivery.status == OrderStatusEnum.Being_Prepared,
+        Delivery.delivery_personnel_id.isnot(None)
+    ).options(
+        joinedload(Delivery.order).joinedload(Order.customer)
+    ).order_by(Delivery.id).all()
+    if not deliveries:
+        return 0, 0
+
+    # Pizzas and desserts per order, for the preparation time
+    prepared_items = dict(db.session.query(
+        OrderItem.order_id, func.sum(OrderItem.quantity)
+    ).join(MenuItem).filter(
+        OrderItem.order_id.in_([delivery.order_id for delivery in deliveries]),
+        MenuItem.category.in_([MenuItemCategoryEnum.Pizza, MenuItemCategoryEnum.Dessert])
+    ).group_by(OrderItem.order_id).all())
+
+    trips = defaultdict(list)
+    for delivery in deliveries:
+        trips[delivery.delivery_personnel_id].append(delivery)
+
+    changed_order_ids = []
+    for trip in trips.values():
+        # The trip leaves once every order in it is ready
+        departure = max([now] + [
+            delivery.order.order_date + timedelta(
+                minutes=PREPARATION_MINUTES + MINUTES_PER_PREPARED_ITEM * prepared_items.get(delivery.order_id, 0)
+            )
+            for delivery in trip
+        ])
+        stops = [(delivery, delivery.order.customer.postal_code) for delivery in trip]
+        distances = distance_matrix({postal_code for _, postal_code in stops})
+        for delivery, estimated_delivery_time in plan_trip(stops, departure, distances):
+            estimated_delivery_time = estimated_delivery_time.replace(microsecond=0)
+            if delivery.estimated_delivery_time != estimated_delivery_time:
+                delivery.estimated_delivery_time = estimated_delivery_time
+                changed_order_ids.append(delivery.order_id)
+
+    if changed_order_ids:
+        db.session.commit()
+        order_status_notifier.publish(*changed_order_ids)
+    return len(trips), len(changed_order_ids)
@@ -0,0 +1,50 @@
+# functionality/status_events.py
+
+import itertools
+import threading
+from collections import OrderedDict
+
+
+class OrderStatusNotifier:
+    """
+    In-process change feed for order statuses.
+
+    Code that commits a status change calls publish(); streaming responses block in
+    wait_for_change() instead of polling the database. Only a version token per order
+    is kept (bounded, least recently changed first out), never the order data itself.
+    """
+
+    def __init__(self, max_orders=10000):
+        self.max_orders = max_orders
+        self._condition = threading.Condition()
+        self._versions = OrderedDict()
+        self._sequence = itertools.count(1)
+
+    def publish(self, *order_ids):
+        """Signal that the status of the given orders changed (call after commit)."""
+        if not order_ids:
+            return
+        with self._condition:
+            for order_id in order_ids:
+                self._versions[order_id] = next(self._sequence)
+                self._versions.move_to_end(order_id)
+            while len(self._versions) > self.max_orders:
+                self._versions.popitem(last=False)
+            self._condition.notify_all()
+
+    def version(self, order_id):
+        with self._condition:
+            return self._versions.get(order_id)
+
+    def wait_for_change(self, order_id, version, timeout):
+        """
+        Block until the order's version differs from version or the timeout expires.
+
+        :return: Tuple of (changed, current_version).
+        """
+        with self._condition:
+            changed = self._condition.wait_for(lambda: self._versions.get(order_id) != version, timeout)
+            return changed, self._versions.get(order_id)
+
+
+order_status_notifier = OrderStatusNotifier()
@@ -1,6 +1,7 @@
 # utils.py
 
 from decimal import Decimal, ROUND_HALF_UP
+from itertools import repeat
 
 def calculate_final_price(base_price, profit_margin=Decimal('0.40'), vat=Decimal('0.09')):
     """
@@ -17,4 +18,47 @@ def calculate_final_price(base_price, profit_margin=Decimal('0.40'), vat=Decimal
     
     price_with_profit = base_price * (Decimal('1') + profit_margin)
     final_price = price_with_profit * (Decimal('1') + vat)
-    return final_price.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
\ No newline at end of file
+    return final_price.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+def calculate_cart_prices(base_prices, quantities=None, discount_percentage=Decimal('0.00'),
+                          profit_margin=Decimal('0.40'), vat=Decimal('0.09')):
+    """
+    Price a whole cart in one pass, with the same rounding as calculate_final_price.
+
+    :param base_prices: Sequence of base prices, one per line.
+    :param quantities: Sequence of quantities aligned with base_prices (default 1 each).
+    :param discount_percentage: Discount applied to the subtotal, in percent.
+    :param profit_margin: The profit margin to apply (default is 40%).
+    :param vat: The VAT percentage to apply (default is 9%).
+    :return: Dict with 'final_prices' (per unit, per line), 'subtotal', 'discount_amount'
+             and 'total' (all Decimal).
+    """
+    cent = Decimal('0.01')
+    # (base * (1 + margin)) * (1 + vat) is exact in Decimal, so one combined factor gives identical results
+    multiplier = (Decimal('1') + profit_margin) * (Decimal('1') + vat)
+    if quantities is None:
+        quantities = repeat(1)
+
+    final_prices = []
+    final_price_by_base = {}  # Menus have few distinct prices; price each once
+    subtotal = Decimal('0.00')
+    for base_price, quantity in zip(base_prices, quantities):
+        final_price = final_price_by_base.get(base_price)
+        if final_price is None:
+            price = base_price if isinstance(base_price, Decimal) else Decimal(str(base_price))
+            final_price = (price * multiplier).quantize(cent, rounding=ROUND_HALF_UP)
+            final_price_by_base[base_price] = final_price
+        final_prices.append(final_price)
+        subtotal += final_price * quantity
+
+    if not isinstance(discount_percentage, Decimal):
+        discount_percentage = Decimal(str(discount_percentage))
+    discount_amount = (subtotal * (discount_percentage / Decimal('100'))).quantize(cent, rounding=ROUND_HALF_UP)
+    total = (subtotal - discount_amount).quantize(cent, rounding=ROUND_HALF_UP)
+
+    return {
+        'final_prices': final_prices,
+        'subtotal': subtotal,
+        'discount_amount': discount_amount,
+        'total': total
+    }
@@ -1,6 +1,6 @@
 from decimal import Decimal
 from flask_login import UserMixin
-from sqlalchemy import Column, DateTime, Integer, String, DECIMAL, Boolean, Date, Text, Enum, ForeignKey
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String, DECIMAL, Boolean, Date, Text, Enum, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from setup.extensions import db
 import enum
@@ -18,6 +18,7 @@ class GenderEnum(enum.Enum):
     Other = 'Other'
 
 class OrderStatusEnum(enum.Enum):
+    Processing = 'Processing'  # Accepted, waiting in the order intake queue
     Pending = 'Pending'
     Being_Prepared = 'Being Prepared'
     Waiting_for_Delivery_Personnel = 'Waiting for Delivery Personnel'
@@ -79,6 +80,12 @@ class MenuItemIngredient(db.Model):
 ## Customer
 class Customer(UserMixin, db.Model):  # Inherit from UserMixin
     __tablename__ = 'Customer'
+    __table_args__ = (
+        # Earnings report filters
+        Index('ix_customer_postal_code', 'postal_code'),
+        Index('ix_customer_birthdate', 'birthdate'),
+        Index('ix_customer_gender', 'gender'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(50), nullable=False)
@@ -103,6 +110,14 @@ class Customer(UserMixin, db.Model):  # Inherit from UserMixin
 ## Order
 class Order(db.Model):
     __tablename__ = 'Order'
+    __table_args__ = (
+        # My orders page
+        Index('ix_order_customer_id', 'customer_id'),
+        # Newest-first keyset pagination in the admin reports
+        Index('ix_order_order_date_id', 'order_date', 'id'),
+        # Order management filtered by status
+        Index('ix_order_status_order_date_id', 'status', 'order_date', 'id'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     customer_id = Column(Integer, ForeignKey('Customer.id'), nullable=False)
@@ -124,6 +139,9 @@ class Order(db.Model):
 ## OrderItem
 class OrderItem(db.Model):
     __tablename__ = 'OrderItem'
+    __table_args__ = (
+        Index('ix_orderitem_order_id', 'order_id'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     order_id = Column(Integer, ForeignKey('Order.id'), nullable=False)
@@ -160,6 +178,10 @@ class DiscountCodeUsage(db.Model):
 ## DeliveryPersonnel
 class DeliveryPersonnel(db.Model):
     __tablename__ = 'DeliveryPersonnel'
+    __table_args__ = (
+        # Courier lookup in assign_delivery_personnel
+        Index('ix_deliverypersonnel_postal_code_is_available', 'postal_code', 'is_available'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(50), nullable=False)
@@ -174,6 +196,10 @@ class DeliveryPersonnel(db.Model):
 ## Delivery
 class Delivery(db.Model):
     __tablename__ = 'Delivery'
+    __table_args__ = (
+        # Active deliveries per courier (ETA, completion and status transitions)
+        Index('ix_delivery_personnel_id_status', 'delivery_personnel_id', 'status'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     order_id = Column(Integer, ForeignKey('Order.id'), nullable=False, unique=True)
@@ -190,6 +216,9 @@ class Delivery(db.Model):
 ## OrderStatusHistory (Optional)
 class OrderStatusHistory(db.Model):
     __tablename__ = 'OrderStatusHistory'
+    __table_args__ = (
+        Index('ix_orderstatushistory_order_id', 'order_id'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     order_id = Column(Integer, ForeignKey('Order.id'), nullable=False)
@@ -197,4 +226,55 @@ class OrderStatusHistory(db.Model):
     updated_at = Column(DateTime, default=datetime.now, nullable=False)
 
     # Relationships
-    order = relationship('Order', back_populates='status_history')
\ No newline at end of file
+    order = relationship('Order', back_populates='status_history')
+
+## ScheduledTransition
+class ScheduledTransition(db.Model):
+    __tablename__ = 'ScheduledTransition'
+    __table_args__ = (
+        # The lifecycle engine always looks for the earliest due transitions
+        Index('ix_scheduledtransition_due_at', 'due_at'),
+        Index('ix_scheduledtransition_order_id', 'order_id'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    order_id = Column(Integer, ForeignKey('Order.id'), nullable=False)
+    status = Column(Enum(OrderStatusEnum), nullable=False)  # Status the order moves to
+    due_at = Column(DateTime, nullable=False)
+
+    # Relationships
+    order = relationship('Order')
+
+## OrderIntake
+class OrderIntake(db.Model):
+    __tablename__ = 'OrderIntake'
+    __table_args__ = (
+        # The intake workers claim the oldest unclaimed (or expired) entries
+        Index('ix_orderintake_claimed_until_id', 'claimed_until', 'id'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    order_id = Column(Integer, ForeignKey('Order.id'), nullable=False, unique=True)
+    items = Column(Text, nullable=False)  # JSON list of {"menu_item_id": ..., "quantity": ...}
+    discount_code = Column(String(20), nullable=True)
+    discount_percentage = Column(DECIMAL(5, 2), nullable=False, default=Decimal('0.00'))
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+    attempts = Column(Integer, nullable=False, default=0)
+    claim_token = Column(String(32), nullable=True)
+    claimed_until = Column(DateTime, nullable=True)  # Lease of the worker processing it
+    last_error = Column(Text, nullable=True)
+
+    # Relationships
+    order = relationship('Order')
+
+## EarningsRollup
+class EarningsRollup(db.Model):
+    __tablename__ = 'EarningsRollup'
+
+    # One row per order day and customer segment; maintained by functionality/earnings_rollups.py
+    day = Column(Date, primary_key=True)
+    postal_code = Column(String(10), primary_key=True)
+    gender = Column(Enum(GenderEnum), primary_key=True)
+    birth_year = Column(Integer, primary_key=True)  # Age band: customers born in the same year
+    order_count = Column(Integer, nullable=False, default=0)
+    revenue_cents = Column(BigInteger, nullable=False, default=0)  # Integer cents so sums stay exact
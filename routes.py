@@ -1,19 +1,62 @@
 from decimal import ROUND_HALF_UP, Decimal
 from flask import render_template, redirect, session, url_for, flash, request
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
 from functionality.customer import create_customer
 from functionality.delivery import complete_delivery
 from functionality.order import create_order
-from functionality.order import cancel_order
+from functionality.order import cancel_order, load_order_details
+from functionality.order_intake import accept_order
+from functionality.cart import cart_store, check_quantity
+from functionality.menu_cache import menu_cache
+from functionality.earnings_rollups import rollup_earnings_summary
+from functionality.exports import EXPORT_FORMATS, export_response
+from functionality.identity_cache import identity_cache
+from functionality.reports import build_earnings_criteria, build_order_management_filters, earnings_filters, earnings_orders_query, earnings_summary, keyset_page, order_management_query, order_to_dict, parse_page_size
+from functionality.status_events import order_status_notifier
 from functionality.utils import calculate_final_price
+from setup.passwords import PasswordHasherBusy, password_hasher
+from setup.query_stats import route_query_stats
+from setup.replica import remember_write, use_read_replica
 from models import Customer, Delivery, DeliveryPersonnel, DiscountCode, DiscountCodeUsage, MenuItem, MenuItemCategoryEnum, Order, OrderItem, OrderStatusEnum
-from forms import EarningsReportFilterForm, RegistrationForm, LoginForm, OrderForm, OrderItemForm
+from forms import EarningsReportFilterForm, OrderManagementFilterForm, RegistrationForm, LoginForm, OrderForm, OrderItemForm
 from datetime import datetime
-from flask import jsonify
+from flask import Response, abort, jsonify, stream_with_context
+import json
 from flask import request, session
 from functionality.utils import calculate_final_price 
 
+FINAL_ORDER_STATUSES = (OrderStatusEnum.Delivered.value, OrderStatusEnum.Cancelled.value)
+
+def format_time_till_delivery(estimated_delivery_time, now):
+    if not estimated_delivery_time:
+        return 'Calculating...'
+    time_till_delivery = estimated_delivery_time - now
+    if time_till_delivery.total_seconds() > 0:
+        hours, remainder = divmod(int(time_till_delivery.total_seconds()), 3600)
+        minutes, _ = divmod(remainder, 60)
+        if hours > 0:
+            return f"{hours}h {minutes}m"
+        return f"{minutes}m"
+    return 'Any minute now!'
+
+def order_status_payload(order_id):
+    """Status summary of an order as sent to the status page, or None if it does not exist."""
+    order = load_order_details(order_id, with_items=False)
+    if order is None:
+        return None
+    delivery = order.delivery
+    return {
+        'status': order.status.value,
+        'delivery_personnel': delivery.delivery_personnel.name if delivery and delivery.delivery_personnel else 'Awaiting assignment',
+        'estimated_delivery_time': delivery.estimated_delivery_time.strftime('%Y-%m-%d %H:%M:%S') if delivery and delivery.estimated_delivery_time else 'Calculating...',
+        'time_till_delivery': format_time_till_delivery(delivery.estimated_delivery_time if delivery else None, datetime.now())
+    }
+
+def hashing_busy_response(template, form, busy):
+    """Re-render a login or registration form with 503 when password hashing is saturated."""
+    flash('We are very busy right now. Please try again in a few seconds.', 'warning')
+    return render_template(template, form=form), 503, {'Retry-After': str(busy.retry_after)}
+
 def register_routes(app):
     @app.route('/')
     @app.route('/index')
@@ -22,6 +65,7 @@ def register_routes(app):
     
     @app.route('/my_orders', methods=['GET'])
     @login_required
+    @use_read_replica
     def my_orders():
         from setup.extensions import db 
         # Fetch orders belonging to the current user
@@ -39,92 +83,165 @@ def register_routes(app):
 
     @app.route('/earnings_report', methods=['GET', 'POST'])
     @login_required
+    @use_read_replica
     def earnings_report():
         from setup.extensions import db
-        from datetime import datetime, date, timedelta
-        from decimal import Decimal
+        from datetime import date
         # Access control: Only admins can access
         if not current_user.is_admin:
             flash('You do not have permission to access this page.', 'danger')
             return redirect(url_for('order'))
 
         form = EarningsReportFilterForm(request.args)
-        filters = []
+        criteria = {'postal_code': None, 'gender': None, 'min_birthdate': None, 'max_birthdate': None}
         if form.validate():
-            # Filter by postal code
-            if form.postal_code.data:
-                filters.append(Customer.postal_code == form.postal_code.data)
-            # Filter by gender
-            if form.gender.data:
-                filters.append(Customer.gender == form.gender.data)
-            # Filter by age range
-            today = date.today()
-            if form.min_age.data is not None:
-                try:
-                    max_birthdate = date(today.year - form.min_age.data, today.month, today.day)
-                    filters.append(Customer.birthdate <= max_birthdate)
-                except ValueError as e:
-                    flash(f'Invalid minimum age input: {e}', 'danger')
-            if form.max_age.data is not None:
-                try:
-                    min_birthdate = date(today.year - form.max_age.data - 1, today.month, today.day) + timedelta(days=1)
-                    filters.append(Customer.birthdate >= min_birthdate)
-                except ValueError as e:
-                    flash(f'Invalid maximum age input: {e}', 'danger')
+            criteria = build_earnings_criteria(form)
         else:
             if request.args:
                 flash('Invalid filter inputs.', 'warning')
                 # Log form errors for debugging
                 app.logger.warning(f"EarningsReportFilterForm validation errors: {form.errors}")
+        filters = earnings_filters(criteria)
 
-        # Join Orders with Customers
-        query = db.session.query(
-            Order.id.label('order_id'),
-            Order.order_date,
-            Order.total_price,
-            Customer.name.label('customer_name'),
-            Customer.gender,
-            Customer.birthdate,
-            Customer.postal_code
-        ).join(Customer)
-
-        if filters:
-            query = query.filter(*filters)
+        # Calculate aggregates from the daily rollups (or by scanning the orders if disabled)
+        if app.config.get('USE_EARNINGS_ROLLUPS', True):
+            total_earnings, total_orders, average_order_value = rollup_earnings_summary(criteria)
+        else:
+            total_earnings, total_orders, average_order_value = earnings_summary(filters)
 
-        # Retrieve orders
-        orders = query.all()
+        # Retrieve one page of orders joined with their customers
+        orders, next_cursor = keyset_page(
+            earnings_orders_query(filters),
+            cursor=request.args.get('cursor'),
+            page_size=parse_page_size(request.args.get('page_size'))
+        )
 
-        # Calculate aggregates
-        total_earnings = sum(order.total_price for order in orders) or Decimal('0.00')
-        total_orders = len(orders)
-        average_order_value = (total_earnings / total_orders) if total_orders > 0 else Decimal('0.00')
+        # Keep the filters when following the pagination link or exporting
+        filter_args = {key: value for key, value in request.args.items() if key != 'cursor'}
+        export_args = {key: value for key, value in filter_args.items() if key in form.data and key != 'submit'}
 
         return render_template('earnings_report.html', form=form, orders=orders,
                                total_earnings=total_earnings,
                                total_orders=total_orders,
                                average_order_value=average_order_value,
+                               next_cursor=next_cursor,
+                               is_first_page=not request.args.get('cursor'),
+                               filter_args=filter_args,
+                               export_args=export_args,
                                date=date)  # Pass 'date' to the template
 
+    def order_management_filter_form():
+        # Shared by the page, its JSON variant and its export
+        from setup.extensions import db
+        form = OrderManagementFilterForm(request.args)
+        couriers = db.session.query(DeliveryPersonnel.id, DeliveryPersonnel.name).order_by(DeliveryPersonnel.name)
+        form.courier.choices = [('', 'All')] + [(str(courier_id), name) for courier_id, name in couriers]
+        return form
+
+    def order_management_page():
+        # Shared by the HTML page and its JSON variant
+        form = order_management_filter_form()
+        filters = []
+        valid = form.validate()
+        if valid:
+            filters = build_order_management_filters(form)
+
+        # Retrieve one page of orders, joined with customer and delivery personnel
+        orders, next_cursor = keyset_page(
+            order_management_query(filters),
+            cursor=request.args.get('cursor'),
+            page_size=parse_page_size(request.args.get('page_size')),
+            descending=form.sort.data != 'oldest'
+        )
+        return form, valid, orders, next_cursor
+
     @app.route('/order_management', methods=['GET'])
     @login_required
+    @use_read_replica
     def order_management():
-        from setup.extensions import db
         # Access control: Only admins can access this page
         if not current_user.is_admin:
             flash('You do not have permission to access this page.', 'danger')
             return redirect(url_for('order'))  # Redirect to order page or any other appropriate page
 
-        # Fetch all orders, joined with customer and delivery personnel
-        orders = db.session.query(
-            Order.id.label('order_id'),
-            Order.order_date,
-            Customer.name.label('customer_name'),
-            Order.status,
-            DeliveryPersonnel.name.label('delivery_personnel_name'),
-            Customer.postal_code
-        ).join(Customer).outerjoin(Order.delivery).outerjoin(DeliveryPersonnel).all()
+        form, valid, orders, next_cursor = order_management_page()
+        if not valid and request.args:
+            flash('Invalid filter inputs.', 'warning')
+            app.logger.warning(f"OrderManagementFilterForm validation errors: {form.errors}")
+
+        # Keep the filters when following the pagination link or exporting
+        filter_args = {key: value for key, value in request.args.items() if key != 'cursor'}
+        export_args = {key: value for key, value in filter_args.items() if key in form.data and key != 'submit'}
+
+        return render_template('order_management.html', form=form, orders=orders,
+                               next_cursor=next_cursor,
+                               is_first_page=not request.args.get('cursor'),
+                               filter_args=filter_args,
+                               export_args=export_args)
+
+    @app.route('/order_management.json', methods=['GET'])
+    @login_required
+    @use_read_replica
+    def order_management_json():
+        if not current_user.is_admin:
+            abort(403)
+        form, valid, orders, next_cursor = order_management_page()
+        if not valid:
+            return jsonify({'errors': form.errors}), 400
+        return jsonify({
+            'orders': [order_to_dict(row) for row in orders],
+            'next_cursor': next_cursor
+        })
+
+    def export_filters():
+        # Filters of the earnings report export; invalid input is rejected rather than ignored
+        form = EarningsReportFilterForm(request.args)
+        if not form.validate():
+            abort(400)
+        return earnings_filters(build_earnings_criteria(form))
+
+    @app.route('/earnings_report/export.<string:export_format>', methods=['GET'])
+    @login_required
+    @use_read_replica
+    def export_earnings_report(export_format):
+        if not current_user.is_admin:
+            abort(403)
+        if export_format not in EXPORT_FORMATS:
+            abort(404)
+        query = earnings_orders_query(export_filters()).order_by(Order.order_date.desc(), Order.id.desc())
+        return export_response(query, export_format, 'earnings_report')
+
+    @app.route('/order_management/export.<string:export_format>', methods=['GET'])
+    @login_required
+    @use_read_replica
+    def export_order_management(export_format):
+        if not current_user.is_admin:
+            abort(403)
+        if export_format not in EXPORT_FORMATS:
+            abort(404)
+        # Same filters and sort order as the page; invalid input is rejected rather than ignored
+        form = order_management_filter_form()
+        if not form.validate():
+            abort(400)
+        query = order_management_query(build_order_management_filters(form))
+        if form.sort.data == 'oldest':
+            query = query.order_by(Order.order_date, Order.id)
+        else:
+            query = query.order_by(Order.order_date.desc(), Order.id.desc())
+        return export_response(query, export_format, 'orders')
 
-        return render_template('order_management.html', orders=orders)
+    @app.route('/metrics', methods=['GET'])
+    @login_required
+    def metrics():
+        # Access control: Only admins can see the query statistics
+        if not current_user.is_admin:
+            abort(403)
+        return jsonify({
+            'slow_query_threshold_ms': app.config.get('SLOW_QUERY_THRESHOLD_MS'),
+            'routes': route_query_stats.snapshot(),
+            'identity_cache': identity_cache.stats(),
+            'carts': cart_store.stats()
+        })
     
     
     @app.route('/register', methods=['GET', 'POST'])
@@ -137,8 +254,11 @@ def register_routes(app):
                 flash('Email already exists. Please log in.', 'danger')
                 return redirect(url_for('login'))
 
-            hashed_password = generate_password_hash(form.password.data)  # Updated method
-            
+            try:
+                hashed_password = password_hasher.generate(form.password.data)
+            except PasswordHasherBusy as busy:
+                return hashing_busy_response('register.html', form, busy)
+
             create_customer(form, hashed_password)
                
             flash('Your account has been created! You can now log in.', 'success')
@@ -153,7 +273,11 @@ def register_routes(app):
         if form.validate_on_submit():
             # Query the customer
             customer = Customer.query.filter_by(email=form.email.data).first()
-            if customer and check_password_hash(customer.password, form.password.data):
+            try:
+                password_matches = customer is not None and password_hasher.check(customer.password, form.password.data)
+            except PasswordHasherBusy as busy:
+                return hashing_busy_response('login.html', form, busy)
+            if password_matches:
                 login_user(customer)
                 flash('Logged in successfully!', 'success')
                 return redirect(url_for('index'))  # Redirect to 'index' instead of 'order'
@@ -175,70 +299,45 @@ def register_routes(app):
     @app.route('/menu', methods=['GET'])
     @login_required
     def menu():
-        # Retrieve all menu items
-        menu_items = MenuItem.query.all()
-
-        # Optionally, categorize them
-        pizzas = [item.to_dict() for item in menu_items if item.category == MenuItemCategoryEnum.Pizza]
-        drinks = [item.to_dict() for item in menu_items if item.category == MenuItemCategoryEnum.Drink]
-        desserts = [item.to_dict() for item in menu_items if item.category == MenuItemCategoryEnum.Dessert]
+        # Retrieve the categorized menu items from the cache
+        menu = menu_cache.get()
 
         # Render the template with the manually defined menu items
-        return render_template('menu.html', pizzas=pizzas, drinks=drinks, desserts=desserts)
+        return render_template('menu.html', pizzas=menu.pizzas, drinks=menu.drinks, desserts=menu.desserts)
         
     @app.route('/order', methods=['GET', 'POST'])
     @login_required
     def order():
         from setup.extensions import db
-        discount_percentage = Decimal(session.get('discount_percentage', 0.00))
-        discount_code_str = session.get('discount_code', None)
         discount_code = None  # Initialize discount_code variable
 
-        # Initialize selected_items
-        selected_items = []
-
-        # Retrieve selected item IDs from query parameters on GET request
-        if request.method == 'GET':
-            selected_item_ids = request.args.getlist('item_ids')
-            if selected_item_ids:
-                # Convert IDs to integers
-                selected_item_ids = [int(id) for id in selected_item_ids]
-
-                # Query the database for selected items
-                selected_items = MenuItem.query.filter(MenuItem.id.in_(selected_item_ids)).all()
-            else:
-                selected_items = []
-
-            # Store selected_item_ids in session to preserve them between requests
-            session['selected_item_ids'] = selected_item_ids
-
-        # On POST request, retrieve selected items from session
-        else:
-            selected_item_ids = session.get('selected_item_ids', [])
-            if selected_item_ids:
-                selected_items = MenuItem.query.filter(MenuItem.id.in_(selected_item_ids)).all()
-            else:
-                selected_items = []
-
-        # Calculate final price for each selected item and store in a list
-        item_totals = []
-        for item in selected_items:
-            final_price = calculate_final_price(item.base_price)
-            item.final_price = final_price  # Add final_price attribute to item for use in template
-            item_totals.append(final_price)
-
-        # Calculate subtotal
-        subtotal = sum(item_totals)
+        # Menu items and their final prices come from the cache, the cart from the cart store
+        menu = menu_cache.get()
+        cart = cart_store.get(current_user.id, menu)
+
+        # Items chosen on the menu page replace the cart's lines
+        if request.method == 'GET' and 'item_ids' in request.args:
+            item_ids = request.args.getlist('item_ids')
+            quantities = request.args.getlist('quantities')
+            quantities += ['1'] * (len(item_ids) - len(quantities))  # Quantity 1 when not given
+            selected_items = {}
+            for item_id, quantity in zip(item_ids, quantities):
+                try:
+                    item_id = int(item_id)
+                except ValueError:
+                    continue  # Skip malformed item ids
+                try:
+                    selected_items[item_id] = int(quantity)
+                except ValueError:
+                    selected_items[item_id] = 1
+            with cart.lock:
+                cart.replace_lines(menu, selected_items)
 
         # Proceed with your existing logic
         form = OrderForm()
 
         # **Set up choices for form fields that require them**
-        menu_items = MenuItem.query.all()
-        menu_item_choices = [
-            (item.id, f"{item.name} (${calculate_final_price(item.base_price)})")
-            for item in menu_items
-        ]
+        menu_item_choices = menu.choices
 
         form.process(request.form)
 
@@ -249,6 +348,12 @@ def register_routes(app):
             item_form.menu_item_id.choices = menu_item_choices
 
         if form.validate_on_submit():
+            with cart.lock:
+                items = cart.order_items()
+                discount_code_str = cart.discount_code
+            if not items:
+                flash('Your cart is empty.', 'danger')
+                return redirect(url_for('menu'))
             # Create the order
             try:
                 # Re-validate the discount code
@@ -272,19 +377,42 @@ def register_routes(app):
                     discount_percentage = Decimal('0.00')
                     discount_code = None
 
-                new_order = create_order(
-                    customer=current_user,
-                    items=[{'menu_item_id': item.id, 'quantity': 1} for item in selected_items],
-                    discount_percentage=discount_percentage,
-                    discount_code=discount_code
-                )
-                db.session.commit()
-                flash('Your order has been placed successfully!', 'success')
-                # Clear selected items and discount from session
-                session.pop('selected_item_ids', None)
-                session.pop('discount_code', None)
-                session.pop('discount_percentage', None)
-                return redirect(url_for('order_status_page', order_id=new_order.id))
+                if app.config.get('ORDER_INTAKE_ASYNC', False):
+                    # Priced, assigned and scheduled by the order intake workers
+                    new_order = accept_order(
+                        current_user.id, items, discount_percentage,
+                        discount_code.code if discount_code else None
+                    )
+                    flash('Your order has been received and is being processed.', 'success')
+                else:
+                    new_order = create_order(
+                        # current_user is a cached principal; the order updates the Customer row
+                        customer=db.session.get(Customer, current_user.id),
+                        items=items,
+                        discount_percentage=discount_percentage,
+                        discount_code=discount_code
+                    )
+                    db.session.commit()
+                    flash('Your order has been placed successfully!', 'success')
+                remember_write()
+                # The cart (with its discount) has become the order
+                cart_store.discard(current_user.id)
+                status_url = url_for('order_status_page', order_id=new_order.id)
+                if request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json':
+                    response = jsonify({
+                        'order_id': new_order.id,
+                        'status': new_order.status.value,
+                        'status_url': url_for('get_order_status', order_id=new_order.id)
+                    })
+                    response.status_code = 202 if new_order.status == OrderStatusEnum.Processing else 201
+                    response.headers['Location'] = status_url
+                    return response
+                return redirect(status_url)
+            except ValueError as ve:
+                # E.g. the discount code was spent by another order since it was validated
+                db.session.rollback()
+                flash(str(ve), 'danger')
+                return redirect(url_for('order'))
             except Exception as e:
                 db.session.rollback()
                 flash(f'An error occurred while placing your order: {str(e)}', 'danger')
@@ -292,16 +420,18 @@ def register_routes(app):
             # Handle form validation errors or initial GET request
             pass
 
-        # Calculate discount amount and total after discount
-        discount_amount = (subtotal * (discount_percentage / Decimal('100'))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        total_after_discount = (subtotal - discount_amount).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-
-        # Debugging statements
-        print("Order Summary:")
-        print(f"Subtotal: ${subtotal}")
-        print(f"Discount Percentage: {discount_percentage}%")
-        print(f"Discount Amount: -${discount_amount}")
-        print(f"Total After Discount: ${total_after_discount}")
+        # Lines and totals are kept up to date by the cart
+        with cart.lock:
+            selected_items = [line.to_dict() for line in cart.lines.values()]
+            subtotal = cart.subtotal
+            discount_percentage = cart.discount_percentage
+            discount_amount = cart.discount_amount
+            total_after_discount = cart.total
+
+        app.logger.debug(
+            f"Order summary: subtotal ${subtotal}, discount {discount_percentage}% (-${discount_amount}), "
+            f"total ${total_after_discount}"
+        )
 
         return render_template(
             'order.html',
@@ -313,6 +443,36 @@ def register_routes(app):
             discount_percentage=discount_percentage
         )
 
+    @app.route('/cart/items/<int:menu_item_id>', methods=['POST'])
+    @login_required
+    def update_cart_item(menu_item_id):
+        data = request.get_json()
+        try:
+            quantity = int(data.get('quantity', 0))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'Invalid quantity.'}), 400
+        try:
+            check_quantity(quantity)
+        except ValueError as ve:
+            return jsonify({'success': False, 'message': str(ve)}), 400
+
+        menu = menu_cache.get()
+        cart = cart_store.get(current_user.id, menu)
+        with cart.lock:
+            try:
+                line = cart.set_line(menu, menu_item_id, quantity)
+            except ValueError as ve:
+                return jsonify({'success': False, 'message': str(ve)}), 404
+            summary = cart.summary()
+
+        # Respond with the line and the updated totals
+        return jsonify({
+            'success': True,
+            'quantity': line.quantity if line else 0,
+            'line_total': float(line.line_total) if line else 0.0,
+            **summary
+        })
+
     @app.route('/apply_discount', methods=['POST'])
     @login_required
     def apply_discount():
@@ -322,7 +482,7 @@ def register_routes(app):
         # Validate the discount code
         discount_code = DiscountCode.query.filter_by(code=discount_code_str).first()
         if not discount_code:
-            print(f"Discount code '{discount_code_str}' is invalid.")  # Debugging line
+            app.logger.debug(f"Discount code '{discount_code_str}' is invalid.")
             return jsonify({'success': False, 'message': 'Invalid discount code.'}), 400
 
         # Check if the user has already used this code
@@ -331,98 +491,84 @@ def register_routes(app):
             code=discount_code.code
         ).first()
         if usage and usage.is_used:
-            print(f"Discount code '{discount_code_str}' has already been used by user {current_user.id}.")  # Debugging line
+            app.logger.debug(f"Discount code '{discount_code_str}' has already been used by user {current_user.id}.")
             return jsonify({'success': False, 'message': 'You have already used this discount code.'}), 400
 
-        # Calculate the new total with the discount applied
-        discount_percentage = discount_code.discount_percentage
-
-        # Retrieve selected items from session
-        selected_item_ids = session.get('selected_item_ids', [])
-        selected_items = MenuItem.query.filter(MenuItem.id.in_(selected_item_ids)).all()
-
-        # Calculate final prices
-        item_totals = [calculate_final_price(item.base_price) for item in selected_items]
-        subtotal = sum(item_totals)
+        # The cart derives the discount from its running subtotal
+        cart = cart_store.get(current_user.id, menu_cache.get())
+        with cart.lock:
+            cart.apply_discount(discount_code.code, discount_code.discount_percentage)
+            summary = cart.summary()
 
-        # Apply the discount
-        discount_amount = (subtotal * (discount_percentage / Decimal('100'))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        total_after_discount = (subtotal - discount_amount).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-
-        # Debugging statements
-        print(f"Discount Code Applied: {discount_code_str}")
-        print(f"Discount Percentage: {discount_percentage}%")
-        print(f"Subtotal before discount: ${subtotal}")
-        print(f"Discount Amount: -${discount_amount}")
-        print(f"Total after discount: ${total_after_discount}")
-
-        # Store the discount code and percentage in the session
-        session['discount_code'] = discount_code_str
-        session['discount_percentage'] = float(discount_percentage)
+        app.logger.debug(
+            f"Discount code {discount_code_str} applied: subtotal ${summary['subtotal']}, "
+            f"discount {summary['discount_percentage']}% (-${summary['discount_amount']}), "
+            f"total ${summary['total_after_discount']}"
+        )
 
         # Respond with updated values
-        return jsonify({
-            'success': True,
-            'subtotal': float(subtotal),
-            'discount_percentage': float(discount_percentage),
-            'discount_amount': float(discount_amount),
-            'total_after_discount': float(total_after_discount)
-        })
+        return jsonify({'success': True, **summary})
 
     @app.route('/order_status/<int:order_id>/status')
     @login_required
     def get_order_status(order_id):
-        order = Order.query.get_or_404(order_id)
-        delivery = order.delivery
-        now = datetime.now()
-
-        if delivery and delivery.estimated_delivery_time:
-            time_till_delivery = delivery.estimated_delivery_time - now
-            if time_till_delivery.total_seconds() > 0:
-                hours, remainder = divmod(int(time_till_delivery.total_seconds()), 3600)
-                minutes, seconds = divmod(remainder, 60)
-                if hours > 0:
-                    time_till_delivery_str = f"{hours}h {minutes}m"
-                else:
-                    time_till_delivery_str = f"{minutes}m"
-            else:
-                time_till_delivery_str = 'Any minute now!'
-        else:
-            time_till_delivery_str = 'Calculating...'
-
-        print(f"Order {order_id} status: {order.status.value}")
-
-        response = {
-            'status': order.status.value,
-            'delivery_personnel': delivery.delivery_personnel.name if delivery and delivery.delivery_personnel else 'Awaiting assignment',
-            'estimated_delivery_time': delivery.estimated_delivery_time.strftime('%Y-%m-%d %H:%M:%S') if delivery and delivery.estimated_delivery_time else 'Calculating...',
-            'time_till_delivery': time_till_delivery_str
-        }
+        # Polling fallback for clients that cannot use the event stream
+        response = order_status_payload(order_id)
+        if response is None:
+            abort(404)
         return jsonify(response)
 
+    @app.route('/order_status/<int:order_id>/stream')
+    @login_required
+    def stream_order_status(order_id):
+        # Read the version before the payload so no change in between is missed
+        version = order_status_notifier.version(order_id)
+        payload = order_status_payload(order_id)
+        if payload is None:
+            abort(404)
+        keep_alive = app.config['ORDER_STATUS_STREAM_KEEPALIVE_SECONDS']
+
+        def events(payload, version):
+            from setup.extensions import db
+            db.session.remove()  # Do not hold a connection while waiting
+            while True:
+                yield f"data: {json.dumps(payload)}\n\n"
+                if payload['status'] in FINAL_ORDER_STATUSES:
+                    return
+                while True:
+                    # Woken by order_status_notifier; the timeout also picks up
+                    # changes committed by other processes
+                    _, version = order_status_notifier.wait_for_change(order_id, version, keep_alive)
+                    new_payload = order_status_payload(order_id)
+                    db.session.remove()
+                    if new_payload is None:
+                        return
+                    if new_payload != payload:
+                        payload = new_payload
+                        break
+                    yield ": keep-alive\n\n"
+
+        return Response(
+            stream_with_context(events(payload, version)),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
 
     
     @app.route('/order_status/<int:order_id>', methods=['GET'])
     @login_required
     def order_status_page(order_id):
-        order = Order.query.get_or_404(order_id)
+        order = load_order_details(order_id)
+        if order is None:
+            abort(404)
         customer = order.customer
         now = datetime.now()
     
         # Calculate Time Till Delivery if estimated_delivery_time is available
-        if order.delivery and order.delivery.estimated_delivery_time:
-            time_till_delivery = order.delivery.estimated_delivery_time - now
-            if time_till_delivery.total_seconds() > 0:
-                hours, remainder = divmod(int(time_till_delivery.total_seconds()), 3600)
-                minutes, _ = divmod(remainder, 60)
-                if hours > 0:
-                    time_till_delivery_str = f"{hours}h {minutes}m"
-                else:
-                    time_till_delivery_str = f"{minutes}m"
-            else:
-                time_till_delivery_str = 'Any minute now!'
-        else:
-            time_till_delivery_str = 'Calculating...'
+        time_till_delivery_str = format_time_till_delivery(
+            order.delivery.estimated_delivery_time if order.delivery else None, now
+        )
     
         return render_template(
             'order_status.html',
@@ -457,6 +603,7 @@ def register_routes(app):
     def cancel_order_route(order_id):
         try:
             cancel_order(order_id, current_user.id)
+            remember_write()
             flash('Your order has been cancelled.', 'success')
             return redirect(url_for('thank_you', order_id=order_id))  # Corrected redirect
         except ValueError as ve:
@@ -473,7 +620,9 @@ def register_routes(app):
     @app.route('/thank_you/<int:order_id>', methods=['GET'])
     @login_required
     def thank_you(order_id):
-        order = Order.query.get_or_404(order_id)
+        order = load_order_details(order_id, with_items=False)
+        if order is None:
+            abort(404)
         customer = order.customer
         return render_template('thank_you.html', order=order, customer=customer)
     
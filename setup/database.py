@@ -0,0 +1,127 @@
+import os
+from functools import partial
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from setup.extensions import db
+
+DEFAULT_DATABASE_URI = 'sqlite:///pizza_delivery.db'
+
+# Every setting can be overridden with an environment variable of the same name
+DATABASE_DEFAULTS = {
+    # SQLite, applied to every new connection
+    'SQLITE_JOURNAL_MODE': 'WAL',  # Readers no longer block the writer (and vice versa)
+    'SQLITE_SYNCHRONOUS': 'NORMAL',  # Safe with WAL; only fsyncs at checkpoints
+    'SQLITE_BUSY_TIMEOUT_MS': 5000,  # Wait for the write lock instead of failing with "database is locked"
+    'SQLITE_MMAP_SIZE': 268435456,  # Bytes of the database file read through mmap
+    'SQLITE_CACHE_SIZE_KB': 65536,  # Page cache per connection
+    # Server databases (PostgreSQL, MySQL)
+    'DB_POOL_SIZE': 10,
+    'DB_MAX_OVERFLOW': 20,
+    'DB_POOL_TIMEOUT': 30,  # Seconds to wait for a pooled connection
+    'DB_POOL_RECYCLE': 1800,  # Seconds before a connection is replaced
+    'DB_POOL_PRE_PING': True,  # Test connections on checkout, so restarts of the server are survived
+    'DB_PREPARE_THRESHOLD': 5,  # psycopg 3: executions before a statement is prepared server-side (None disables)
+    # Both
+    'DB_STATEMENT_CACHE_SIZE': 500,  # Compiled SQL statements cached by SQLAlchemy
+    # Read replica for report and history pages (setup/replica.py)
+    'READ_REPLICA_URL': None,  # An external replica, e.g. a PostgreSQL hot standby
+    'READ_REPLICA_SNAPSHOT_SECONDS': 0,  # SQLite: refresh a snapshot copy this often (0 disables)
+}
+
+
+def database_setting(app, name):
+    value = os.environ.get(name, app.config.get(name, DATABASE_DEFAULTS[name]))
+    default = DATABASE_DEFAULTS[name]
+    if isinstance(value, str) and default is not None and not isinstance(default, str):
+        if value.lower() in ('', 'none'):
+            return None
+        if isinstance(default, bool):
+            return value.lower() in ('1', 'true', 'yes', 'on')
+        return int(value)
+    return value
+
+
+def _set_sqlite_pragmas(pragmas, dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma, value in pragmas:
+        cursor.execute(f'PRAGMA {pragma} = {value}')
+    cursor.close()
+
+
+def configure_database(app, database_uri=None):
+    """
+    Choose the database and the engine options from the environment.
+
+    The database is DATABASE_URL (or database_uri, or SQLALCHEMY_DATABASE_URI, or
+    DEFAULT_DATABASE_URI). SQLite databases get the pragmas in DATABASE_DEFAULTS on
+    every connection; server databases such as postgresql+psycopg://... get a
+    connection pool with pre-ping and statement caching (the driver must be
+    installed). Must run before db.init_app(app); init_database does both.
+
+    :param app: The Flask app.
+    :param database_uri: Database used when DATABASE_URL is not set.
+    :return: The SQLite pragmas to apply per connection (empty for server databases).
+    """
+    database_uri = (
+        os.environ.get('DATABASE_URL')
+        or database_uri
+        or app.config.get('SQLALCHEMY_DATABASE_URI')
+        or DEFAULT_DATABASE_URI
+    )
+    if database_uri.startswith('postgres://'):
+        # Heroku-style URL, which SQLAlchemy no longer accepts
+        database_uri = 'postgresql://' + database_uri[len('postgres://'):]
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+
+    engine_options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    engine_options.setdefault('query_cache_size', database_setting(app, 'DB_STATEMENT_CACHE_SIZE'))
+    url = make_url(database_uri)
+    pragmas = []
+    if url.get_backend_name() == 'sqlite':
+        if url.database and url.database != ':memory:':
+            pragmas = [
+                ('journal_mode', database_setting(app, 'SQLITE_JOURNAL_MODE')),
+                ('synchronous', database_setting(app, 'SQLITE_SYNCHRONOUS')),
+                ('busy_timeout', database_setting(app, 'SQLITE_BUSY_TIMEOUT_MS')),
+                ('mmap_size', database_setting(app, 'SQLITE_MMAP_SIZE')),
+                # Negative values are in KiB rather than pages
+                ('cache_size', -database_setting(app, 'SQLITE_CACHE_SIZE_KB')),
+            ]
+    else:
+        engine_options.setdefault('pool_size', database_setting(app, 'DB_POOL_SIZE'))
+        engine_options.setdefault('max_overflow', database_setting(app, 'DB_MAX_OVERFLOW'))
+        engine_options.setdefault('pool_timeout', database_setting(app, 'DB_POOL_TIMEOUT'))
+        engine_options.setdefault('pool_recycle', database_setting(app, 'DB_POOL_RECYCLE'))
+        engine_options.setdefault('pool_pre_ping', database_setting(app, 'DB_POOL_PRE_PING'))
+        if url.get_driver_name() == 'psycopg':
+            connect_args = engine_options.setdefault('connect_args', {})
+            connect_args.setdefault('prepare_threshold', database_setting(app, 'DB_PREPARE_THRESHOLD'))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+    return pragmas
+
+
+def init_database(app, database_uri=None):
+    """Configure the database from the environment and bind db to the app."""
+    pragmas = configure_database(app, database_uri)
+    db.init_app(app)
+    if pragmas:
+        with app.app_context():
+            event.listen(db.engine, 'connect', partial(_set_sqlite_pragmas, pragmas))
+
+
+if __name__ == '__main__':
+    from flask import Flask
+
+    # A bare app rooted like app.py (same instance folder), without its background workers
+    app = Flask('app', root_path=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    init_database(app)
+
+    with app.app_context():
+        print(f"Database: {db.engine.url.render_as_string(hide_password=True)}")
+        print(f"Engine options: {app.config['SQLALCHEMY_ENGINE_OPTIONS']}")
+        if db.engine.dialect.name == 'sqlite':
+            with db.engine.connect() as connection:
+                for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size'):
+                    print(f"PRAGMA {pragma} = {connection.exec_driver_sql(f'PRAGMA {pragma}').scalar()}")
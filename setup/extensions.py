@@ -1,6 +1,24 @@
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from flask_login import LoginManager
 
+
+class RoutingSession(Session):
+    """
+    Session that sends SELECTs to the read replica while a view decorated with
+    setup.replica.use_read_replica runs. Everything else (and every view that is not
+    decorated) keeps using the primary database.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and clause is not None and getattr(clause, 'is_select', False) and has_app_context():
+            replica_engine = g.get('read_replica_engine')
+            if replica_engine is not None:
+                return replica_engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
 # Create the SQLAlchemy and LoginManager instances
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
@@ -0,0 +1,41 @@
+from sqlalchemy import inspect
+from setup.extensions import db
+
+
+def ensure_indexes():
+    """
+    Create any index declared on the models that is missing from the database.
+
+    db.create_all() only creates tables that do not exist yet, so databases created
+    before an index was added to models.py never receive it. This brings an existing
+    instance/pizza_delivery.db up to date and is safe to run on every startup.
+    """
+    created = []
+    with db.engine.begin() as connection:
+        inspector = inspect(connection)
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(connection)
+                    created.append(index.name)
+    return created
+
+
+if __name__ == '__main__':
+    import os
+    from flask import Flask
+    import models  # noqa: F401 (registers the tables and indexes on db.metadata)
+    from setup.database import init_database
+
+    # A bare app rooted like app.py (same instance folder), without its background workers
+    app = Flask('app', root_path=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    init_database(app)
+
+    with app.app_context():
+        db.create_all()
+        created = ensure_indexes()
+        print(f"Created {len(created)} missing index(es): {', '.join(created) or 'none'}")
@@ -0,0 +1,137 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+PASSWORD_HASH_DEFAULTS = {
+    'PASSWORD_HASH_METHOD': 'scrypt:32768:8:1',  # Werkzeug method with its parameters, e.g. pbkdf2:sha256:600000
+    'PASSWORD_HASH_SALT_LENGTH': 16,
+    'PASSWORD_HASH_WORKERS': os.cpu_count() or 1,  # Processes hashing passwords (0 hashes in the request thread)
+    'PASSWORD_HASH_QUEUE_DEPTH': 16,  # Hashes waiting for a worker before requests are turned away
+    'PASSWORD_HASH_TIMEOUT_SECONDS': 10,
+    'PASSWORD_HASH_RETRY_AFTER_SECONDS': 2,  # Retry-After of the 503 sent when the pool is saturated
+}
+
+
+def _exit_with_parent(parent_pid):
+    """Worker initializer: exit once the app process is gone (e.g. killed) instead of lingering."""
+    def watch():
+        while os.getppid() == parent_pid:
+            time.sleep(1)
+        os._exit(0)
+    threading.Thread(target=watch, name='password-hasher-parent-watch', daemon=True).start()
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when every worker is busy and the queue is full."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Password hashing is saturated; retry after {retry_after} seconds.")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """
+    Hashes and checks passwords in a pool of worker processes.
+
+    Hashing is deliberately slow CPU work that holds the GIL, so done in the request
+    thread a signup burst stalls every other request served by the same process (e.g.
+    the order status polls). In the pool the request thread just waits for the result.
+    At most PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_DEPTH hashes are in flight;
+    beyond that PasswordHasherBusy is raised straight away, so the caller can answer
+    503 instead of queueing work that would time out anyway.
+
+    Workers are forked (spawned ones would re-run app.py as their main module) and
+    only run hashlib, so start() them before the app starts its background threads.
+    If a worker dies (e.g. killed for memory), the request it served gets
+    PasswordHasherBusy and the next one forks a new pool.
+    """
+
+    def __init__(self):
+        self.method = PASSWORD_HASH_DEFAULTS['PASSWORD_HASH_METHOD']
+        self.salt_length = PASSWORD_HASH_DEFAULTS['PASSWORD_HASH_SALT_LENGTH']
+        self.workers = 0
+        self.timeout = PASSWORD_HASH_DEFAULTS['PASSWORD_HASH_TIMEOUT_SECONDS']
+        self.retry_after = PASSWORD_HASH_DEFAULTS['PASSWORD_HASH_RETRY_AFTER_SECONDS']
+        self._slots = None
+        self._executor = None
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def init_app(self, app):
+        app.extensions['password_hasher'] = self
+        settings = {name: app.config.get(name, default) for name, default in PASSWORD_HASH_DEFAULTS.items()}
+        self.shutdown()
+        self.method = settings['PASSWORD_HASH_METHOD']
+        self.salt_length = settings['PASSWORD_HASH_SALT_LENGTH']
+        self.workers = settings['PASSWORD_HASH_WORKERS']
+        self.timeout = settings['PASSWORD_HASH_TIMEOUT_SECONDS']
+        self.retry_after = settings['PASSWORD_HASH_RETRY_AFTER_SECONDS']
+        self._slots = threading.BoundedSemaphore(self.workers + settings['PASSWORD_HASH_QUEUE_DEPTH'])
+
+    def generate(self, password):
+        """Hash a new password with the configured method."""
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def check(self, password_hash, password):
+        """Check a password against a stored hash (of any method)."""
+        return self._run(check_password_hash, password_hash, password)
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordHasherBusy(self.retry_after)
+        executor = self._pool()
+        try:
+            future = executor.submit(func, *args)
+        except BaseException as e:
+            self._slots.release()
+            if isinstance(e, BrokenProcessPool):
+                self._discard_pool(executor)
+                raise PasswordHasherBusy(self.retry_after)
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise PasswordHasherBusy(self.retry_after)
+        except BrokenProcessPool:
+            self._discard_pool(executor)
+            raise PasswordHasherBusy(self.retry_after)
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('fork'),
+                    initializer=_exit_with_parent, initargs=(os.getpid(),)
+                )
+            return self._executor
+
+    def _discard_pool(self, executor):
+        # A worker died: the pool refuses new work, so the next _pool() forks a new one
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def start(self):
+        """Fork the workers now rather than on the first login."""
+        if self.workers:
+            self._pool().submit(int).result()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,111 @@
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class RouteQueryStats:
+    """Per-endpoint totals of SQL activity, aggregated across requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def record(self, endpoint, query_count, db_time, slowest_time, slowest_statement):
+        with self._lock:
+            stats = self._routes.setdefault(endpoint, {
+                'requests': 0,
+                'queries': 0,
+                'db_time_ms': 0.0,
+                'max_queries': 0,
+                'slowest_ms': 0.0,
+                'slowest_statement': None
+            })
+            stats['requests'] += 1
+            stats['queries'] += query_count
+            stats['db_time_ms'] += db_time * 1000
+            stats['max_queries'] = max(stats['max_queries'], query_count)
+            if slowest_time * 1000 > stats['slowest_ms']:
+                stats['slowest_ms'] = slowest_time * 1000
+                stats['slowest_statement'] = slowest_statement
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for endpoint, stats in self._routes.items():
+                result[endpoint] = dict(
+                    stats,
+                    avg_queries=round(stats['queries'] / stats['requests'], 2),
+                    avg_db_time_ms=round(stats['db_time_ms'] / stats['requests'], 3),
+                    db_time_ms=round(stats['db_time_ms'], 3),
+                    slowest_ms=round(stats['slowest_ms'], 3)
+                )
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+route_query_stats = RouteQueryStats()
+
+
+# Registered on the Engine class so every engine the app creates is covered. The start
+# time lives on the statement's execution context, so a statement that fails (and never
+# reaches after_cursor_execute) leaves nothing behind on the pooled connection.
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.query_start_time = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _stop_timer(conn, cursor, statement, parameters, context, executemany):
+    start_time = getattr(context, 'query_start_time', None)
+    if start_time is None:
+        return
+    elapsed = time.perf_counter() - start_time
+    if not has_request_context():
+        return
+    stats = g.setdefault('query_stats', _empty_stats())
+    stats['count'] += 1
+    stats['time'] += elapsed
+    if elapsed > stats['slowest_time']:
+        stats['slowest_time'] = elapsed
+        stats['slowest_statement'] = statement
+
+    threshold_ms = current_app.config.get('SLOW_QUERY_THRESHOLD_MS')
+    if threshold_ms is not None and elapsed * 1000 >= threshold_ms:
+        current_app.logger.warning(f"Slow query ({elapsed * 1000:.1f} ms) in {request.endpoint}: {statement}")
+
+
+def _empty_stats():
+    return {'count': 0, 'time': 0.0, 'slowest_time': 0.0, 'slowest_statement': None}
+
+
+def init_query_stats(app):
+    """
+    Record the number of SQL statements, total database time and slowest statement of
+    every request.
+
+    The figures are added as X-DB-* response headers (when SQL_STATS_HEADERS is set),
+    aggregated per endpoint in route_query_stats for the /metrics page, and statements
+    slower than SLOW_QUERY_THRESHOLD_MS are logged as warnings.
+    """
+    app.config.setdefault('SQL_STATS_HEADERS', True)
+    app.config.setdefault('SLOW_QUERY_THRESHOLD_MS', 100)
+
+    @app.after_request
+    def _report_query_stats(response):
+        stats = g.get('query_stats') or _empty_stats()
+        if request.endpoint and request.endpoint != 'static':
+            route_query_stats.record(
+                request.endpoint, stats['count'], stats['time'], stats['slowest_time'], stats['slowest_statement']
+            )
+        if app.config['SQL_STATS_HEADERS']:
+            response.headers['X-DB-Query-Count'] = str(stats['count'])
+            response.headers['X-DB-Time-Ms'] = f"{stats['time'] * 1000:.3f}"
+            response.headers['X-DB-Slowest-Ms'] = f"{stats['slowest_time'] * 1000:.3f}"
+        return response
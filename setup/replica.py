@@ -0,0 +1,142 @@
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, session
+from sqlalchemy import create_engine, event, text
+from setup.database import database_setting
+from setup.extensions import db
+
+
+def _set_query_only(dbapi_connection, connection_record):
+    dbapi_connection.execute('PRAGMA query_only = ON')
+
+
+class ReadReplica:
+    """
+    Read-only copy of the database for the report and history pages, so their large
+    reads never run on the connections and files that checkout writes to.
+
+    The replica is either an external database (READ_REPLICA_URL, e.g. a PostgreSQL
+    hot standby) or, with a SQLite primary, a snapshot file that a background thread
+    refreshes every READ_REPLICA_SNAPSHOT_SECONDS with SQLite's online backup API.
+    The snapshot is in WAL mode, so pages reading it are not blocked by a refresh.
+    Views opt in with use_read_replica; without a replica they read the primary.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.engine = None
+        self.interval = 0
+        self.primary_path = None
+        self.snapshot_path = None
+        self.snapshot_taken_at = None  # time.time() when the last snapshot started
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['read_replica'] = self
+        replica_url = database_setting(app, 'READ_REPLICA_URL')
+        self.interval = database_setting(app, 'READ_REPLICA_SNAPSHOT_SECONDS') or 0
+        if replica_url:
+            self.engine = create_engine(replica_url, pool_pre_ping=True)
+            return
+
+        if not self.interval:
+            return
+        with app.app_context():
+            if db.engine.dialect.name != 'sqlite':
+                raise ValueError("READ_REPLICA_SNAPSHOT_SECONDS needs a SQLite database; set READ_REPLICA_URL instead.")
+            self.primary_path = db.engine.url.database
+        root, extension = os.path.splitext(self.primary_path)
+        self.snapshot_path = f'{root}-replica{extension}'
+        if os.path.exists(self.snapshot_path):
+            # Serve the snapshot left by the previous run until the first refresh
+            self.snapshot_taken_at = os.path.getmtime(self.snapshot_path)
+            self.engine = self._snapshot_engine()
+
+    def _snapshot_engine(self):
+        engine = create_engine(f'sqlite:///{self.snapshot_path}')
+        event.listen(engine, 'connect', _set_query_only)
+        return engine
+
+    def refresh(self):
+        """Copy the primary database into the snapshot file (SQLite snapshots only)."""
+        started = time.time()
+        source = sqlite3.connect(self.primary_path)
+        destination = sqlite3.connect(self.snapshot_path)
+        try:
+            destination.execute('PRAGMA journal_mode = WAL')
+            source.backup(destination)
+        finally:
+            destination.close()
+            source.close()
+        if self.engine is None:
+            self.engine = self._snapshot_engine()
+        self.snapshot_taken_at = started
+
+    def start(self):
+        if not self.snapshot_path or (self._thread and self._thread.is_alive()):
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='read-replica', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.refresh()
+            except sqlite3.Error:
+                self.app.logger.exception("Refreshing the read replica snapshot failed.")
+            self._stopped.wait(self.interval)
+
+    def lag(self):
+        """
+        How far the replica may be behind the primary.
+
+        :return: Seconds, or None if unknown (an external replica other than PostgreSQL).
+        """
+        if self.snapshot_path:
+            return max(time.time() - self.snapshot_taken_at, 0)
+        if self.engine.dialect.name == 'postgresql':
+            with self.engine.connect() as connection:
+                lag = connection.execute(text(
+                    'SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())'
+                )).scalar()
+            return float(lag or 0)
+        return None
+
+
+read_replica = ReadReplica()
+
+
+def remember_write():
+    """Call after the current user changed data, so their own history pages read the primary until the replica has it."""
+    session['last_write_at'] = time.time()
+
+
+def use_read_replica(view):
+    """
+    Run the view's SELECT statements on the read replica, if one is configured.
+
+    Sets g.read_replica_lag for the templates. Users who changed data more recently
+    than the replica's lag keep reading the primary, so they see their own changes.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        replica = current_app.extensions.get('read_replica')
+        if replica is not None and replica.engine is not None:
+            lag = replica.lag()
+            if lag is None or session.get('last_write_at', 0) < time.time() - lag:
+                g.read_replica_engine = replica.engine
+                g.read_replica_lag = lag
+        return view(*args, **kwargs)
+    return wrapper
@@ -1,4 +1,5 @@
-from datetime import datetime
+import random
+from datetime import date, datetime, timedelta
 from decimal import Decimal
 from setup.extensions import db
 from models import Customer, DeliveryPersonnel, DiscountCode, GenderEnum, Ingredient, MenuItem, MenuItemCategoryEnum
@@ -289,4 +290,58 @@ def seed_data():
     ]
     db.session.add_all(delivery_personnel_list)
     db.session.commit()
-    print("Delivery Personnel seeded.")
\ No newline at end of file
+    print("Delivery Personnel seeded.")
+
+
+# Postal codes used for generated customers and delivery personnel
+SCALED_POSTAL_CODES = ['6211', '6212', '6221', '6222', '6229', '6231', '6241', '6251']
+
+def seed_scaled_data(customers=0, delivery_personnel=0, menu_items=0, password='passward', seed=0):
+    """
+    Add generated customers, delivery personnel and menu items on top of seed_data(),
+    e.g. for load testing. The same seed always produces the same rows.
+
+    :param customers: Number of customers to add (emails loadtest-customer-<n>@example.com).
+    :param delivery_personnel: Number of available delivery personnel to add.
+    :param menu_items: Number of extra pizzas to add to the menu.
+    :param password: Plain text password of every generated customer (hashed once).
+    :param seed: Seed of the random generator.
+    """
+    rng = random.Random(seed)
+    hashed_password = generate_password_hash(password)
+    start = (Customer.query.count() or 0) + 1
+
+    db.session.add_all([
+        Customer(
+            name=f'Load Test Customer {n}',
+            gender=rng.choice(list(GenderEnum)),
+            birthdate=date(1950, 1, 1) + timedelta(days=rng.randrange(365 * 55)),
+            phone=f'06{n:08d}',
+            address=f'Teststraat {n}',
+            postal_code=rng.choice(SCALED_POSTAL_CODES),
+            email=f'loadtest-customer-{n}@example.com',
+            password=hashed_password,
+            total_pizzas_ordered=0,
+            birthday_pizza_claimed=False,
+            is_admin=False
+        )
+        for n in range(start, start + customers)
+    ])
+    db.session.add_all([
+        DeliveryPersonnel(name=f'Courier {n}', phone=f'07{n:08d}', postal_code=None, is_available=True)
+        for n in range(1, delivery_personnel + 1)
+    ])
+    db.session.add_all([
+        MenuItem(
+            name=f'Load Test Pizza {n}',
+            category=MenuItemCategoryEnum.Pizza,
+            image='margherita.jpeg',
+            base_price=Decimal(rng.randrange(400, 1200)) / 100,
+            description='Generated for load testing',
+            is_vegetarian=rng.random() < 0.5,
+            is_vegan=False
+        )
+        for n in range(1, menu_items + 1)
+    ])
+    db.session.commit()
+    print(f"Seeded {customers} customers, {delivery_personnel} delivery personnel and {menu_items} menu items.")
@@ -0,0 +1,255 @@
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import func, text
+from functionality.lifecycle import ORDER_LIFECYCLE
+from functionality.utils import calculate_cart_prices
+from models import Customer, Delivery, DeliveryPersonnel, GenderEnum, MenuItem, MenuItemCategoryEnum, Order, OrderItem, OrderStatusEnum, OrderStatusHistory, ScheduledTransition
+from setup.extensions import db
+from setup.seed_data import SCALED_POSTAL_CODES
+from werkzeug.security import generate_password_hash
+
+DISCOUNT_PERCENTAGES = [Decimal('0.00')] * 8 + [Decimal('20.00'), Decimal('30.00')]
+
+
+def _next_id(model):
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def _insert(model, rows):
+    # Core executemany: no ORM objects are created for generated rows
+    if rows:
+        db.session.execute(model.__table__.insert(), rows)
+
+
+def _advance_id_sequences(*models):
+    """
+    On PostgreSQL, move the id sequences of the given models past the ids inserted
+    explicitly, so later ORM inserts do not collide with generated rows.
+    """
+    dialect = db.session.get_bind().dialect
+    if dialect.name != 'postgresql':
+        return  # SQLite continues from the largest id
+    for model in models:
+        table_name = dialect.identifier_preparer.format_table(model.__table__)
+        db.session.execute(
+            text(f"SELECT setval(pg_get_serial_sequence(:table_name, 'id'), "
+                 f"(SELECT COALESCE(MAX(id), 0) + 1 FROM {table_name}), false)"),
+            {'table_name': table_name}
+        )
+
+
+def generate_synthetic_data(customers, orders_per_customer=5, items_per_order=3, delivery_personnel=100,
+                            waiting_orders=0, days=365, chunk_size=10000, seed=0, password='passward'):
+    """
+    Bulk-generate customers with a history of orders, order items, deliveries and status
+    history rows, e.g. to test the admin reports and the dispatcher at realistic volumes.
+
+    Rows are inserted with executemany in chunks of chunk_size customers (one commit per
+    chunk), so memory stays bounded however many rows are generated. Primary keys are
+    assigned up front, every customer shares one precomputed password hash, and the same
+    seed always generates the same data. The menu must already be seeded, and the
+    earnings rollups must be rebuilt afterwards (backfill_earnings_rollups).
+
+    :param customers: Number of customers to generate.
+    :param orders_per_customer: Average number of past orders per customer.
+    :param items_per_order: Average number of line items per order.
+    :param delivery_personnel: Number of delivery personnel to generate.
+    :param waiting_orders: Number of recent orders left waiting for delivery personnel, with
+                           the rest of their lifecycle scheduled.
+    :param days: Past orders are spread over this many days before today.
+    :param chunk_size: Customers generated per chunk.
+    :param seed: Seed of the random generator.
+    :param password: Plain text password of every generated customer.
+    :return: Dict with the number of rows inserted per table.
+    """
+    rng = random.Random(seed)
+    hashed_password = generate_password_hash(password)
+
+    menu_items = MenuItem.query.order_by(MenuItem.id).all()
+    if not menu_items:
+        raise ValueError("Seed the menu before generating synthetic data.")
+    final_prices = dict(zip(
+        [item.id for item in menu_items],
+        calculate_cart_prices([item.base_price for item in menu_items])['final_prices']
+    ))
+    pizza_ids = {item.id for item in menu_items if item.category == MenuItemCategoryEnum.Pizza}
+    menu_item_ids = list(final_prices)
+
+    counts = {'customers': 0, 'orders': 0, 'order_items': 0, 'deliveries': 0, 'status_history': 0,
+              'scheduled_transitions': 0, 'delivery_personnel': delivery_personnel}
+
+    courier_id = _next_id(DeliveryPersonnel)
+    _insert(DeliveryPersonnel, [
+        {'id': courier_id + n, 'name': f'Synthetic Courier {courier_id + n}', 'phone': f'07{courier_id + n:08d}',
+         'postal_code': None, 'is_available': True, 'last_delivery_time': None}
+        for n in range(delivery_personnel)
+    ])
+    courier_ids = list(range(courier_id, courier_id + delivery_personnel)) or [
+        courier.id for courier in DeliveryPersonnel.query.all()
+    ]
+    _advance_id_sequences(DeliveryPersonnel)
+    db.session.commit()
+
+    customer_id = _next_id(Customer)
+    order_id = _next_id(Order)
+    order_item_id = _next_id(OrderItem)
+    delivery_id = _next_id(Delivery)
+    history_id = _next_id(OrderStatusHistory)
+    now = datetime.now()
+    first_day = now - timedelta(days=days)
+
+    remaining_waiting = waiting_orders
+    for chunk_start in range(0, customers, chunk_size):
+        customer_rows, order_rows, item_rows, delivery_rows, history_rows, transition_rows = [], [], [], [], [], []
+
+        for _ in range(min(chunk_size, customers - chunk_start)):
+            total_pizzas = 0
+            for _ in range(rng.randint(0, 2 * orders_per_customer)):
+                order_date = first_day + timedelta(seconds=rng.randrange(days * 86400))
+                waiting = remaining_waiting > 0
+                cancelled = not waiting and rng.random() < 0.05
+                if waiting:
+                    remaining_waiting -= 1
+                    order_date = now - timedelta(minutes=rng.randrange(1, 30))
+
+                subtotal = Decimal('0.00')
+                order_pizzas = 0
+                for _ in range(rng.randint(1, 2 * items_per_order - 1)):
+                    menu_item_id = rng.choice(menu_item_ids)
+                    quantity = rng.randint(1, 3)
+                    subtotal += final_prices[menu_item_id] * quantity
+                    if menu_item_id in pizza_ids:
+                        order_pizzas += quantity
+                    item_rows.append({'id': order_item_id, 'order_id': order_id, 'menu_item_id': menu_item_id,
+                                      'quantity': quantity, 'price': final_prices[menu_item_id]})
+                    order_item_id += 1
+
+                if not cancelled:
+                    total_pizzas += order_pizzas
+                discount_percentage = rng.choice(DISCOUNT_PERCENTAGES)
+                total_price = subtotal - subtotal * discount_percentage / Decimal('100.00')
+
+                history = [(OrderStatusEnum.Pending, order_date)]
+                if waiting:
+                    status = OrderStatusEnum.Being_Prepared
+                    history.append((status, order_date))
+                    delivery_rows.append({
+                        'id': delivery_id, 'order_id': order_id, 'delivery_personnel_id': None, 'assigned_at': None,
+                        'status': OrderStatusEnum.Waiting_for_Delivery_Personnel,
+                        'estimated_delivery_time': None, 'delivery_time': None
+                    })
+                    delivery_id += 1
+                    # The rest of its lifecycle, as schedule_order_lifecycle would have scheduled it
+                    transition_rows.extend(
+                        {'order_id': order_id, 'status': transition_status, 'due_at': order_date + delay}
+                        for transition_status, delay in ORDER_LIFECYCLE if transition_status != status
+                    )
+                elif cancelled:
+                    status = OrderStatusEnum.Cancelled
+                    history.append((status, order_date + timedelta(minutes=rng.randint(1, 5))))
+                else:
+                    status = OrderStatusEnum.Delivered
+                    picked_up = order_date + timedelta(minutes=rng.randint(5, 20))
+                    delivered = picked_up + timedelta(minutes=rng.randint(5, 30))
+                    history += [(OrderStatusEnum.Being_Prepared, order_date),
+                                (OrderStatusEnum.Being_Delivered, picked_up),
+                                (OrderStatusEnum.Delivered, delivered)]
+                    delivery_rows.append({
+                        'id': delivery_id, 'order_id': order_id,
+                        'delivery_personnel_id': rng.choice(courier_ids) if courier_ids else None,
+                        'assigned_at': order_date, 'status': OrderStatusEnum.Delivered,
+                        'estimated_delivery_time': picked_up + timedelta(minutes=15), 'delivery_time': delivered
+                    })
+                    delivery_id += 1
+
+                order_rows.append({
+                    'id': order_id, 'customer_id': customer_id, 'order_date': order_date,
+                    'delivery_time': history[-1][1] if status == OrderStatusEnum.Delivered else None,
+                    'total_price': total_price.quantize(Decimal('0.01')), 'discount_percentage': discount_percentage,
+                    'status': status, 'is_cancelled': cancelled,
+                    'cancellation_time': history[-1][1] if cancelled else None
+                })
+                for history_status, updated_at in history:
+                    history_rows.append({'id': history_id, 'order_id': order_id, 'status': history_status,
+                                         'updated_at': updated_at})
+                    history_id += 1
+                order_id += 1
+
+            customer_rows.append({
+                'id': customer_id,
+                'name': f'Synthetic Customer {customer_id}',
+                'gender': rng.choice(list(GenderEnum)),
+                'birthdate': date(1950, 1, 1) + timedelta(days=rng.randrange(365 * 55)),
+                'phone': f'06{customer_id:08d}',
+                'address': f'Synthetic Street {customer_id}',
+                'postal_code': rng.choice(SCALED_POSTAL_CODES),
+                'email': f'synthetic-customer-{customer_id}@example.com',
+                'password': hashed_password,
+                'total_pizzas_ordered': total_pizzas,
+                'birthday_pizza_claimed': False,
+                'is_admin': False
+            })
+            customer_id += 1
+
+        _insert(Customer, customer_rows)
+        _insert(Order, order_rows)
+        _insert(OrderItem, item_rows)
+        _insert(Delivery, delivery_rows)
+        _insert(OrderStatusHistory, history_rows)
+        _insert(ScheduledTransition, transition_rows)
+        _advance_id_sequences(Customer, Order, OrderItem, Delivery, OrderStatusHistory)
+        db.session.commit()
+
+        counts['customers'] += len(customer_rows)
+        counts['orders'] += len(order_rows)
+        counts['order_items'] += len(item_rows)
+        counts['deliveries'] += len(delivery_rows)
+        counts['status_history'] += len(history_rows)
+        counts['scheduled_transitions'] += len(transition_rows)
+        print(f"Generated {counts['customers']}/{customers} customers, {counts['orders']} orders.")
+
+    return counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bulk-generate synthetic customers and order history.')
+    parser.add_argument('--customers', type=int, default=100000)
+    parser.add_argument('--orders-per-customer', type=int, default=5)
+    parser.add_argument('--items-per-order', type=int, default=3)
+    parser.add_argument('--delivery-personnel', type=int, default=100)
+    parser.add_argument('--waiting-orders', type=int, default=0)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from app import app, scheduler
+    from functionality.earnings_rollups import backfill_earnings_rollups
+    from functionality.lifecycle import lifecycle_engine
+    from functionality.order_intake import order_intake
+    from setup.replica import read_replica
+    from setup.seed_data import seed_data
+
+    # Keep the background jobs from writing while the data is generated
+    scheduler.pause()
+    lifecycle_engine.stop()
+    order_intake.stop()
+    read_replica.stop()
+
+    with app.app_context():
+        db.create_all()
+        seed_data()
+        start = time.perf_counter()
+        counts = generate_synthetic_data(
+            args.customers, orders_per_customer=args.orders_per_customer, items_per_order=args.items_per_order,
+            delivery_personnel=args.delivery_personnel, waiting_orders=args.waiting_orders, days=args.days,
+            chunk_size=args.chunk_size, seed=args.seed
+        )
+        print(f"Rebuilt {backfill_earnings_rollups()} earnings rollup rows.")
+        elapsed = time.perf_counter() - start
+        print(f"Inserted {sum(counts.values())} rows in {elapsed:.1f}s: "
+              + ', '.join(f'{count} {table}' for table, count in counts.items()))
@@ -0,0 +1,70 @@
+"""
+The order detail pages issue the same number of queries whatever the size of the cart.
+
+Runs the measurements of benchmarks/bench_order_detail_queries.py against a temporary
+SQLite database (or DATABASE_URL, see benchmarks.common.make_app).
+"""
+
+import pytest
+
+from benchmarks.bench_order_detail_queries import CART_SIZES, count_queries
+from benchmarks.common import drop_database, login_as, make_app
+from functionality.order import create_order
+from models import Customer, MenuItem
+from setup.extensions import db
+from setup.seed_data import seed_data
+
+PAGES = {
+    'order status page': '/order_status/{order_id}',
+    'order status JSON': '/order_status/{order_id}/status',
+    'thank you page': '/thank_you/{order_id}',
+}
+
+
+@pytest.fixture(scope='module')
+def orders():
+    """The app, a client logged in as the customer and {cart size: order id}."""
+    app = make_app(with_routes=True)
+    with app.app_context():
+        db.create_all()
+        seed_data()
+        customer_id = Customer.query.first().id
+        menu_item_ids = [item.id for item in MenuItem.query.all()]
+        order_ids = {}
+        for size in CART_SIZES:
+            items = [{'menu_item_id': menu_item_ids[i % len(menu_item_ids)], 'quantity': 1} for i in range(size)]
+            order_ids[size] = create_order(customer=db.session.get(Customer, customer_id), items=items).id
+        # One more order keeps the delivery personnel busy, so every cancellation takes the same path
+        create_order(
+            customer=db.session.get(Customer, customer_id),
+            items=[{'menu_item_id': menu_item_ids[0], 'quantity': 1}]
+        )
+        db.session.remove()
+
+    client = app.test_client()
+    login_as(client, customer_id)
+    yield app, client, order_ids
+    drop_database(app)
+
+
+@pytest.mark.parametrize('page', PAGES)
+def test_page_queries_do_not_depend_on_cart_size(orders, page):
+    app, client, order_ids = orders
+    counts = {}
+    for size in CART_SIZES:
+        responses = []
+        url = PAGES[page].format(order_id=order_ids[size])
+        counts[size] = count_queries(app, lambda: responses.append(client.get(url)))
+        assert responses[0].status_code == 200
+    assert len(set(counts.values())) == 1, f"Queries per cart size: {counts}"
+
+
+def test_cancel_order_queries_do_not_depend_on_cart_size(orders):
+    app, client, order_ids = orders
+    counts = {}
+    for size in CART_SIZES:
+        responses = []
+        url = f'/cancel_order/{order_ids[size]}'
+        counts[size] = count_queries(app, lambda: responses.append(client.post(url)))
+        assert responses[0].location.endswith(f'/thank_you/{order_ids[size]}')  # Cancelled
+    assert len(set(counts.values())) == 1, f"Queries per cart size: {counts}"